@@ -1,12 +1,42 @@
 """Module providing an example of the Observer design pattern."""
+# pylint: disable=locally-disabled, too-many-lines
 
+import asyncio
+import inspect
+import json
+import mmap
+import multiprocessing
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import weakref
+import zlib
 from abc import ABC, abstractmethod
+from collections import deque
+from functools import partial
 
 
 class DiscountObserverInterface(ABC):
-    """Provides an interface for discount notifications"""
-    def __init__(self, name):
+    """
+    Provides an interface for discount notifications. observer_id identifies the observer
+    across restarts, e.g. for its event log cursor, and defaults to its name
+    """
+    def __init__(self, name, region=None, observer_id=None):
         self.name = name
+        self.region = region
+        self.observer_id = name if observer_id is None else observer_id
+
+    def notification_topics(self):
+        """Topics this observer is subscribed to when it requests notifications"""
+        topics = [("type", cls.__name__) for cls in type(self).__mro__
+                  if issubclass(cls, DiscountObserverInterface)
+                  and cls is not DiscountObserverInterface]
+        if self.region is not None:
+            topics.append(("region", self.region))
+        return topics
 
     @abstractmethod
     def discounts_have_started(self):
@@ -17,10 +47,67 @@ class DiscountObserverInterface(ABC):
         """Allows concrete class to accept incoming notifications"""
 
 
+class ObserverRegistry():
+    """
+    Insertion ordered set of observers that only holds weak references. Adding and removing
+    are constant time, adding the same observer twice is a no-op, and observers that are
+    garbage collected drop out of the registry on their own.
+    """
+    def __init__(self, on_discard=None):
+        self._references = {}
+        self._on_discard = on_discard
+
+    def add(self, observer) -> bool:
+        """Adds the observer, returning False if it was already registered"""
+        key = id(observer)
+        if key in self._references:
+            return False
+        self._references[key] = weakref.ref(observer, self._make_purger(key))
+        return True
+
+    def discard(self, observer) -> bool:
+        """Removes the observer, returning False if it was not registered"""
+        reference = self._references.get(id(observer))
+        if reference is None or reference() is not observer:
+            return False
+        del self._references[id(observer)]
+        return True
+
+    def remove(self, observer):
+        """Removes the observer, raising ValueError if it was not registered"""
+        if not self.discard(observer):
+            raise ValueError(f"{observer!r} is not registered")
+
+    def _make_purger(self, key):
+        registry = weakref.ref(self)
+
+        # pylint: disable=locally-disabled, protected-access
+        def purge(reference):
+            owner = registry()
+            if owner is not None and owner._references.get(key) is reference:
+                del owner._references[key]
+                if owner._on_discard is not None:
+                    owner._on_discard(key)
+        return purge
+
+    def __contains__(self, observer):
+        reference = self._references.get(id(observer))
+        return reference is not None and reference() is observer
+
+    def __len__(self):
+        return len(self._references)
+
+    def __iter__(self):
+        for reference in list(self._references.values()):
+            observer = reference()
+            if observer is not None:
+                yield observer
+
+
 class DiscountProducerInterface(ABC):
     """Example of a class that will notify clients of discounts"""
     def __init__(self):
-        self._discount_observers = []
+        self._discount_observers = ObserverRegistry()
 
     @abstractmethod
     def request_notification(self, observer: DiscountObserverInterface):
@@ -33,6 +120,16 @@ class DiscountProducerInterface(ABC):
 
 class Customer(DiscountObserverInterface):
     """Concrete class representing a specific customer that can request discount notifications"""
+    def __init__(self, name, region=None, tier=None, observer_id=None):
+        super().__init__(name, region, observer_id)
+        self.tier = tier
+
+    def notification_topics(self):
+        topics = super().notification_topics()
+        if self.tier is not None:
+            topics.append(("tier", self.tier))
+        return topics
+
     def discounts_have_started(self):
         print(f"{self.name} is excited for discounts!")
 
@@ -58,30 +155,1003 @@ class OrganizationalDepartment(DiscountObserverInterface):
         print(f"{self.name} is back to regular operations")
 
 
+# pylint: disable=locally-disabled, too-few-public-methods
+class DeliveryReport():
+    """Summarizes how a single discount event was delivered to observers"""
+    def __init__(self, event: str, delivered: int, failed: int, timed_out: int, elapsed: float):
+        self.event = event
+        self.delivered = delivered
+        self.failed = failed
+        self.timed_out = timed_out
+        self.elapsed = elapsed
+
+    @property
+    def throughput(self) -> float:
+        """Number of observers successfully notified per second"""
+        if self.elapsed <= 0:
+            return float(self.delivered)
+        return self.delivered / self.elapsed
+
+    def __repr__(self):
+        return (f"DeliveryReport(event={self.event!r}, delivered={self.delivered}, "
+                f"failed={self.failed}, timed_out={self.timed_out}, "
+                f"elapsed={self.elapsed:.6f}s, throughput={self.throughput:.0f}/s)")
+
+
+_RECORD_HEADER = struct.Struct("<II")
+
+
+# pylint: disable=locally-disabled, too-many-instance-attributes
+class DiscountEventLog():
+    """
+    Append-only log of discount events, stored as numbered segment files in a directory.
+    Each record is its payload length and CRC-32 followed by the JSON encoded event, so
+    segments can be read through mmap and a torn record left by a crash is detected and
+    truncated when the log is reopened. Events are numbered by offset from 0.
+
+    With fsync set, append() returns once the event is on disk. Appenders waiting on a sync
+    in progress are covered by the next one, so concurrent appends share fsync calls.
+
+    The log also stores a cursor per observer id: the offset of the first event that
+    observer may not have handled yet.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, fsync=True):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._bases = sorted(int(name[:-4]) for name in os.listdir(directory)
+                             if name.endswith(".log")) or [0]
+        self._next_offset = self._recover(self._bases[-1])
+        self._fd = os.open(self._segment_path(self._bases[-1]),
+                           os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = os.fstat(self._fd).st_size
+        self._retired = []
+        self._synced = self._next_offset
+        self._cursors_path = os.path.join(directory, "cursors.json")
+        try:
+            with open(self._cursors_path, encoding="utf-8") as cursors_file:
+                self._cursors = json.load(cursors_file)
+        except FileNotFoundError:
+            self._cursors = {}
+
+    def _segment_path(self, base):
+        return os.path.join(self.directory, f"{base:020d}.log")
+
+    def _records(self, base):
+        """Yields the end position and payload of each intact record in a segment"""
+
+        with open(self._segment_path(base), "rb") as segment:
+            size = os.fstat(segment.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                position = 0
+                while position + _RECORD_HEADER.size <= size:
+                    length, checksum = _RECORD_HEADER.unpack_from(mapped, position)
+                    end = position + _RECORD_HEADER.size + length
+                    if end > size:
+                        return
+                    payload = mapped[position + _RECORD_HEADER.size:end]
+                    if zlib.crc32(payload) != checksum:
+                        return
+                    yield end, payload
+                    position = end
+
+    def _recover(self, base):
+        """Truncates a torn tail off the last segment, returning the next offset"""
+
+        path = self._segment_path(base)
+        if not os.path.exists(path):
+            return base
+        count, end = 0, 0
+        for end, _ in self._records(base):
+            count += 1
+        if os.path.getsize(path) != end:
+            os.truncate(path, end)
+        return base + count
+
+    @property
+    def end_offset(self) -> int:
+        """Offset the next appended event will get"""
+        return self._next_offset
+
+    def append(self, event, topic=None) -> int:
+        """Appends an event, returning its offset once it is durable"""
+
+        payload = json.dumps([event, topic], separators=(",", ":")).encode()
+        record = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._size >= self.segment_bytes:
+                self._roll()
+            os.write(self._fd, record)
+            self._size += len(record)
+            offset = self._next_offset
+            self._next_offset += 1
+        if self.fsync:
+            self._group_commit(offset)
+        return offset
+
+    def _roll(self):
+        """Must hold the lock. Syncs the current segment and starts a new one"""
+
+        if self.fsync:
+            os.fsync(self._fd)
+        self._retired.append(self._fd)
+        self._bases.append(self._next_offset)
+        self._fd = os.open(self._segment_path(self._next_offset),
+                           os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = 0
+
+    def _group_commit(self, offset):
+        if self._synced > offset:
+            return
+        with self._commit_lock:
+            if self._synced > offset:
+                return
+            with self._lock:
+                fd, target = self._fd, self._next_offset
+            os.fsync(fd)
+            self._synced = target
+
+    def replay(self, start=0):
+        """Yields (offset, event, topic) for every event from offset start onwards"""
+
+        with self._lock:
+            bases = list(self._bases)
+        for base, next_base in zip(bases, bases[1:] + [None]):
+            if next_base is not None and next_base <= start:
+                continue
+            offset = base
+            for _, payload in self._records(base):
+                if offset >= start:
+                    event, topic = json.loads(payload)
+                    yield offset, event, None if topic is None else tuple(topic)
+                offset += 1
+
+    def cursor(self, name):
+        """Returns the stored cursor for an observer id, or None if it has none"""
+        return self._cursors.get(name)
+
+    def set_cursor(self, name, offset):
+        """Moves an observer's cursor; save_cursors() makes it durable"""
+        self._cursors[name] = offset
+
+    def save_cursors(self):
+        """Writes the cursors to disk atomically"""
+
+        temporary = f"{self._cursors_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as cursors_file:
+            json.dump(self._cursors, cursors_file)
+            cursors_file.flush()
+            if self.fsync:
+                os.fsync(cursors_file.fileno())
+        os.replace(temporary, self._cursors_path)
+
+    def close(self):
+        """Syncs and closes the log"""
+
+        with self._lock:
+            if self.fsync:
+                os.fsync(self._fd)
+            for fd in [*self._retired, self._fd]:
+                os.close(fd)
+            self._retired = []
+        self.save_cursors()
+
+
 class PricingOptimizer(DiscountProducerInterface):
-    """Example of a concrete class that will notify observers that have requested notifications"""
-    def request_notification(self, observer: DiscountObserverInterface):
+    """
+    Example of a concrete class that will notify observers that have requested notifications.
+    Every observer is also indexed under its topics, such as ("type", "Warehouse"),
+    ("region", "TX") or ("tier", "gold"), and under any segment whose predicate it matched
+    when it subscribed, so notifying a single topic only touches the observers within it.
+
+    With an event_log, every notification, async or not, appends the event to the log
+    before notifying anyone and moves each notified observer's cursor past it. An observer
+    whose cursor is behind, because the process restarted mid-notification or its handler
+    raised, is lagging: its next notification, or replay_missed(), first replays the events
+    it missed from its cursor rather than resending everything. Cursors are kept per
+    observer_id, so with an event_log subscribed observers must not share an id. A handler
+    that raises does not stop the fan-out; the first error is re-raised once every observer
+    had its turn.
+    """
+    def __init__(self, event_log=None):
+        super().__init__()
+        self._discount_observers = ObserverRegistry(on_discard=self._forget_topics)
+        self._topic_index = {}
+        self._observer_topics = {}
+        self._segments = {}
+        self.event_log = event_log
+        self._lagging = set()
+        self._observer_ids = weakref.WeakValueDictionary()
+
+    def request_notification(self, observer: DiscountObserverInterface, topics=()):
+        if self.event_log is not None:
+            registered = self._observer_ids.setdefault(observer.observer_id, observer)
+            if registered is not observer:
+                raise ValueError(f"Another observer already uses the id "
+                                 f"{observer.observer_id!r}; event log cursors need unique ids")
         print(f"{observer.name} has requested notification.")
-        self._discount_observers.append(observer)
+        self._discount_observers.add(observer)
+        subscribed = self._observer_topics.setdefault(id(observer), set())
+        matched_segments = [("segment", name) for name, predicate in self._segments.items()
+                            if predicate(observer)]
+        for topic in [*observer.notification_topics(), *topics, *matched_segments]:
+            self._index_observer(observer, topic, subscribed)
+        if self.event_log is not None:
+            cursor = self.event_log.cursor(observer.observer_id)
+            if cursor is None:
+                self.event_log.set_cursor(observer.observer_id, self.event_log.end_offset)
+            elif cursor < self.event_log.end_offset:
+                self._lagging.add(observer.observer_id)
 
     def cancel_request(self, observer: DiscountObserverInterface):
         print(f"{observer.name} has requested cancellation of notifications.")
         self._discount_observers.remove(observer)
+        if self._observer_ids.get(observer.observer_id) is observer:
+            del self._observer_ids[observer.observer_id]
+        for topic in self._observer_topics.pop(id(observer), ()):
+            self._topic_index[topic].discard(observer)
+
+    def define_segment(self, name, predicate):
+        """
+        Registers a named segment, e.g. gold tier customers in Texas. The predicate is
+        evaluated once per observer, here for existing observers and on subscription for new
+        ones, and matching observers are notified through the topic ("segment", name).
+        """
+        self._segments[name] = predicate
+        for observer in self._discount_observers:
+            if predicate(observer):
+                self._index_observer(observer, ("segment", name),
+                                     self._observer_topics.setdefault(id(observer), set()))
 
-    def notify_discount_start(self):
+    def observers_for(self, topic=None):
+        """Returns the observers subscribed to the topic, or every observer when topic is None"""
+        if topic is None:
+            return self._discount_observers
+        return self._topic_index.get(topic, ())
+
+    def _index_observer(self, observer, topic, subscribed):
+        if topic not in self._topic_index:
+            self._topic_index[topic] = ObserverRegistry()
+        self._topic_index[topic].add(observer)
+        subscribed.add(topic)
+
+    def _forget_topics(self, key):
+        self._observer_topics.pop(key, None)
+
+    def notify_discount_start(self, topic=None):
         """Allows the instance to nofity discounts have started"""
         print("Now notifying observers that discounts have started.")
-        for observer in self._discount_observers:
-            print(f"Notifying {observer.name} that discounts are starting.")
-            observer.discounts_have_started()
+        self._notify("start", topic)
 
-    def notify_discount_end(self):
+    def notify_discount_end(self, topic=None):
         """Allows instance to notify discounts have ended"""
         print("Now notifying observers that discounts have ended.")
-        for observer in self._discount_observers:
+        self._notify("end", topic)
+
+    @staticmethod
+    def _deliver(observer, event):
+        if event == "start":
+            print(f"Notifying {observer.name} that discounts are starting.")
+            observer.discounts_have_started()
+        else:
             print(f"Notifying {observer.name} that discounts are ending.")
             observer.discounts_have_ended()
 
+    def log_event(self, event, topic=None):
+        """Appends an event to the event log, returning its offset, or None without a log"""
+        return None if self.event_log is None else self.event_log.append(event, topic)
+
+    def deliver(self, observer, event, offset=None, notify=True):
+        """
+        Delivers a logged event to a single observer. A lagging observer is first replayed
+        what it missed, which includes the event; any other has its cursor moved past offset.
+        With notify unset, the handler is not called and only the cursor moves, for an
+        observer already in the event's state. A handler error leaves the observer lagging.
+        """
+        if offset is None:
+            if notify:
+                self._deliver(observer, event)
+            return
+        try:
+            if observer.observer_id in self._lagging:
+                self._replay(observer)
+                return
+            if notify:
+                self._deliver(observer, event)
+        except Exception:
+            self._lagging.add(observer.observer_id)
+            raise
+        cursor = self.event_log.cursor(observer.observer_id)
+        self.event_log.set_cursor(observer.observer_id, max(cursor or 0, offset + 1))
+
+    def _notify(self, event, topic):
+        # pylint: disable=locally-disabled, broad-exception-caught
+        offset = self.log_event(event, topic)
+        observers = list(self.observers_for(topic))
+        failure, handled = None, 0
+        try:
+            for observer in observers:
+                try:
+                    self.deliver(observer, event, offset)
+                except Exception as error:
+                    failure = failure or error
+                handled += 1
+        finally:
+            if offset is not None:
+                self._lagging.update(observer.observer_id for observer in observers[handled:])
+                self.event_log.save_cursors()
+        if failure is not None:
+            raise failure
+
+    def _replay(self, observer):
+        """Delivers the logged events an observer missed, returning how many"""
+
+        subscribed = self._observer_topics.get(id(observer), set())
+        delivered = 0
+        cursor = self.event_log.cursor(observer.observer_id)
+        for offset, event, topic in self.event_log.replay(cursor):
+            if topic is None or topic in subscribed:
+                self._deliver(observer, event)
+                delivered += 1
+            self.event_log.set_cursor(observer.observer_id, offset + 1)
+        self._lagging.discard(observer.observer_id)
+        return delivered
+
+    def replay_missed(self) -> int:
+        """Replays missed events to every lagging observer, returning how many were delivered"""
+
+        if self.event_log is None:
+            return 0
+        try:
+            return sum(self._replay(observer) for observer in list(self._discount_observers)
+                       if observer.observer_id in self._lagging)
+        finally:
+            self.event_log.save_cursors()
+
+    async def notify_discount_start_async(self, topic=None, batch_size=1000, max_concurrency=64,
+                                          handler_timeout=None) -> DeliveryReport:
+        """Allows the instance to notify discounts have started without blocking the event loop"""
+        return await self._notify_async("start", topic, batch_size, max_concurrency,
+                                        handler_timeout)
+
+    async def notify_discount_end_async(self, topic=None, batch_size=1000, max_concurrency=64,
+                                        handler_timeout=None) -> DeliveryReport:
+        """Allows the instance to notify discounts have ended without blocking the event loop"""
+        return await self._notify_async("end", topic, batch_size, max_concurrency,
+                                        handler_timeout)
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    async def _notify_async(self, event, topic, batch_size, max_concurrency, handler_timeout):
+        """
+        Logs the event, off the event loop, before dispatching it. Lagging observers are left
+        for replay_missed(); an observer whose handler fails or times out becomes lagging,
+        with its cursor moved back to the event so a replay covers it.
+        """
+        handler_name = "discounts_have_started" if event == "start" else "discounts_have_ended"
+        if self.event_log is None:
+            return await self._dispatch_async(handler_name, self.observers_for(topic),
+                                              batch_size, max_concurrency, handler_timeout)
+        offset = await asyncio.to_thread(self.event_log.append, event, topic)
+        observers = [observer for observer in self.observers_for(topic)
+                     if observer.observer_id not in self._lagging]
+        unsettled = {observer.observer_id for observer in observers}
+
+        def settle(observer, delivered):
+            unsettled.discard(observer.observer_id)
+            cursor = self.event_log.cursor(observer.observer_id)
+            if delivered and observer.observer_id not in self._lagging:
+                self.event_log.set_cursor(observer.observer_id, max(cursor or 0, offset + 1))
+            elif not delivered:
+                self._lagging.add(observer.observer_id)
+                self.event_log.set_cursor(observer.observer_id, min(offset, cursor or offset))
+
+        try:
+            return await self._dispatch_async(handler_name, observers, batch_size,
+                                              max_concurrency, handler_timeout, settle)
+        finally:
+            for observer_id in unsettled:
+                self._lagging.add(observer_id)
+                cursor = self.event_log.cursor(observer_id)
+                self.event_log.set_cursor(observer_id, min(offset, cursor or offset))
+            self.event_log.save_cursors()
+
+    @staticmethod
+    async def _dispatch_async(handler_name, observers, batch_size, max_concurrency,
+                              handler_timeout, settle=None):
+        """
+        Walks the observers in batches, yielding to the event loop between batches. Every
+        handler runs as a task, with at most max_concurrency of them in flight, so one slow
+        observer only ever holds one slot; plain handlers run on a worker thread, keeping the
+        loop free, and an awaitable they return is awaited too. handler_timeout applies to
+        both, although a plain handler that times out keeps its thread until it returns.
+        settle, if given, is called with each observer and whether its handler succeeded.
+        """
+        # pylint: disable=locally-disabled, too-many-locals, broad-exception-caught
+        started = time.perf_counter()
+        observers = list(observers)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        outcomes = {"delivered": 0, "failed": 0, "timed_out": 0}
+        pending = set()
+
+        def record(observer, outcome):
+            outcomes[outcome] += 1
+            if settle is not None:
+                settle(observer, outcome == "delivered")
+
+        async def call_in_thread(handler):
+            result = await asyncio.to_thread(handler)
+            if inspect.isawaitable(result):
+                await result
+
+        async def await_handler(observer, awaitable):
+            try:
+                await asyncio.wait_for(awaitable, handler_timeout)
+            except asyncio.TimeoutError:
+                record(observer, "timed_out")
+            except Exception:
+                record(observer, "failed")
+            else:
+                record(observer, "delivered")
+            finally:
+                semaphore.release()
+
+        for start in range(0, len(observers), batch_size):
+            for observer in observers[start:start + batch_size]:
+                handler = getattr(observer, handler_name)
+                await semaphore.acquire()
+                awaitable = handler() if inspect.iscoroutinefunction(handler) \
+                    else call_in_thread(handler)
+                task = asyncio.create_task(await_handler(observer, awaitable))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.sleep(0)
+
+        if pending:
+            await asyncio.gather(*pending)
+        return DeliveryReport(handler_name, outcomes["delivered"], outcomes["failed"],
+                              outcomes["timed_out"], time.perf_counter() - started)
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class TokenBucket():
+    """Allows rate events per second on average, in bursts of up to burst"""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = burst
+        self._updated = clock()
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available"""
+
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class CoalescingNotifier():
+    """
+    Sits in front of a PricingOptimizer's dispatch to absorb a flapping pricing engine.
+    Start and end requests for a topic are collected for window seconds from the first one,
+    then only the net state is delivered, and only to observers not already in that state,
+    so start, end, start within a window becomes a single start. Each observer may also be
+    limited to rate deliveries per second; a delivery over the limit is deferred and replaced
+    by any later state, so a rate limited observer only ever receives its latest state: each
+    pass first settles every observer's newest deferred or due state, skips observers already
+    in it, and only then spends tokens.
+
+    Changes are delivered by poll(), called by the owner or by the thread start() runs, or
+    all at once by flush(). Each net state is logged and delivered through the
+    PricingOptimizer, so its event log and lagging observers are kept as for any other
+    notification; observers skipped because they are already in that state just have their
+    cursors moved. As with the PricingOptimizer, a handler error is re-raised only after
+    every due delivery was made.
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def __init__(self, pricing_optimizer, window=0.5, rate=None, burst=1, clock=time.monotonic):
+        self.pricing_optimizer = pricing_optimizer
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._states = weakref.WeakKeyDictionary()
+        self._deferred = weakref.WeakKeyDictionary()
+        self._buckets = weakref.WeakKeyDictionary()
+        self._counters = dict.fromkeys(("requested", "naive_deliveries", "deliveries",
+                                        "deferred"), 0)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def notify_discount_start(self, topic=None):
+        """Requests that observers of topic learn discounts have started"""
+        self._request(topic, "start")
+
+    def notify_discount_end(self, topic=None):
+        """Requests that observers of topic learn discounts have ended"""
+        self._request(topic, "end")
+
+    def _request(self, topic, state):
+        with self._lock:
+            self._counters["requested"] += 1
+            self._counters["naive_deliveries"] += len(self.pricing_optimizer.observers_for(topic))
+            due = self._pending[topic][1] if topic in self._pending \
+                else self.clock() + self.window
+            self._pending[topic] = (state, due, self._counters["requested"])
+
+    def poll(self) -> int:
+        """Delivers the net state of topics whose window has passed; returns deliveries made"""
+        return self._deliver_pending(self.clock())
+
+    def flush(self) -> int:
+        """Delivers every pending state now, still subject to rate limits"""
+        return self._deliver_pending(None)
+
+    def _deliver_pending(self, now):
+        # pylint: disable=locally-disabled, broad-exception-caught
+        with self._lock:
+            delivered, failure = 0, None
+            latest = {id(observer): (observer, *deferred, True)
+                      for observer, deferred in self._deferred.items()}
+            self._deferred.clear()
+            due = sorted((request, topic, state) for topic, (state, due_at, request)
+                         in self._pending.items() if now is None or due_at <= now)
+            for request, topic, state in due:
+                del self._pending[topic]
+                offset = self.pricing_optimizer.log_event(state, topic)
+                for observer in list(self.pricing_optimizer.observers_for(topic)):
+                    retry = id(observer) in latest and latest[id(observer)][4]
+                    latest[id(observer)] = (observer, state, offset, request, retry)
+            try:
+                for observer, state, offset, request, retry in latest.values():
+                    try:
+                        delivered += self._deliver(observer, state, offset, request, retry)
+                    except Exception as error:
+                        failure = failure or error
+            finally:
+                if self.pricing_optimizer.event_log is not None:
+                    self.pricing_optimizer.event_log.save_cursors()
+            if failure is not None:
+                raise failure
+            return delivered
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def _deliver(self, observer, state, offset, request, retry=False):
+        if self._states.get(observer) == state:
+            self._deferred.pop(observer, None)
+            self.pricing_optimizer.deliver(observer, state, offset, notify=False)
+            return 0
+        if self.rate is not None:
+            bucket = self._buckets.get(observer)
+            if bucket is None:
+                bucket = self._buckets[observer] = TokenBucket(self.rate, self.burst, self.clock)
+            if not bucket.try_acquire():
+                if not retry:
+                    self._counters["deferred"] += 1
+                self._deferred[observer] = (state, offset, request)
+                return 0
+        self.pricing_optimizer.deliver(observer, state, offset)
+        self._states[observer] = state
+        self._counters["deliveries"] += 1
+        return 1
+
+    def stats(self) -> dict:
+        """
+        Returns the counters: requests made, deliveries those would have caused without
+        coalescing, deliveries made, deliveries deferred by rate limits, and deliveries saved
+        """
+
+        with self._lock:
+            return dict(self._counters, pending=len(self._pending) + len(self._deferred),
+                        saved=self._counters["naive_deliveries"] - self._counters["deliveries"])
+
+    def start(self, interval=None):
+        """Polls on a background thread every interval seconds, a tenth of window by default"""
+
+        self._stop.clear()
+        interval = interval or self.window / 10
+
+        def run():
+            while not self._stop.wait(interval):
+                self.poll()
+
+        self._thread = threading.Thread(target=run, name="coalescing-notifier", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background thread and delivers whatever is still pending"""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+_FRAME_HEADER = struct.Struct("<I")
+_ACK = struct.Struct("<QI")
+
+
+def _receive_exactly(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        data += chunk
+    return bytes(data)
+
+
+def _send_frame(connection, value):
+    payload = json.dumps(value, separators=(",", ":")).encode()
+    connection.sendall(_FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def _receive_frame(connection):
+    length = _FRAME_HEADER.unpack(_receive_exactly(connection, _FRAME_HEADER.size))[0]
+    return json.loads(_receive_exactly(connection, length))
+
+
+def serve_remote_observer(socket_path, observer_factory, ready=None):
+    """
+    Runs in an observer worker process: builds the observer with observer_factory(), listens
+    on the Unix domain socket at socket_path and calls the observer's handlers for every
+    event received. Every connection is served on its own thread, so several senders can
+    share one worker; their handlers run one batch at a time. A connection opens with the
+    sender's session id, answered with the highest sequence handled for that session. Each
+    following frame holds a batch of (sequence, event) pairs and is acknowledged with the
+    highest sequence handled and how many of the batch's handlers raised. Events a session
+    already had handled are skipped when resent; a handler that raises is reported and
+    counts as handled.
+    """
+
+    # pylint: disable=locally-disabled, broad-exception-caught
+    observer = observer_factory()
+    handlers = {"start": observer.discounts_have_started, "end": observer.discounts_have_ended}
+    handled = {}
+    lock = threading.Lock()
+
+    def serve(connection):
+        with connection:
+            try:
+                session = _receive_frame(connection)["session"]
+                with lock:
+                    acknowledged = handled.get(session, 0)
+                connection.sendall(_ACK.pack(acknowledged, 0))
+                while True:
+                    batch = _receive_frame(connection)
+                    failed = 0
+                    with lock:
+                        for sequence, event in batch:
+                            if sequence > handled.get(session, 0):
+                                try:
+                                    handlers[event]()
+                                except Exception as error:
+                                    failed += 1
+                                    print(f"{observer.name} failed to handle {event!r}: "
+                                          f"{error!r}")
+                                handled[session] = sequence
+                        acknowledged = handled.get(session, 0)
+                    connection.sendall(_ACK.pack(acknowledged, failed))
+            except ConnectionError:
+                return
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        server.listen()
+        if ready is not None:
+            ready.set()
+        while True:
+            connection, _ = server.accept()
+            threading.Thread(target=serve, args=(connection,), daemon=True).start()
+
+
+class WorkerRestartLimitError(RuntimeError):
+    """Raised when an observer worker has died more often than it may be restarted"""
+
+
+class ObserverWorker():
+    """
+    Runs serve_remote_observer in a child process, restarting it if it has died, at most
+    max_restarts times
+    """
+
+    def __init__(self, socket_path, observer_factory, start_timeout=10.0, max_restarts=5):
+        self.socket_path = socket_path
+        self.observer_factory = observer_factory
+        self.start_timeout = start_timeout
+        self.max_restarts = max_restarts
+        self.process = None
+        self.restarts = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts the worker process and waits until it is listening"""
+
+        ready = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=serve_remote_observer, args=(self.socket_path, self.observer_factory, ready),
+            daemon=True)
+        self.process.start()
+        if not ready.wait(self.start_timeout):
+            raise TimeoutError(f"Observer worker did not start within {self.start_timeout}s")
+
+    def ensure_running(self):
+        """Restarts the worker process if it is not alive, unless it used up its restarts"""
+
+        with self._lock:
+            if self.process is None or not self.process.is_alive():
+                if self.process is not None:
+                    if self.restarts >= self.max_restarts:
+                        raise WorkerRestartLimitError(
+                            f"Observer worker at {self.socket_path} died after "
+                            f"{self.restarts} restarts")
+                    self.process.join()
+                    self.restarts += 1
+                self.start()
+
+    def stop(self):
+        """Stops the worker process"""
+
+        with self._lock:
+            if self.process is not None:
+                self.process.terminate()
+                self.process.join()
+                self.process = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+# pylint: disable=locally-disabled, too-many-instance-attributes
+class RemoteObserver(DiscountObserverInterface):
+    """
+    Stands in, within the PricingOptimizer's process, for an observer running in another
+    process. Handlers only queue the event; a sender thread writes everything queued, up to
+    max_batch events, as one frame per sendall over a Unix domain socket and waits for the
+    worker's acknowledgement. Each connection opens with a session id unique to this
+    instance, so the worker keeps its duplicate detection apart from other senders'. If the
+    connection fails, the sender reconnects, restarting the worker first if one is given and
+    it has died, and resends whatever the worker has not acknowledged, so events are
+    delivered at least once. Once the worker runs out of restarts the sender gives up: the
+    error is kept in `error`, queued events are dropped and flush() returns False. At most
+    max_buffered events are queued; beyond that the oldest are dropped and counted.
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def __init__(self, name, socket_path, region=None, worker=None, max_batch=1024,
+                 max_buffered=100_000, timeout=5.0, reconnect_delay=0.05, observer_id=None):
+        super().__init__(name, region, observer_id)
+        self.socket_path = socket_path
+        self.worker = worker
+        self.max_batch = max_batch
+        self.max_buffered = max_buffered
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._session = os.urandom(16).hex()
+        self._sequence = 0
+        self._acknowledged = 0
+        self._closing = False
+        self._abandoned = False
+        self.error = None
+        self._counters = dict.fromkeys(("events", "batches", "reconnects", "dropped", "failed"),
+                                       0)
+        self._sender = threading.Thread(target=self._send_forever, name=f"remote-{name}",
+                                        daemon=True)
+        self._sender.start()
+
+    def discounts_have_started(self):
+        self._enqueue("start")
+
+    def discounts_have_ended(self):
+        self._enqueue("end")
+
+    def _enqueue(self, event):
+        with self._condition:
+            if self.error is not None:
+                self._counters["dropped"] += 1
+                return
+            if len(self._queue) >= self.max_buffered:
+                self._queue.popleft()
+                self._counters["dropped"] += 1
+            self._sequence += 1
+            self._queue.append((self._sequence, event))
+            self._condition.notify_all()
+
+    def _connect(self):
+        if self.worker is not None:
+            self.worker.ensure_running()
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(self.socket_path)
+            _send_frame(connection, {"session": self._session})
+            acknowledged, _ = _ACK.unpack(_receive_exactly(connection, _ACK.size))
+        except OSError:
+            connection.close()
+            raise
+        with self._condition:
+            self._acknowledged = max(self._acknowledged, acknowledged)
+        return connection
+
+    def _send_forever(self):
+        connection = None
+        batch = []
+        while True:
+            with self._condition:
+                while not batch and not self._queue and not self._closing:
+                    self._condition.wait()
+                if not batch and not self._queue:
+                    break
+                if not batch:
+                    batch = [self._queue.popleft()
+                             for _ in range(min(self.max_batch, len(self._queue)))]
+            try:
+                if connection is None:
+                    connection = self._connect()
+                batch = [item for item in batch if item[0] > self._acknowledged]
+                if not batch:
+                    continue
+                _send_frame(connection, batch)
+                acknowledged, failed = _ACK.unpack(_receive_exactly(connection, _ACK.size))
+            except WorkerRestartLimitError as error:
+                with self._condition:
+                    self.error = error
+                    self._counters["dropped"] += len(batch) + len(self._queue)
+                    self._queue.clear()
+                    self._condition.notify_all()
+                break
+            except (OSError, TimeoutError):
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                with self._condition:
+                    self._counters["reconnects"] += 1
+                    if self._abandoned:
+                        break
+                time.sleep(self.reconnect_delay)
+                continue
+            with self._condition:
+                self._acknowledged = max(self._acknowledged, acknowledged)
+                self._counters["events"] += sum(1 for item in batch if item[0] <= acknowledged)
+                self._counters["batches"] += 1
+                self._counters["failed"] += failed
+                self._condition.notify_all()
+            batch = [item for item in batch if item[0] > acknowledged]
+        if connection is not None:
+            connection.close()
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Waits until every queued event is acknowledged; returns False on timeout or if the
+        sender gave up on the worker
+        """
+
+        with self._condition:
+            target = self._sequence
+            self._condition.wait_for(
+                lambda: self.error is not None or self._acknowledged >= target, timeout)
+            return self._acknowledged >= target
+
+    def stats(self) -> dict:
+        """
+        Returns counts of events and batches delivered, reconnects, dropped events and
+        events whose handler raised in the worker
+        """
+
+        with self._condition:
+            return dict(self._counters, queued=len(self._queue))
+
+    def close(self, timeout=5.0):
+        """Delivers what is queued, giving up after timeout seconds, and stops the sender"""
+
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._sender.join(timeout)
+        if self._sender.is_alive():
+            with self._condition:
+                self._abandoned = True
+                self._queue.clear()
+                self._condition.notify_all()
+            self._sender.join()
+
+
+class _CountingObserver(DiscountObserverInterface):
+    """Observer that only counts its notifications, for benchmarks"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.notifications = 0
+
+    def discounts_have_started(self):
+        self.notifications += 1
+
+    def discounts_have_ended(self):
+        self.notifications += 1
+
+
+def benchmark_remote_delivery(events=50_000, samples=200):
+    """Compares event throughput and latency of in-process and RemoteObserver delivery"""
+
+    local = _CountingObserver("local")
+    started = time.perf_counter()
+    for _ in range(events):
+        local.discounts_have_started()
+    local_rate = events / (time.perf_counter() - started)
+
+    with tempfile.TemporaryDirectory() as directory:
+        worker = ObserverWorker(os.path.join(directory, "observer.sock"),
+                                partial(_CountingObserver, "remote"))
+        worker.start()
+        remote = RemoteObserver("remote", worker.socket_path, worker=worker)
+        started = time.perf_counter()
+        for _ in range(events):
+            remote.discounts_have_started()
+        remote.flush()
+        remote_rate = events / (time.perf_counter() - started)
+        latencies = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            remote.discounts_have_started()
+            remote.flush()
+            latencies.append(time.perf_counter() - started)
+        batches = remote.stats()["batches"]
+        remote.close()
+        worker.stop()
+    latencies.sort()
+    print(f"In process: {local_rate:14,.0f} events/s")
+    print(f"Remote:     {remote_rate:14,.0f} events/s in {batches - samples} batches, "
+          f"round trip p50 {latencies[len(latencies) // 2] * 1e6:.0f}us, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e6:.0f}us")
+    return {"local": local_rate, "remote": remote_rate}
+
+
+def _append_events(log, count):
+    for _ in range(count):
+        log.append("start", ("tier", "gold"))
+
+
+def benchmark_event_log(events=20_000, threads=8):
+    """Measures event log append throughput, with and without group commit, and replay"""
+
+    results = {}
+    for name, fsync in (("append, no fsync", False), ("append, group commit", True)):
+        with tempfile.TemporaryDirectory() as directory:
+            log = DiscountEventLog(directory, fsync=fsync)
+            workers = [threading.Thread(target=_append_events, args=(log, events // threads))
+                       for _ in range(threads)]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            results[name] = log.end_offset / (time.perf_counter() - started)
+            started = time.perf_counter()
+            replayed = sum(1 for _ in log.replay())
+            results["replay"] = replayed / (time.perf_counter() - started)
+            log.close()
+    for name, rate in results.items():
+        print(f"{name:>20}: {rate:12,.0f} events/s")
+    return results
+
 
 def demo_observer_pattern():
     """Demo the Observer design pattern as implemented using the classes above"""
@@ -114,5 +1184,46 @@ def demo_observer_pattern():
     print("")
     pricing_system.notify_discount_end()
 
+
+def demo_async_observer_pattern():
+    """Demo dispatching discount notifications to observers through asyncio"""
+
+    class SlowWarehouse(Warehouse):
+        """Warehouse whose notification handler takes a while to complete"""
+        # pylint: disable=locally-disabled, invalid-overridden-method
+        async def discounts_have_started(self):
+            await asyncio.sleep(0.5)
+            super().discounts_have_started()
+
+    pricing_system = PricingOptimizer()
+    customers = [Customer(f"Customer {number}") for number in range(3)]
+    slow_warehouse = SlowWarehouse("Slow Facility")
+    for observer in [slow_warehouse, *customers]:
+        pricing_system.request_notification(observer)
+    print("")
+    report = asyncio.run(pricing_system.notify_discount_start_async(handler_timeout=0.1))
+    print(report)
+
+
+def demo_targeted_observer_pattern():
+    """Demo notifying only the observers subscribed to a topic or segment"""
+
+    pricing_system = PricingOptimizer()
+    sally = Customer("Sally", region="TX", tier="gold")
+    pat = Customer("Pat", region="MA", tier="gold")
+    bobby = Customer("Bobby", region="TX", tier="silver")
+    austin_warehouse = Warehouse("Austin Facility", region="TX")
+    for observer in [sally, pat, bobby, austin_warehouse]:
+        pricing_system.request_notification(observer)
+    pricing_system.define_segment("texas gold",
+                                  lambda observer: observer.region == "TX"
+                                  and getattr(observer, "tier", None) == "gold")
+    print("")
+    pricing_system.notify_discount_start(("type", "Warehouse"))
+    print("")
+    pricing_system.notify_discount_start(("tier", "gold"))
+    print("")
+    pricing_system.notify_discount_end(("segment", "texas gold"))
+
 if __name__ == "__main__":
     demo_observer_pattern()
@@ -1,11 +1,231 @@
 """Module providing an example of the Template Method design pattern."""
 
-
+import hashlib
+import heapq
+import io
+import itertools
+import mmap
+import os
+import re
+import sys
+import threading
+import time
 from abc import ABC, abstractmethod
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager, redirect_stdout
+
+
+class AIModel():
+    """A loaded AI model: its identity, the parameters it was loaded with and its weights"""
+
+    def __init__(self, name, parameters, weights):
+        self.name = name
+        self.parameters = dict(parameters)
+        self.weights = weights
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the model's weights in bytes"""
+        return memoryview(self.weights).nbytes
+
+    def __repr__(self):
+        return f"AIModel({self.name!r}, {self.parameters!r}, {self.nbytes:,} bytes)"
+
+
+def simulate_model_load(name, parameters, size=100_000):
+    """Stands in for loading a model's weights from a model store"""
+
+    seed = sum(repr((name, sorted(parameters.items()))).encode())
+    return AIModel(name, parameters,
+                   array("d", ((number * seed) % 997 / 997 for number in range(size))))
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class _ModelLoad():
+    """A model load in progress that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.model = None
+        self.error = None
+
+
+# pylint: disable=locally-disabled, too-many-instance-attributes
+class ModelCache():
+    """
+    Keeps loaded AI models keyed by model name and parameters, so each model is loaded once
+    per process however many analyses use it. Models are loaded lazily on first request and
+    evicted least recently used first beyond max_entries or max_bytes of weights. Concurrent
+    requests for a model that is not loaded yet share a single load.
+
+    With mmap_directory set, weights are written there once and mapped read-only, so every
+    process using the same directory shares one copy of each model's weights in the page
+    cache, and a model another process already wrote is mapped instead of loaded.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=1024 * 1024 * 1024, mmap_directory=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.mmap_directory = mmap_directory
+        self._entries = OrderedDict()
+        self._loads = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(("hits", "misses", "loads", "mapped", "evictions"), 0)
+
+    @staticmethod
+    def key(name, parameters):
+        """Returns the cache key for a model name and its parameters"""
+        return name, tuple(sorted(parameters.items()))
+
+    def get(self, name, parameters=None, loader=simulate_model_load) -> AIModel:
+        """Returns the model for name and parameters, calling loader(name, parameters) once"""
+
+        parameters = parameters or {}
+        cache_key = self.key(name, parameters)
+        with self._lock:
+            model = self._entries.get(cache_key)
+            if model is not None:
+                self._entries.move_to_end(cache_key)
+                self._stats["hits"] += 1
+                return model
+            self._stats["misses"] += 1
+            load = self._loads.get(cache_key)
+            leader = load is None
+            if leader:
+                load = self._loads[cache_key] = _ModelLoad()
+        if leader:
+            self._load(cache_key, load, lambda: self._materialize(cache_key, parameters, loader))
+        else:
+            load.done.wait()
+        if load.error is not None:
+            raise load.error
+        return load.model
+
+    def _materialize(self, cache_key, parameters, loader):
+        if self.mmap_directory is None:
+            return loader(cache_key[0], parameters), False
+        digest = hashlib.blake2b(repr(cache_key).encode(), digest_size=16).hexdigest()
+        path = os.path.join(self.mmap_directory, f"{digest}.weights")
+        mapped = os.path.exists(path)
+        if not mapped:
+            weights = array("d", loader(cache_key[0], parameters).weights)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as weights_file:
+                weights.tofile(weights_file)
+            os.replace(temporary, path)
+        with open(path, "rb") as weights_file:
+            weights = memoryview(mmap.mmap(weights_file.fileno(), 0, access=mmap.ACCESS_READ))
+        return AIModel(cache_key[0], parameters, weights.cast("d")), mapped
+
+    def _load(self, cache_key, load, materialize):
+        # pylint: disable=locally-disabled, broad-exception-caught
+        mapped = False
+        try:
+            load.model, mapped = materialize()
+        except Exception as error:
+            load.error = error
+        with self._lock:
+            del self._loads[cache_key]
+            if load.error is None:
+                self._stats["mapped" if mapped else "loads"] += 1
+                self._entries[cache_key] = load.model
+                self._bytes += load.model.nbytes
+                while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                                  or self._bytes > self.max_bytes):
+                    self._bytes -= self._entries.popitem(last=False)[1].nbytes
+                    self._stats["evictions"] += 1
+        load.done.set()
+
+    def clear(self):
+        """Drops every cached model"""
+
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns the hit, miss, load, mapped and eviction counters and the cache's size"""
+
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+MODEL_CACHE = ModelCache()
+
+
+class StepTiming():
+    """When a report step started and finished, in seconds since the report started"""
+
+    def __init__(self, name, started, finished):
+        self.name = name
+        self.started = started
+        self.finished = finished
+
+    @property
+    def duration(self) -> float:
+        """How long the step ran for, in seconds"""
+        return self.finished - self.started
+
+    def __repr__(self):
+        return (f"StepTiming({self.name!r}, started={self.started * 1000:.1f}ms, "
+                f"duration={self.duration * 1000:.1f}ms)")
+
+
+class ReportTimings():
+    """Timing breakdown of one generate_report() call"""
+
+    def __init__(self, steps, dependencies, elapsed):
+        self.steps = steps
+        self.dependencies = dependencies
+        self.elapsed = elapsed
+
+    def critical_path(self):
+        """
+        Returns the chain of dependent steps with the longest total duration, and that
+        duration, which is the least time the report could take however many steps overlap
+        """
+
+        longest = {}
+        for name in self.steps:
+            before = max((longest[dependency] for dependency in self.dependencies[name]),
+                         key=lambda path: path[1], default=((), 0.0))
+            longest[name] = (before[0] + (name,), before[1] + self.steps[name].duration)
+        path, seconds = max(longest.values(), key=lambda path: path[1], default=((), 0.0))
+        return list(path), seconds
+
+    def __str__(self):
+        path, seconds = self.critical_path()
+        lines = [f"{step.name:>16}: {step.duration * 1000:8.1f}ms, "
+                 f"started at {step.started * 1000:.1f}ms" for step in self.steps.values()]
+        lines.append(f"{'critical path':>16}: {seconds * 1000:8.1f}ms ({' -> '.join(path)})")
+        lines.append(f"{'elapsed':>16}: {self.elapsed * 1000:8.1f}ms")
+        return "\n".join(lines)
 
 
 class DataAnalysisTemplate(ABC):
-    """Provides an interface for providing various types of data analysis"""
+    """
+    Provides an interface for providing various types of data analysis
+
+    step_dependencies names the hooks generate_report() runs and the hooks each one needs
+    to have finished first. Subclasses can override it to add hooks of their own.
+    """
+
+    model_name = "generic"
+    model_parameters = {}
+    model = None
+    input_data = None
+
+    step_dependencies = {
+        "load_input_data": (),
+        "load_AI_data": (),
+        "transform_data": ("load_input_data", "load_AI_data"),
+    }
 
     @abstractmethod
     def load_input_data(self):
@@ -14,6 +234,7 @@ class DataAnalysisTemplate(ABC):
     # pylint: disable=locally-disabled, invalid-name
     def load_AI_data(self):
         """Loads an generic AI model by default in this example"""
+        self.model = MODEL_CACHE.get(self.model_name, self.model_parameters)
         print("AI data loaded.")
 
     @abstractmethod
@@ -23,13 +244,69 @@ class DataAnalysisTemplate(ABC):
         potentially other sources
         """
 
-    def generate_report(self):
-        """Generates output that human consumers can read/understand based on transformed data"""
+    def generate_report(self, concurrent=False) -> ReportTimings:
+        """
+        Generates output that human consumers can read/understand based on transformed data.
+        With concurrent set, each hook runs on a thread as soon as the hooks it depends on have
+        finished, so independent hooks such as load_input_data and load_AI_data overlap.
+        """
 
-        self.load_input_data()
-        self.load_AI_data()
-        self.transform_data()
+        order = self._step_order()
+        started = time.perf_counter()
+        if concurrent:
+            steps = self._run_steps_concurrently(order, started)
+        else:
+            steps = {name: self._run_step(name, started) for name in order}
+        timings = ReportTimings({name: steps[name] for name in order},
+                                {name: tuple(self.step_dependencies[name]) for name in order},
+                                time.perf_counter() - started)
         print("Generating report... Done!")
+        return timings
+
+    def _step_order(self):
+        """Returns the hooks in declaration order, moving each after its dependencies"""
+
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Report steps have a dependency cycle through {name}")
+            if name not in self.step_dependencies:
+                raise ValueError(f"Unknown report step {name}")
+            visiting.add(name)
+            for dependency in self.step_dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.step_dependencies:
+            visit(name)
+        return order
+
+    def _run_step(self, name, origin):
+        step_started = time.perf_counter() - origin
+        getattr(self, name)()
+        return StepTiming(name, step_started, time.perf_counter() - origin)
+
+    def _run_steps_concurrently(self, order, origin):
+        waiting_on = {name: set(self.step_dependencies[name]) for name in order}
+        steps = {}
+        with ThreadPoolExecutor(max_workers=len(order) or 1) as pool:
+            running = {}
+            while waiting_on or running:
+                for name in [name for name in order if waiting_on.get(name) == set()]:
+                    del waiting_on[name]
+                    running[pool.submit(self._run_step, name, origin)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    steps[name] = future.result()
+                    for dependencies in waiting_on.values():
+                        dependencies.discard(name)
+        return steps
 
 
 class WebTrafficDataAnalysis(DataAnalysisTemplate):
@@ -42,6 +319,147 @@ class WebTrafficDataAnalysis(DataAnalysisTemplate):
         print("Web data transformed to match AI model input.")
 
 
+class LogTail():
+    """
+    Follows a growing log file, returning the complete lines appended since the last read.
+    When the file is rotated (renamed and replaced) the rest of the old file is read before
+    following the new one from its start; a file truncated in place is read from its start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._identity = None
+        self._partial = b""
+
+    def _open(self):
+        try:
+            self._file = open(self.path, "rb")  # pylint: disable=locally-disabled, consider-using-with
+        except FileNotFoundError:
+            self._file = self._identity = None
+            return
+        stat = os.fstat(self._file.fileno())
+        self._identity = (stat.st_dev, stat.st_ino)
+
+    def _read_complete_lines(self):
+        data = self._partial + self._file.read()
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+        return data[:end].splitlines()
+
+    def read_lines(self):
+        """Returns the lines completed since the last call, as bytes without line endings"""
+
+        if self._file is None:
+            self._open()
+            if self._file is None:
+                return []
+        lines = self._read_complete_lines()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return lines
+        if (stat.st_dev, stat.st_ino) != self._identity:
+            if self._partial:
+                lines.append(self._partial)
+                self._partial = b""
+            self.close()
+            self._open()
+            if self._file is not None:
+                lines.extend(self._read_complete_lines())
+        elif stat.st_size < self._file.tell():
+            self._file.seek(0)
+            self._partial = b""
+            lines.extend(self._read_complete_lines())
+        return lines
+
+    def close(self):
+        """Closes the file being followed"""
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+COMBINED_LOG_LINE = re.compile(
+    rb'(?P<host>\S+) \S+ \S+ \[[^\]]*\] "(?P<method>\S+) (?P<path>\S+)[^"]*" '
+    rb'(?P<status>\d{3}) (?P<bytes>\d+|-)')
+
+
+class WebTrafficAggregates():
+    """Running totals over parsed web server log lines"""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes_sent = 0
+        self.malformed = 0
+        self.statuses = Counter()
+        self.paths = Counter()
+        self.hosts = set()
+
+    def update(self, lines):
+        """Folds Common or Combined Log Format lines into the totals"""
+
+        for line in lines:
+            match = COMBINED_LOG_LINE.match(line)
+            if match is None:
+                self.malformed += 1
+                continue
+            self.requests += 1
+            sent = match["bytes"]
+            if sent != b"-":
+                self.bytes_sent += int(sent)
+            self.statuses[int(match["status"])] += 1
+            self.paths[match["path"].decode(errors="replace")] += 1
+            self.hosts.add(match["host"])
+
+    @property
+    def error_rate(self) -> float:
+        """Share of requests answered with a 5xx status"""
+
+        errors = sum(count for status, count in self.statuses.items() if status >= 500)
+        return errors / self.requests if self.requests else 0.0
+
+    def summary(self, top=5):
+        """Returns the totals as a dict, with the top most requested paths"""
+
+        return {"requests": self.requests, "bytes_sent": self.bytes_sent,
+                "unique_hosts": len(self.hosts), "error_rate": self.error_rate,
+                "top_paths": self.paths.most_common(top), "malformed": self.malformed}
+
+
+class StreamingWebTrafficDataAnalysis(WebTrafficDataAnalysis):
+    """
+    Analysis of web server logs that are still being written. Each generate_report() call
+    parses only the lines appended since the previous one and folds them into running
+    aggregates, so a refresh costs time proportional to the new lines.
+    """
+
+    def __init__(self, paths):
+        self.tails = [LogTail(path) for path in paths]
+        self.aggregates = WebTrafficAggregates()
+        self.new_lines = 0
+
+    def load_input_data(self):
+        self.new_lines = 0
+        for tail in self.tails:
+            lines = tail.read_lines()
+            self.new_lines += len(lines)
+            self.aggregates.update(lines)
+        print(f"Web logs tailed, {self.new_lines} new lines parsed.")
+
+    def transform_data(self):
+        summary = self.aggregates.summary()
+        print(f"Web traffic so far: {summary['requests']} requests from "
+              f"{summary['unique_hosts']} hosts, {summary['error_rate']:.1%} errors.")
+
+    def close(self):
+        """Stops following the log files"""
+
+        for tail in self.tails:
+            tail.close()
+
+
 class FootTrafficDataAnalysis(DataAnalysisTemplate):
     """Provides ability to perform analysis on retail foot traffic"""
 
@@ -54,15 +472,259 @@ class FootTrafficDataAnalysis(DataAnalysisTemplate):
 
 class PreSalesDataAnalysis(DataAnalysisTemplate):
     """Provides ability to perform analysis on pre sales data gathered by marketing department"""
+
+    model_parameters = {"domain": "sales", "horizon_days": 90}
+
     def load_input_data(self):
         print("Pre sales data loaded.")
 
     def load_AI_data(self):
+        self.model = MODEL_CACHE.get(self.model_name, self.model_parameters)
         print("AI model has been loaded with additional parameters for sales data.")
 
     def transform_data(self):
         print("Pre sales data has been transformed to match pre sales AI model.")
 
+class ReportJob():
+    """One report to generate: which analysis to run, on what input and how urgently"""
+
+    def __init__(self, job_id, analysis_class, input_data=None, priority=0):
+        self.job_id = job_id
+        self.analysis_class = analysis_class
+        self.input_data = input_data
+        self.priority = priority
+
+    def __repr__(self):
+        return f"ReportJob({self.job_id}, {self.analysis_class.__name__}, priority={self.priority})"
+
+
+class ReportResult():
+    """The outcome of a ReportJob: the report's output and timings, or why it has none"""
+
+    def __init__(self, job, output="", timings=None, error=None, cancelled=False):
+        self.job = job
+        self.output = output
+        self.timings = timings
+        self.error = error
+        self.cancelled = cancelled
+
+    @property
+    def succeeded(self) -> bool:
+        """Whether the report was generated"""
+        return self.error is None and not self.cancelled
+
+    def __repr__(self):
+        status = "cancelled" if self.cancelled else "failed" if self.error else "succeeded"
+        return f"ReportResult({self.job!r}, {status})"
+
+
+class _ThreadLocalStdout():
+    """
+    Stands in for sys.stdout, writing to the stream a thread is capturing into, if any, and
+    to the stdout it replaced otherwise
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.local = threading.local()
+
+    @property
+    def target(self):
+        """The stream the calling thread writes to"""
+        return getattr(self.local, "target", None) or self.fallback
+
+    def write(self, text):
+        """Writes text to the calling thread's stream"""
+        return self.target.write(text)
+
+    def flush(self):
+        """Flushes the calling thread's stream"""
+        self.target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+_STDOUT_LOCK = threading.Lock()
+
+
+@contextmanager
+def capture_stdout(output):
+    """
+    Like contextlib.redirect_stdout, but only for the calling thread, so threads capturing
+    at the same time each get their own output. sys.stdout is replaced once by a proxy that
+    passes every other thread's writes through.
+    """
+
+    with _STDOUT_LOCK:
+        proxy = sys.stdout
+        if not isinstance(proxy, _ThreadLocalStdout):
+            proxy = sys.stdout = _ThreadLocalStdout(sys.stdout)
+    previous = getattr(proxy.local, "target", None)
+    proxy.local.target = output
+    try:
+        yield output
+    finally:
+        proxy.local.target = previous
+
+
+def run_report_batch(analysis_class, inputs):
+    """
+    Generates one report per input with the same analysis class, capturing what each prints.
+    Runs in pool workers, whose MODEL_CACHE stays warm from one batch to the next.
+    """
+
+    # pylint: disable=locally-disabled, broad-exception-caught
+    outcomes = []
+    for input_data in inputs:
+        output = io.StringIO()
+        analysis = analysis_class()
+        analysis.input_data = input_data
+        try:
+            with capture_stdout(output):
+                timings = analysis.generate_report()
+            outcomes.append((output.getvalue(), timings, None))
+        except Exception as error:
+            outcomes.append((output.getvalue(), None, error))
+    return outcomes
+
+
+class BatchReportRunner():
+    """
+    Generates many reports on a process or thread pool. Queued jobs are dispatched highest
+    priority first, in batches of up to batch_size jobs sharing an analysis class and
+    priority, so each worker reuses its loaded models across a batch. Only a couple of
+    batches per worker are in flight at a time; the rest stay queued, so jobs submitted
+    later with a higher priority go first and queued jobs can still be cancelled.
+    """
+
+    def __init__(self, executor="process", max_workers=None, batch_size=16):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"executor must be 'thread' or 'process', not {executor!r}")
+        self.executor = executor
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._order = []
+        self._cancelled = deque()
+        self._job_ids = itertools.count()
+
+    def submit(self, analysis_class, input_data=None, priority=0) -> ReportJob:
+        """Queues a report, returning its job. Higher priorities are dispatched first."""
+
+        job = ReportJob(next(self._job_ids), analysis_class, input_data, priority)
+        key = (priority, analysis_class)
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = OrderedDict()
+                heapq.heappush(self._order, (-priority, job.job_id, key))
+            queue[job.job_id] = job
+        return job
+
+    def cancel(self, job) -> bool:
+        """Removes a job that has not been dispatched yet; returns whether it was removed"""
+
+        with self._lock:
+            queue = self._queues.get((job.priority, job.analysis_class))
+            if queue is None or queue.pop(job.job_id, None) is None:
+                return False
+            self._cancelled.append(job)
+            return True
+
+    def pending(self) -> int:
+        """Number of queued jobs not yet dispatched"""
+
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _next_batch(self):
+        with self._lock:
+            while self._order:
+                key = self._order[0][2]
+                queue = self._queues[key]
+                batch = [queue.popitem(last=False)[1]
+                         for _ in range(min(self.batch_size, len(queue)))]
+                if not queue:
+                    heapq.heappop(self._order)
+                    del self._queues[key]
+                if batch:
+                    return batch
+            return None
+
+    def _drain_cancelled(self):
+        with self._lock:
+            cancelled, self._cancelled = self._cancelled, deque()
+        return [ReportResult(job, cancelled=True) for job in cancelled]
+
+    def run(self):
+        """
+        Generates every queued report, yielding each ReportResult as its batch finishes.
+        Jobs may be submitted or cancelled while the results are being consumed.
+        """
+
+        # pylint: disable=locally-disabled, broad-exception-caught
+        pool_class = ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=self.max_workers) as pool:
+            running = {}
+            while True:
+                while len(running) < 2 * self.max_workers:
+                    batch = self._next_batch()
+                    if batch is None:
+                        break
+                    future = pool.submit(run_report_batch, batch[0].analysis_class,
+                                         [job.input_data for job in batch])
+                    running[future] = batch
+                yield from self._drain_cancelled()
+                if not running:
+                    return
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in [future for future in running if future in done]:
+                    batch = running.pop(future)
+                    try:
+                        outcomes = future.result()
+                    except Exception as error:
+                        outcomes = [("", None, error)] * len(batch)
+                    for job, (output, timings, error) in zip(batch, outcomes):
+                        yield ReportResult(job, output, timings, error)
+
+
+class ScoredWebTrafficDataAnalysis(WebTrafficDataAnalysis):
+    """Web traffic analysis that scores input_data visits against the model's weights"""
+
+    score = None
+
+    def transform_data(self):
+        weights = self.model.weights
+        self.score = sum(weights[visit % len(weights)] for visit in range(self.input_data or 0))
+        super().transform_data()
+
+
+def benchmark_batch_reports(jobs=2_000, visits=20_000, max_workers=None):
+    """Compares generating reports in a sequential loop with BatchReportRunner"""
+
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for _ in range(jobs):
+            analysis = ScoredWebTrafficDataAnalysis()
+            analysis.input_data = visits
+            analysis.generate_report()
+    sequential = time.perf_counter() - started
+
+    runner = BatchReportRunner(max_workers=max_workers)
+    for _ in range(jobs):
+        runner.submit(ScoredWebTrafficDataAnalysis, visits)
+    started = time.perf_counter()
+    failures = sum(not result.succeeded for result in runner.run())
+    batched = time.perf_counter() - started
+
+    print(f"Sequential loop: {jobs / sequential:,.0f} reports/s")
+    print(f"BatchReportRunner with {runner.max_workers} workers: {jobs / batched:,.0f} reports/s"
+          f" ({failures} failed)")
+    return {"sequential": jobs / sequential, "batched": jobs / batched}
+
+
 def demo_template_method_pattern():
     """Demo the Template Method design pattern as implemented using the classes above"""
     algorithms_to_execute = [WebTrafficDataAnalysis, FootTrafficDataAnalysis, PreSalesDataAnalysis]
@@ -71,6 +733,28 @@ def demo_template_method_pattern():
         algorithm().generate_report()
         print("")
 
+    print(f"Model cache: {MODEL_CACHE.stats()}")
+
+
+def demo_concurrent_template_method_pattern():
+    """Demo generating reports with independent hooks overlapping, and their timings"""
+
+    class SlowWebTrafficDataAnalysis(WebTrafficDataAnalysis):
+        """Web traffic analysis where loading the logs and the AI model take a while"""
+
+        def load_input_data(self):
+            time.sleep(0.2)
+            super().load_input_data()
+
+        # pylint: disable=locally-disabled, invalid-name
+        def load_AI_data(self):
+            time.sleep(0.3)
+            super().load_AI_data()
+
+    for concurrent in (False, True):
+        print(SlowWebTrafficDataAnalysis().generate_report(concurrent=concurrent))
+        print("")
+
 
 if __name__ == "__main__":
     demo_template_method_pattern()
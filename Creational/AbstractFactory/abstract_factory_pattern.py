@@ -1,6 +1,12 @@
 """Module providing an example of the Abstract Factory design pattern."""
 
+import math
+import threading
+import time
+import tracemalloc
 from abc import ABC, abstractmethod
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 
@@ -228,6 +234,304 @@ class ContractorEquipmentFactory(EquipmentFactoryInterface):
         return Webcam1080p()
 
 
+EQUIPMENT_FACTORIES = {factory.employee_equipment_type: factory for factory in (
+    RemoteEquipmentFactory, OnsiteEquipmentFactory, ExecutiveEquipmentFactory,
+    ContractorEquipmentFactory)}
+
+KIT_SLOTS = ("computer", "monitor", "webcam")
+
+EQUIPMENT_CATALOG = {
+    EmployeeEquipmentType.REMOTE: ("Macbook Air", "4k Monitor", "1080p Webcam"),
+    EmployeeEquipmentType.ONSITE: ("Mac Mini", "Dual 4k Monitors", "1080p Webcam"),
+    EmployeeEquipmentType.EXECUTIVE: ("Mac Mini", "Dual 4k Monitors", "1080p Webcam"),
+    EmployeeEquipmentType.CONTRACTOR: ("Mac Mini", "4k Monitor", "1080p Webcam"),
+}
+
+
+class DeviceType():
+    """
+    Flyweight for one kind of device, such as a Mac Mini computer. There is a single
+    interned instance per (kind, name), identified by a small integer device_id, so kits
+    can refer to devices by id instead of holding an object per device.
+    """
+
+    __slots__ = ("device_id", "kind", "name")
+
+    _interned = {}
+    _by_id = []
+    _lock = threading.Lock()
+
+    def __init__(self, device_id, kind, name):
+        self.device_id = device_id
+        self.kind = kind
+        self.name = name
+
+    @classmethod
+    def intern(cls, kind, name) -> "DeviceType":
+        """Returns the device type for kind and name, creating it the first time"""
+
+        device = cls._interned.get((kind, name))
+        if device is None:
+            with cls._lock:
+                device = cls._interned.get((kind, name))
+                if device is None:
+                    device = cls._interned[(kind, name)] = cls(len(cls._by_id), kind, name)
+                    cls._by_id.append(device)
+        return device
+
+    @classmethod
+    def from_id(cls, device_id) -> "DeviceType":
+        """Returns the device type with the given id"""
+        return cls._by_id[device_id]
+
+    def turn_on(self):
+        """Turns on a device of this type"""
+        print(f"{self.name} has turned on!")
+
+    def turn_off(self):
+        """Turns off a device of this type"""
+        print(f"{self.name} has turned off!")
+
+    def __repr__(self):
+        return f"DeviceType({self.device_id}, {self.kind!r}, {self.name!r})"
+
+
+class ProvisionedKits():
+    """
+    Kits for many employees stored as two flat arrays: each employee's equipment type value,
+    and the device ids of their kit, len(KIT_SLOTS) per employee in KIT_SLOTS order.
+    """
+
+    __slots__ = ("equipment_types", "device_ids")
+
+    def __init__(self, equipment_types, device_ids):
+        self.equipment_types = equipment_types
+        self.device_ids = device_ids
+
+    def __len__(self):
+        return len(self.equipment_types)
+
+    def kit(self, index) -> tuple:
+        """Returns the device types of one employee's kit, in KIT_SLOTS order"""
+
+        start = index * len(KIT_SLOTS)
+        return tuple(map(DeviceType.from_id, self.device_ids[start:start + len(KIT_SLOTS)]))
+
+    def slot(self, name) -> memoryview:
+        """Returns every employee's device id for one slot, such as "monitor", without copying"""
+        return memoryview(self.device_ids)[KIT_SLOTS.index(name)::len(KIT_SLOTS)]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the kit arrays"""
+        return (self.equipment_types.itemsize * len(self.equipment_types)
+                + self.device_ids.itemsize * len(self.device_ids))
+
+
+class EquipmentCatalog():
+    """
+    Data driven replacement for the per type equipment factories. The device names in
+    catalog are interned as DeviceTypes and each EmployeeEquipmentType's kit is computed
+    once, so provisioning copies precomputed device ids instead of creating objects.
+    """
+
+    def __init__(self, catalog=None):
+        catalog = EQUIPMENT_CATALOG if catalog is None else catalog
+        self.kits = {equipment_type: tuple(DeviceType.intern(kind, name)
+                                           for kind, name in zip(KIT_SLOTS, names))
+                     for equipment_type, names in catalog.items()}
+        self._kit_bytes = {equipment_type: array("H", (device.device_id for device in kit))
+                           .tobytes() for equipment_type, kit in self.kits.items()}
+
+    def kit(self, equipment_type) -> tuple:
+        """Returns the device types making up the kit for an EmployeeEquipmentType"""
+        return self.kits[equipment_type]
+
+    def provision(self, employees) -> ProvisionedKits:
+        """Provisions a kit per employee, given as an iterable of EmployeeEquipmentTypes"""
+
+        employees = list(employees)
+        device_ids = array("H")
+        device_ids.frombytes(b"".join(map(self._kit_bytes.__getitem__, employees)))
+        equipment_types = array("B", (employee.value for employee in employees))
+        return ProvisionedKits(equipment_types, device_ids)
+
+
+def _measure(function):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, retained
+
+
+def benchmark_provisioning(employees=50_000):
+    """Compares provisioning through the per object factories with EquipmentCatalog"""
+
+    equipment_types = [list(EmployeeEquipmentType)[number % len(EmployeeEquipmentType)]
+                       for number in range(employees)]
+
+    def with_factories():
+        kits = []
+        for equipment_type in equipment_types:
+            factory = EQUIPMENT_FACTORIES[equipment_type]()
+            kits.append((factory.define_computer(), factory.define_monitor(),
+                         factory.define_webcam()))
+        return kits
+
+    catalog = EquipmentCatalog()
+    results = {}
+    for name, function in (("per object factories", with_factories),
+                           ("EquipmentCatalog", lambda: catalog.provision(equipment_types))):
+        kits, elapsed, retained = _measure(function)
+        results[name] = {"seconds": elapsed, "bytes": retained}
+        print(f"{name:>20}: {employees / elapsed:12,.0f} kits/s, "
+              f"{retained / employees:6.1f} bytes per kit")
+        del kits
+    return results
+
+
+POWER_ON_ORDER = ("monitor", "webcam", "computer")
+
+
+def device_kind(device) -> str:
+    """Returns which KIT_SLOTS entry a device fills"""
+
+    if isinstance(device, ComputerEquipmentInterface):
+        return "computer"
+    if isinstance(device, MonitorEquipmentInterface):
+        return "monitor"
+    if isinstance(device, WebcamEquipmentInterface):
+        return "webcam"
+    return device.kind
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class RateLimiter():
+    """Token bucket allowing rate operations per second, in bursts of up to burst"""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, sleeping until one is available"""
+
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self.sleep(wait)
+
+
+def percentile(sorted_values, fraction):
+    """Returns the nearest rank percentile of already sorted values, or 0.0 if empty"""
+
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(1, math.ceil(len(sorted_values) * fraction)) - 1]
+
+
+class PowerReport():
+    """Outcome of powering a fleet of kits on or off"""
+
+    def __init__(self, latencies, failures, kits, elapsed):
+        self.latencies = {kind: sorted(values) for kind, values in latencies.items()}
+        self.failures = failures
+        self.kits = kits
+        self.elapsed = elapsed
+
+    def latency(self, kind) -> dict:
+        """Returns the p50 and p99 latency, in seconds, of operations on one kind of device"""
+
+        values = self.latencies.get(kind, [])
+        return {"count": len(values), "p50": percentile(values, 0.5),
+                "p99": percentile(values, 0.99)}
+
+    def __str__(self):
+        lines = [f"{self.kits - len(self.failures)}/{self.kits} kits in {self.elapsed:.2f}s"]
+        for kind in self.latencies:
+            latency = self.latency(kind)
+            lines.append(f"{kind:>8}: p50 {latency['p50'] * 1000:.2f}ms, "
+                         f"p99 {latency['p99'] * 1000:.2f}ms over {latency['count']} devices")
+        return "\n".join(lines)
+
+
+class PowerOrchestrator():
+    """
+    Turns fleets of equipment kits on or off. Kits run concurrently on a thread pool while
+    the devices within a kit are handled in order, monitor before computer when turning on
+    and the reverse when turning off. Device operations share an optional rate limit of
+    operations per second and are retried with exponential backoff; a kit whose device keeps
+    failing stops there, so its later devices are left untouched.
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def __init__(self, max_workers=32, rate_limit=None, burst=1, retries=2, retry_delay=0.05):
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate_limit, burst) if rate_limit else None
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def power_on(self, kits) -> PowerReport:
+        """Turns on every device of every kit, each kit being an iterable of devices"""
+        return self._run(kits, "turn_on", POWER_ON_ORDER)
+
+    def power_off(self, kits) -> PowerReport:
+        """Turns off every device of every kit, each kit being an iterable of devices"""
+        return self._run(kits, "turn_off", tuple(reversed(POWER_ON_ORDER)))
+
+    def _run(self, kits, action, order):
+        started = time.perf_counter()
+        kits = list(kits)
+        latencies = {kind: [] for kind in order}
+        failures = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            outcomes = pool.map(lambda kit: self._run_kit(kit, action, order), kits)
+            for index, (timings, failure) in enumerate(outcomes):
+                for kind, seconds in timings:
+                    latencies.setdefault(kind, []).append(seconds)
+                if failure is not None:
+                    failures.append((index,) + failure)
+        return PowerReport(latencies, failures, len(kits), time.perf_counter() - started)
+
+    def _run_kit(self, kit, action, order):
+        rank = {kind: position for position, kind in enumerate(order)}
+        devices = sorted(kit, key=lambda device: rank.get(device_kind(device), len(rank)))
+        timings = []
+        for device in devices:
+            kind = device_kind(device)
+            try:
+                timings.append((kind, self._call(getattr(device, action))))
+            except Exception as error:  # pylint: disable=locally-disabled, broad-exception-caught
+                return timings, (kind, error)
+        return timings, None
+
+    def _call(self, operation):
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                operation()
+                return time.perf_counter() - started
+            except Exception:  # pylint: disable=locally-disabled, broad-exception-caught
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.retry_delay * 2 ** attempt)
+        return None
+
+
 def demo_abstract_factory():
     """Test out the functionality of the classes defined above."""
 
@@ -241,5 +545,12 @@ def demo_abstract_factory():
     monitor.turn_on()
     webcam.turn_on()
 
+    kits = EquipmentCatalog().provision([EmployeeEquipmentType.REMOTE,
+                                         EmployeeEquipmentType.CONTRACTOR])
+    print(f"Provisioned {len(kits)} kits in {kits.nbytes} bytes: {kits.kit(0)}")
+
+    print(PowerOrchestrator(rate_limit=100, burst=10).power_on(
+        kits.kit(index) for index in range(len(kits))))
+
 if __name__ == "__main__":
     demo_abstract_factory()
@@ -1,7 +1,11 @@
 """Module providing an example of the Factory design pattern."""
 
+import time
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from operator import attrgetter
 
 
 class DeliveryInterface(ABC):
@@ -15,6 +19,18 @@ class DeliveryInterface(ABC):
     def dropoff_package(self) -> None:
         """Provides functionality to deliver a package in our posession"""
 
+    def get_packages(self, packages) -> int:
+        """Gets a batch of packages, returning how many; carriers can override it to batch"""
+        for _ in packages:
+            self.get_package()
+        return len(packages)
+
+    def dropoff_packages(self, packages) -> int:
+        """Delivers a batch of packages, returning how many; carriers can override it to batch"""
+        for _ in packages:
+            self.dropoff_package()
+        return len(packages)
+
 
 class UpsDelivery(DeliveryInterface):
     """ Concrete implementation of the delivery interface """
@@ -25,6 +41,14 @@ class UpsDelivery(DeliveryInterface):
     def dropoff_package(self) -> None:
         print("UPS has delivered the package!")
 
+    def get_packages(self, packages) -> int:
+        print(f"UPS now has {len(packages)} packages!")
+        return len(packages)
+
+    def dropoff_packages(self, packages) -> int:
+        print(f"UPS has delivered {len(packages)} packages!")
+        return len(packages)
+
 
 class FedExDelivery(DeliveryInterface):
     """ Concrete implementation of the delivery interface """
@@ -35,6 +59,14 @@ class FedExDelivery(DeliveryInterface):
     def dropoff_package(self) -> None:
         print("FedEx has delivered the package!")
 
+    def get_packages(self, packages) -> int:
+        print(f"FedEx now has {len(packages)} packages!")
+        return len(packages)
+
+    def dropoff_packages(self, packages) -> int:
+        print(f"FedEx has delivered {len(packages)} packages!")
+        return len(packages)
+
 
 class InHouseDelivery(DeliveryInterface):
     """ Concrete implementation of the delivery interface """
@@ -45,6 +77,14 @@ class InHouseDelivery(DeliveryInterface):
     def dropoff_package(self) -> None:
         print("Pat has delivered the package!")
 
+    def get_packages(self, packages) -> int:
+        print(f"Pat now has {len(packages)} packages!")
+        return len(packages)
+
+    def dropoff_packages(self, packages) -> int:
+        print(f"Pat has delivered {len(packages)} packages!")
+        return len(packages)
+
 
 class DeliveryType(Enum):
     """Provides types of deliveries that can be made"""
@@ -52,23 +92,131 @@ class DeliveryType(Enum):
     INTERNATIONAL = 2
     LOCAL = 3
 
+
 # pylint: disable=locally-disabled, too-few-public-methods
+class Package():
+    """A package waiting to be shipped, already classified by DeliveryType"""
+
+    __slots__ = ("package_id", "delivery_type")
+
+    def __init__(self, package_id, delivery_type: DeliveryType):
+        self.package_id = package_id
+        self.delivery_type = delivery_type
+
+    def __repr__(self):
+        return f"Package({self.package_id!r}, {self.delivery_type})"
+
 class DeliveryFactory():
     """
     Class that provides factory functionality. It creates instances of 
     DeliveryInterface subclasses
+
+    Delivery types map to providers through a lookup table that carriers can be registered
+    in. Stateless providers are registered as shared, so one instance is created up front and
+    handed out on every call instead of a new one per package.
     """
 
-    @staticmethod
-    def create_delivery_service(delivery_type: DeliveryType) -> DeliveryInterface:
+    _shared = {}
+    _classes = {}
+
+    @classmethod
+    def register(cls, delivery_type, provider_class, shared=True) -> None:
+        """
+        Makes delivery_type, which may be a DeliveryType or any other hashable key, create
+        provider_class. Pass shared=False for providers that keep per package state.
+        """
+
+        if not issubclass(provider_class, DeliveryInterface):
+            raise TypeError(f"{provider_class.__name__} does not implement DeliveryInterface")
+        shared_providers = {key: value for key, value in cls._shared.items()
+                            if key != delivery_type}
+        if shared:
+            shared_providers[delivery_type] = provider_class()
+        cls._shared = shared_providers
+        cls._classes = cls._classes | {delivery_type: provider_class}
+
+    @classmethod
+    def unregister(cls, delivery_type) -> None:
+        """Removes the provider registered for delivery_type"""
+
+        cls._shared = {key: value for key, value in cls._shared.items() if key != delivery_type}
+        cls._classes = {key: value for key, value in cls._classes.items()
+                        if key != delivery_type}
+
+    @classmethod
+    def registered_types(cls) -> list:
+        """Returns the delivery types that providers are registered for"""
+        return list(cls._classes)
+
+    @classmethod
+    def create_delivery_service(cls, delivery_type: DeliveryType) -> DeliveryInterface:
         """Creates an object based on DeliveryInterface based on DeliberyType"""
-        match delivery_type:
-            case DeliveryType.DOMESTIC:
-                return UpsDelivery()
-            case DeliveryType.INTERNATIONAL:
-                return FedExDelivery()
-            case DeliveryType.LOCAL:
-                return InHouseDelivery()
+        provider = cls._shared.get(delivery_type)
+        if provider is not None:
+            return provider
+        provider_class = cls._classes.get(delivery_type)
+        if provider_class is None:
+            raise ValueError(f"No delivery provider registered for {delivery_type!r}")
+        return provider_class()
+
+    @classmethod
+    def route_packages(cls, packages, key=attrgetter("delivery_type"), max_workers=None) -> dict:
+        """
+        Ships an iterable of packages. They are partitioned by key(package), their delivery
+        type, in a single pass, then each partition goes to its provider's get_packages and
+        dropoff_packages as one batch, with the carriers running concurrently. Returns the
+        number of packages shipped per delivery type.
+        """
+
+        partitions = defaultdict(list)
+        for package in packages:
+            partitions[key(package)].append(package)
+        providers = {delivery_type: cls.create_delivery_service(delivery_type)
+                     for delivery_type in partitions}
+        if len(partitions) <= 1:
+            return {delivery_type: cls._ship(providers[delivery_type], batch)
+                    for delivery_type, batch in partitions.items()}
+        with ThreadPoolExecutor(max_workers=max_workers or len(partitions)) as pool:
+            futures = {delivery_type: pool.submit(cls._ship, providers[delivery_type], batch)
+                       for delivery_type, batch in partitions.items()}
+            return {delivery_type: future.result() for delivery_type, future in futures.items()}
+
+    @staticmethod
+    def _ship(provider, batch):
+        provider.get_packages(batch)
+        return provider.dropoff_packages(batch)
+
+
+DeliveryFactory.register(DeliveryType.DOMESTIC, UpsDelivery)
+DeliveryFactory.register(DeliveryType.INTERNATIONAL, FedExDelivery)
+DeliveryFactory.register(DeliveryType.LOCAL, InHouseDelivery)
+
+
+def create_delivery_service_with_match(delivery_type: DeliveryType) -> DeliveryInterface:
+    """The original match based factory, creating a new provider per call, for benchmarks"""
+    match delivery_type:
+        case DeliveryType.DOMESTIC:
+            return UpsDelivery()
+        case DeliveryType.INTERNATIONAL:
+            return FedExDelivery()
+        case DeliveryType.LOCAL:
+            return InHouseDelivery()
+    return None
+
+
+def benchmark_delivery_factory(calls=1_000_000):
+    """Measures the per call overhead, in nanoseconds, of the table and match factories"""
+
+    delivery_types = list(DeliveryType) * (calls // len(DeliveryType))
+    timings = {}
+    for name, factory in (("match, new instance", create_delivery_service_with_match),
+                          ("table, shared instance", DeliveryFactory.create_delivery_service)):
+        started = time.perf_counter_ns()
+        for delivery_type in delivery_types:
+            factory(delivery_type)
+        timings[name] = (time.perf_counter_ns() - started) / len(delivery_types)
+        print(f"{name:>22}: {timings[name]:6.1f} ns per call")
+    return timings
 
 
 def demo_factory() -> None:
@@ -81,6 +229,9 @@ def demo_factory() -> None:
     package_delivery_service.get_package()
     package_delivery_service.dropoff_package()
 
+    packages = [Package(number, list(DeliveryType)[number % 3]) for number in range(30_000)]
+    print(DeliveryFactory.route_packages(packages))
+
 
 if __name__ == "__main__":
     demo_factory()
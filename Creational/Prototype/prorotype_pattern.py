@@ -1,7 +1,20 @@
 """Module providing an example of the Prototype design pattern."""
 
 
+import copy
+import errno
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
 from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # pylint: disable=locally-disabled, too-few-public-methods
 class PrototypeInterface(ABC):
@@ -18,47 +31,387 @@ class DataLoadInterface(ABC):
         """Provides functionality to load data"""
 
 
+class CopyOnWritePayload():
+    """
+    Loaded columns shared by reference between prototype clones. Reading never copies:
+    columns are handed out as read only memoryviews. The first time a clone writes to a
+    column, that column alone is copied for that clone, leaving the others shared.
+    """
+
+    __slots__ = ("_columns", "_private")
+
+    def __init__(self, columns):
+        self._columns = columns
+        self._private = None
+
+    def share(self):
+        """Returns a payload sharing all columns with this one"""
+
+        # pylint: disable=locally-disabled, protected-access
+        clone = CopyOnWritePayload.__new__(CopyOnWritePayload)
+        clone._columns = self._columns
+        clone._private = None
+        self._private = None
+        return clone
+
+    @property
+    def column_names(self):
+        """Names of the loaded columns"""
+        return list(self._columns)
+
+    def __getitem__(self, name):
+        return memoryview(self._columns[name]).toreadonly()
+
+    def shares_column_with(self, other, name):
+        """Whether both payloads still reference the same storage for the column"""
+
+        # pylint: disable=locally-disabled, protected-access
+        return self._columns[name] is other._columns[name]
+
+    def set_value(self, name, index, value):
+        """Writes a single value, copying the column first if it is still shared"""
+
+        self._writable(name)[index] = value
+
+    def replace_column(self, name, values):
+        """Replaces or adds a column, e.g. an array.array, for this payload only"""
+
+        self._writable(name, duplicate=False)
+        self._columns[name] = values
+
+    def _writable(self, name, duplicate=True):
+        if self._private is None:
+            self._columns = dict(self._columns)
+            self._private = set()
+        if name not in self._private:
+            if duplicate:
+                self._columns[name] = copy.copy(self._columns[name])
+            self._private.add(name)
+        return self._columns.get(name)
+
+
+def simulate_database_load(data_set, rows=100_000):
+    """Stands in for querying data_set, returning its columns as typed arrays"""
+
+    seed = sum(data_set.encode())
+    return {
+        "id": array("q", range(rows)),
+        "amount": array("d", ((number * seed) % 1000 / 10 for number in range(rows))),
+    }
+
+
 class ExpensiveDatabaseDataLoad(DataLoadInterface, PrototypeInterface):
-    """Simulates loading data from a database"""
+    """
+    Simulates loading data from a database. Clones share the loaded payload by reference and
+    only copy a column when they write to it, so thousands of lightly customized prototypes
+    cost little more than one loaded dataset.
+    """
 
-    def __init__(self, data_set: str) -> None:
+    def __init__(self, data_set: str, loader=simulate_database_load) -> None:
         self.database_hostname = "MYHOST"
         self.database_port = 80
         self.data_set = data_set
+        self.loader = loader
+        self.payload = None
 
     def perform_expensive_data_load(self):
         """Simulates performing the data load"""
 
+        self.payload = CopyOnWritePayload(self.loader(self.data_set))
+
     def attempt_data_load(self):
         self.perform_expensive_data_load()
 
-    def clone(self):
-        new_instance = ExpensiveDatabaseDataLoad(self.data_set)
-        new_instance.database_hostname = self.database_hostname
-        new_instance.database_port = self.database_port
+    def clone(self, **overrides):
+        """Copies the instance without calling __init__, applying any attribute overrides"""
+
+        new_instance = object.__new__(type(self))
+        new_instance.__dict__.update(self.__dict__)
+        if self.payload is not None:
+            new_instance.payload = self.payload.share()
+        if overrides:
+            new_instance.__dict__.update(overrides)
         return new_instance
 
 
+DEFAULT_TRANSFER_CHUNK_BYTES = 64 * 1024 * 1024
+_COPY_BLOCK_BYTES = 1024 * 1024
+
+
+def _kernel_copy(source_fd, target_fd, offset, length):
+    """Copies as much of the range as copy_file_range, then sendfile, can copy in the kernel"""
+
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < length:
+                count = os.copy_file_range(source_fd, target_fd, length - copied,
+                                           offset + copied, offset + copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if copied < length and hasattr(os, "sendfile"):
+        try:
+            os.lseek(target_fd, offset + copied, os.SEEK_SET)
+            while copied < length:
+                count = os.sendfile(target_fd, source_fd, offset + copied, length - copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError as error:
+            if error.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+    return copied
+
+
+def copy_range(source_fd, target_fd, offset, length):
+    """
+    Copies length bytes at offset between two file descriptors, in the kernel with
+    copy_file_range or sendfile where the platform supports it, else with pread/pwrite
+    """
+
+    copied = _kernel_copy(source_fd, target_fd, offset, length)
+    while copied < length:
+        data = os.pread(source_fd, min(_COPY_BLOCK_BYTES, length - copied), offset + copied)
+        if not data:
+            raise EOFError(f"Source ended {length - copied} bytes early at offset {offset}")
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(target_fd, view, offset + copied)
+            view = view[written:]
+            copied += written
+
+
+def range_checksum(fd, offset, length):
+    """Returns the CRC-32 of length bytes at offset"""
+
+    checksum = 0
+    position = offset
+    while position < offset + length:
+        data = os.pread(fd, min(_COPY_BLOCK_BYTES, offset + length - position), position)
+        if not data:
+            break
+        checksum = zlib.crc32(data, checksum)
+        position += len(data)
+    return checksum
+
+
+class ChunkedFileTransfer():
+    """
+    Copies a large file as fixed size chunks on a thread pool. Each chunk is copied in the
+    kernel where possible, then verified by comparing checksums of the source and target
+    ranges. Each chunk is recorded in a manifest next to the target as soon as it completes,
+    even if another chunk fails, so rerunning an interrupted transfer of an unchanged source
+    only copies the missing chunks. The manifest is removed once the copy is complete.
+    """
+
+    def __init__(self, source, target, chunk_bytes=DEFAULT_TRANSFER_CHUNK_BYTES, workers=4):
+        self.source = source
+        self.target = target
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        self.manifest_path = f"{target}.manifest"
+
+    def run(self):
+        """Copies the file, returning a summary of bytes, chunks and throughput"""
+
+        started = time.perf_counter()
+        stat = os.stat(self.source)
+        if os.path.exists(self.target) and os.path.samefile(self.source, self.target):
+            raise ValueError(f"Cannot copy {self.source} onto itself")
+        manifest = self._load_manifest(stat)
+        if not os.path.exists(self.target) or not manifest["done"]:
+            with open(self.target, "wb") as target_file:
+                target_file.truncate(stat.st_size)
+        chunks = [(index, offset, min(self.chunk_bytes, stat.st_size - offset))
+                  for index, offset in enumerate(range(0, stat.st_size, self.chunk_bytes))]
+        pending = [chunk for chunk in chunks if str(chunk[0]) not in manifest["done"]]
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for future in as_completed([pool.submit(self._copy_chunk, chunk)
+                                        for chunk in pending]):
+                try:
+                    index, checksum = future.result()
+                except (OSError, EOFError) as error:
+                    errors.append(error)
+                    continue
+                manifest["done"][str(index)] = checksum
+                self._save_manifest(manifest)
+        if errors:
+            raise errors[0]
+        os.remove(self.manifest_path)
+        elapsed = time.perf_counter() - started
+        return {"bytes": stat.st_size, "chunks": len(chunks), "copied_chunks": len(pending),
+                "resumed_chunks": len(chunks) - len(pending), "elapsed": elapsed,
+                "throughput": stat.st_size / elapsed if elapsed else float(stat.st_size)}
+
+    def _copy_chunk(self, chunk):
+        index, offset, length = chunk
+        source_fd = os.open(self.source, os.O_RDONLY)
+        try:
+            target_fd = os.open(self.target, os.O_RDWR)
+            try:
+                copy_range(source_fd, target_fd, offset, length)
+                checksum = range_checksum(source_fd, offset, length)
+                if range_checksum(target_fd, offset, length) != checksum:
+                    raise IOError(f"Checksum mismatch in chunk {index} of {self.target}")
+            finally:
+                os.close(target_fd)
+        finally:
+            os.close(source_fd)
+        return index, checksum
+
+    def _load_manifest(self, stat):
+        expected = {"source": os.path.abspath(self.source), "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns, "chunk_bytes": self.chunk_bytes}
+        try:
+            with open(self.manifest_path, encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            manifest = None
+        if manifest is None or any(manifest.get(key) != value for key, value in expected.items()) \
+                or not os.path.exists(self.target):
+            manifest = dict(expected, done={})
+            self._save_manifest(manifest)
+        return manifest
+
+    def _save_manifest(self, manifest):
+        temporary = f"{self.manifest_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary, self.manifest_path)
+
+
 class ExpensiveNetworkFileLoad(DataLoadInterface, PrototypeInterface):
     """Simulates loading data from across a network"""
 
-    def __init__(self):
-        self.unc_path = "\\server\folder\file.txt"
-        self.target_path = "/home/$user/folder"
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def __init__(self, unc_path="\\server\folder\file.txt", target_path="/home/$user/folder",
+                 chunk_bytes=DEFAULT_TRANSFER_CHUNK_BYTES, workers=4):
+        self.unc_path = unc_path
+        self.target_path = target_path
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        self.transfer_summary = None
 
     def load_huge_data_file(self):
-        """Simulates performing the data load"""
+        """Copies the file at unc_path to target_path, or into it if it is a directory"""
+
+        target = self.target_path
+        if os.path.isdir(target):
+            target = os.path.join(target, os.path.basename(self.unc_path.replace("\\", "/")))
+        transfer = ChunkedFileTransfer(self.unc_path, target, self.chunk_bytes, self.workers)
+        self.transfer_summary = transfer.run()
 
     def attempt_data_load(self):
         self.load_huge_data_file()
 
     def clone(self):
-        new_instance = ExpensiveNetworkFileLoad()
-        new_instance.unc_path = self.unc_path
-        new_instance.target_path = self.target_path
+        new_instance = ExpensiveNetworkFileLoad(self.unc_path, self.target_path,
+                                                self.chunk_bytes, self.workers)
+        new_instance.transfer_summary = self.transfer_summary
         return new_instance
 
 
+class _Flight():
+    """A load in progress that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.instance = None
+        self.error = None
+
+
+class PrototypeRegistry():
+    """
+    Keeps loaded prototypes keyed by (class, data set or path) and hands out clones of them,
+    so each expensive load happens once per key. Entries are evicted least recently used
+    first beyond max_entries and reloaded once older than ttl seconds. Concurrent requests for
+    a key that is not loaded yet share a single load.
+    """
+
+    def __init__(self, max_entries=128, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(("hits", "misses", "loads", "evictions", "expirations"), 0)
+
+    def get(self, prototype_class, key, factory=None):
+        """
+        Returns a clone of the loaded prototype for key, loading it first if needed. factory
+        builds the unloaded prototype and defaults to prototype_class(key).
+        """
+
+        cache_key = (prototype_class, key)
+        with self._lock:
+            instance = self._lookup(cache_key)
+            if instance is not None:
+                return instance.clone()
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = _Flight()
+        if leader:
+            self._load(cache_key, flight, factory or (lambda: prototype_class(key)))
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.instance.clone()
+
+    def _lookup(self, cache_key):
+        entry = self._entries.get(cache_key)
+        if entry is not None and self.ttl is not None and self.clock() - entry[1] >= self.ttl:
+            del self._entries[cache_key]
+            self._stats["expirations"] += 1
+            entry = None
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(cache_key)
+        self._stats["hits"] += 1
+        return entry[0]
+
+    def _load(self, cache_key, flight, factory):
+        # pylint: disable=locally-disabled, broad-exception-caught
+        try:
+            instance = factory()
+            instance.attempt_data_load()
+            flight.instance = instance
+        except Exception as error:
+            flight.error = error
+        with self._lock:
+            del self._flights[cache_key]
+            if flight.error is None:
+                self._stats["loads"] += 1
+                self._entries[cache_key] = (flight.instance, self.clock())
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        flight.done.set()
+
+    def invalidate(self, prototype_class, key):
+        """Drops the loaded prototype for key, so the next request reloads it"""
+
+        with self._lock:
+            self._entries.pop((prototype_class, key), None)
+
+    def stats(self):
+        """Returns the hit, miss, load, eviction and expiration counters"""
+
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+
 def demo_prototype_pattern():
     """Demo the Prototype design pattern as implemented using the classes above"""
 
@@ -74,6 +427,56 @@ def demo_prototype_pattern():
     print(f"Is the original the same instance of the original object? "\
           f"{original_object is original_object}")
 
+    registry = PrototypeRegistry(max_entries=2)
+    for data_set in ["SALES_DATA", "SALES_DATA", "HR_DATA", "SALES_DATA"]:
+        registry.get(ExpensiveDatabaseDataLoad, data_set)
+    print(f"Prototype registry counters: {registry.stats()}")
+
+
+def benchmark_prototype_clones(clones=10_000, rows=100_000):
+    """Measures clone time and the extra memory of lightly customized clones of one dataset"""
+
+    original = ExpensiveDatabaseDataLoad("SALES_DATA", lambda data_set:
+                                         simulate_database_load(data_set, rows))
+    original.attempt_data_load()
+
+    started = time.perf_counter_ns()
+    for number in range(clones):
+        original.clone(database_port=8000 + number % 100)
+    elapsed = time.perf_counter_ns() - started
+
+    tracemalloc.start()
+    prototypes = [original.clone(database_port=8000 + number % 100) for number in range(clones)]
+    cloned = tracemalloc.get_traced_memory()[0]
+    prototypes[0].payload.set_value("amount", 0, 0.0)
+    written = tracemalloc.get_traced_memory()[0] - cloned
+    tracemalloc.stop()
+
+    print(f"{clones:,} clones of {rows:,} rows at {elapsed / clones:,.0f} ns per clone, "
+          f"{cloned / clones:,.0f} bytes per clone")
+    print(f"the first write to a column copies only that column: {written / 1024:,.0f} KiB")
+
+
+def benchmark_file_transfer(size_mb=512, chunk_mb=64, workers=4):
+    """Compares ChunkedFileTransfer with shutil.copyfile on a generated file of size_mb MiB"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.bin")
+        with open(source, "wb") as source_file:
+            block = os.urandom(_COPY_BLOCK_BYTES)
+            for _ in range(size_mb):
+                source_file.write(block)
+
+        started = time.perf_counter()
+        shutil.copyfile(source, os.path.join(directory, "copyfile.bin"))
+        baseline = time.perf_counter() - started
+
+        transfer = ChunkedFileTransfer(source, os.path.join(directory, "chunked.bin"),
+                                       chunk_mb * 1024 * 1024, workers)
+        summary = transfer.run()
+        print(f"shutil.copyfile: {baseline:.2f}s ({size_mb / baseline:,.0f} MiB/s)")
+        print(f"ChunkedFileTransfer with {workers} workers, verified: {summary['elapsed']:.2f}s "
+              f"({size_mb / summary['elapsed']:,.0f} MiB/s)")
 
 
 if __name__ == "__main__":
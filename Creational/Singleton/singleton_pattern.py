@@ -1,13 +1,360 @@
 """Module providing an example of the Singleton design pattern."""
 
-# pylint: disable=locally-disabled, too-few-public-methods, unused-private-member
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+
+
+class SingletonScope(Enum):
+    """Defines how widely a singleton instance is shared"""
+
+    PROCESS = "process"
+    THREAD = "thread"
+    TASK = "task"
+
+
+_MISSING = object()
+_REGISTRIES = weakref.WeakSet()
+
+
+def _reset_registries_after_fork():
+    # pylint: disable=locally-disabled, protected-access
+    for registry in list(_REGISTRIES):
+        registry._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_registries_after_fork)
+
+
+class SingletonRegistry():
+    """
+    Creates and caches one instance per key within a scope: the whole process, each thread or
+    each asyncio task. Lookups of an existing instance are plain dict reads with no locking;
+    only creating an instance takes the registry lock.
+
+    After os.fork() the child starts with an empty registry and rebuilds instances lazily on
+    first use. The parent's instances are kept referenced but never touched again, so sockets
+    and file handles shared with the parent are neither reused nor closed by the child.
+    """
+
+    def __init__(self):
+        self._abandoned = []
+        self._reset()
+        _REGISTRIES.add(self)
+
+    def _reset(self):
+        self._lock = threading.RLock()
+        self._process = {}
+        self._local = threading.local()
+        self._tasks = weakref.WeakKeyDictionary()
+
+    def _after_fork(self):
+        self._abandoned.append((self._process, self._local, self._tasks))
+        self._reset()
+
+    def _instances(self, scope):
+        if scope is SingletonScope.PROCESS:
+            return self._process
+        if scope is SingletonScope.THREAD:
+            instances = getattr(self._local, "instances", None)
+            if instances is None:
+                instances = self._local.instances = {}
+            return instances
+        task = asyncio.current_task()
+        if task is None:
+            raise RuntimeError("Task scoped singletons must be looked up from an asyncio task")
+        instances = self._tasks.get(task)
+        if instances is None:
+            with self._lock:
+                instances = self._tasks.setdefault(task, {})
+        return instances
+
+    def get(self, key, factory, scope=SingletonScope.PROCESS):
+        """Returns the instance for key in the current scope, calling factory() to create it"""
+
+        instances = self._process if scope is SingletonScope.PROCESS else self._instances(scope)
+        instance = instances.get(key, _MISSING)
+        if instance is _MISSING:
+            with self._lock:
+                instance = instances.get(key, _MISSING)
+                if instance is _MISSING:
+                    instance = instances[key] = factory()
+        return instance
+
+    def discard(self, key, scope=SingletonScope.PROCESS, instance=None):
+        """Forgets the current scope's instance for key, if it is still the given instance"""
+
+        with self._lock:
+            instances = self._instances(scope)
+            if instance is None or instances.get(key) is instance:
+                instances.pop(key, None)
+
+
+SINGLETONS = SingletonRegistry()
+
+
+class PoolTimeoutError(TimeoutError):
+    """Raised when no connection could be borrowed from the pool in time"""
+
+
+# pylint: disable=locally-disabled, too-few-public-methods, too-many-instance-attributes
+class PoolMetrics():
+    """Point in time snapshot of a connection pool's counters"""
+
+    def __init__(self, **counters):
+        self.size = counters["size"]
+        self.idle = counters["idle"]
+        self.in_use = counters["in_use"]
+        self.max_size = counters["max_size"]
+        self.peak_in_use = counters["peak_in_use"]
+        self.borrows = counters["borrows"]
+        self.timeouts = counters["timeouts"]
+        self.created = counters["created"]
+        self.closed = counters["closed"]
+        self.total_wait = counters["total_wait"]
+        self.max_wait = counters["max_wait"]
+
+    @property
+    def utilization(self) -> float:
+        """Share of the maximum pool size currently borrowed"""
+        return self.in_use / self.max_size
+
+    @property
+    def average_wait(self) -> float:
+        """Average time, in seconds, callers waited to borrow a connection"""
+        return self.total_wait / self.borrows if self.borrows else 0.0
+
+    def __repr__(self):
+        return (f"PoolMetrics(size={self.size}, in_use={self.in_use}, idle={self.idle}, "
+                f"utilization={self.utilization:.0%}, borrows={self.borrows}, "
+                f"timeouts={self.timeouts}, average_wait={self.average_wait * 1000:.3f}ms, "
+                f"max_wait={self.max_wait * 1000:.3f}ms)")
+
+
 class DatabaseConnection():
-    """ Demonstrates a class that will only ever instantiate one object. """
+    """
+    Demonstrates a class that will only ever instantiate one object. That object is a
+    process wide, lock protected pool of SQLite connections, so every thread shares at most
+    max_size connections instead of opening one per request. The pool is configured by the
+    first call; later calls return the same instance and ignore their arguments.
+
+    Connections are borrowed most recently used first, so the least recently used ones sit
+    idle long enough to be evicted once they exceed idle_timeout, down to min_size.
+    Connections that fail a health check on borrow are replaced.
 
-    def __new__(cls):
-        if not hasattr(cls, "__singleton"):
-            cls.__singleton = super(DatabaseConnection, cls).__new__(cls)
-        return cls
+    Instances live in the SINGLETONS registry under the class's scope, so a forked child
+    lazily builds its own pool, and a subclass can set scope to SingletonScope.THREAD or
+    SingletonScope.TASK to get one pool per thread or per asyncio task instead.
+    """
+
+    scope = SingletonScope.PROCESS
+
+    def __new__(cls, *args, **kwargs):
+        del args, kwargs
+        return SINGLETONS.get(cls, cls._create_instance, cls.scope)
+
+    @classmethod
+    def _create_instance(cls):
+        # pylint: disable=locally-disabled, attribute-defined-outside-init
+        instance = super().__new__(cls)
+        instance._configured = False
+        instance._configure_lock = threading.Lock()
+        return instance
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def __init__(self, database="file:singleton?mode=memory&cache=shared", min_size=1,
+                 max_size=10, idle_timeout=300.0, health_check=True):
+        if self._configured:
+            return
+        with self._configure_lock:
+            if self._configured:
+                return
+            if not 0 <= min_size <= max_size or max_size < 1:
+                raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+            self.database = database
+            self.min_size = min_size
+            self.max_size = max_size
+            self.idle_timeout = idle_timeout
+            self.health_check = health_check
+            self._condition = threading.Condition(threading.Lock())
+            self._idle = deque()
+            self._size = 0
+            self._counters = dict.fromkeys(
+                ("peak_in_use", "borrows", "timeouts", "created", "closed"), 0)
+            self._wait = {"total": 0.0, "max": 0.0}
+            for _ in range(min_size):
+                self._idle.append((self._open(), time.monotonic()))
+                self._size += 1
+                self._counters["created"] += 1
+            self._configured = True
+
+    def _open(self):
+        return sqlite3.connect(self.database, uri=True, check_same_thread=False)
+
+    def _close(self, connection):
+        with self._condition:
+            self._counters["closed"] += 1
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _is_healthy(connection):
+        try:
+            connection.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _take_or_reserve(self, deadline, timeout):
+        """
+        Must hold the lock. Returns an idle connection, or None after reserving a slot for a
+        new one, waiting for a connection to be given back while the pool is exhausted
+        """
+
+        while True:
+            self._evict_idle()
+            if self._idle:
+                return self._idle.pop()[0]
+            if self._size < self.max_size:
+                self._size += 1
+                self._counters["created"] += 1
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                self._counters["timeouts"] += 1
+                raise PoolTimeoutError(f"No connection available within {timeout}s")
+            self._condition.wait(remaining)
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def borrow(self, timeout=None) -> sqlite3.Connection:
+        """Takes a connection from the pool, waiting up to timeout seconds for one to free up"""
+
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while True:
+            with self._condition:
+                connection = self._take_or_reserve(deadline, timeout)
+            if connection is None:
+                try:
+                    connection = self._open()
+                except sqlite3.Error:
+                    self._release_slot()
+                    raise
+            elif self.health_check and not self._is_healthy(connection):
+                self._release_slot()
+                self._close(connection)
+                continue
+            break
+        waited = time.monotonic() - started
+        with self._condition:
+            self._counters["borrows"] += 1
+            self._wait["total"] += waited
+            self._wait["max"] = max(self._wait["max"], waited)
+            self._counters["peak_in_use"] = max(self._counters["peak_in_use"],
+                                                self._size - len(self._idle))
+        return connection
+
+    def give_back(self, connection):
+        """Returns a borrowed connection to the pool, rolling back any open transaction"""
+
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            self._release_slot()
+            self._close(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Borrows a connection for the duration of a with block"""
+
+        borrowed = self.borrow(timeout)
+        try:
+            yield borrowed
+        finally:
+            self.give_back(borrowed)
+
+    def _evict_idle(self):
+        """Closes connections idle for longer than idle_timeout, keeping min_size open"""
+
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size \
+                and now - self._idle[0][1] > self.idle_timeout:
+            self._size -= 1
+            self._counters["closed"] += 1
+            self._idle.popleft()[0].close()
+
+    def evict_idle(self):
+        """Runs idle eviction now rather than waiting for the next borrow"""
+
+        with self._condition:
+            self._evict_idle()
+
+    def metrics(self) -> PoolMetrics:
+        """Returns a snapshot of the pool's size, utilization and wait time counters"""
+
+        with self._condition:
+            return PoolMetrics(size=self._size, idle=len(self._idle),
+                               in_use=self._size - len(self._idle), max_size=self.max_size,
+                               total_wait=self._wait["total"], max_wait=self._wait["max"],
+                               **self._counters)
+
+    def shutdown(self):
+        """Closes the idle connections and forgets the instance, so the next call builds anew"""
+
+        with self._condition:
+            while self._idle:
+                self._counters["closed"] += 1
+                self._size -= 1
+                self._idle.popleft()[0].close()
+        SINGLETONS.discard(type(self), self.scope, self)
+
+
+def benchmark_singleton_lookup(calls=1_000_000):
+    """Measures the per call overhead, in nanoseconds, of looking up existing singletons"""
+
+    registry = SingletonRegistry()
+    plain = object()
+
+    async def in_task():
+        return _time_per_call(lambda: registry.get("task", object, SingletonScope.TASK), calls)
+
+    timings = {
+        "module global baseline": _time_per_call(lambda: plain, calls),
+        "registry, process scope": _time_per_call(lambda: registry.get("key", object), calls),
+        "registry, thread scope": _time_per_call(
+            lambda: registry.get("key", object, SingletonScope.THREAD), calls),
+        "registry, task scope": asyncio.run(in_task()),
+        "DatabaseConnection()": _time_per_call(DatabaseConnection, calls),
+    }
+    for name, nanoseconds in timings.items():
+        print(f"{name:>24}: {nanoseconds:7.1f} ns per call")
+    return timings
+
+
+def _time_per_call(function, calls):
+    function()
+    started = time.perf_counter_ns()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter_ns() - started) / calls
 
 
 def demo_singleton_pattern():
@@ -21,6 +368,10 @@ def demo_singleton_pattern():
     print(f"The internal ID of the first database connection is {id(first_database_connection)} "\
           f"and the ID of the second is {id(second_database_connection)}")
 
+    with first_database_connection.connection() as connection:
+        print(f"Borrowed a connection, SQLite says {connection.execute('SELECT 1').fetchone()}")
+    print(first_database_connection.metrics())
+
 
 if __name__ == "__main__":
     demo_singleton_pattern()
@@ -1,82 +1,957 @@
 """Module providing an example of the Facade design pattern."""
-# pylint: disable=locally-disabled, too-few-public-methods
+# pylint: disable=locally-disabled, too-few-public-methods, too-many-lines
 
-class ExtractCsv():
-    """Example of loading data of a specific type"""
+import csv
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
+import operator
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from collections import deque
+from itertools import compress
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import closing
 
-    @staticmethod
-    def load():
-        """Provides ability to load data from a source"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-        print("Data loaded from CSV file.")
 
+DEFAULT_BATCH_SIZE = 10_000
 
-class ExtractExcel():
-    """Example of loading data of a specific type"""
+SAMPLE_COLUMNS = ("id", "region", "amount")
+SAMPLE_ROWS = [(1, "TX", 10.0), (2, "MA", 25.5), (3, "TX", 7.25)]
 
-    @staticmethod
-    def load():
+
+class RecordBatch():
+    """
+    A bounded, column oriented block of records that flows between ETL steps. source names
+    where the records came from and position where in the source the read that produced
+    them began, e.g. a byte offset. replaces marks the first batch of a read, so a sink
+    should first drop whatever it loaded from that source at or after that position: a
+    whole source read again, or a delta retried after a failed run, is then not loaded twice.
+    """
+
+    def __init__(self, columns, source=None, position=0, replaces=False):
+        self.columns = dict(columns)
+        self.source = source
+        self.position = position
+        self.replaces = replaces
+
+    def with_columns(self, columns):
+        """Returns a batch of other columns read from the same place as this one"""
+        return RecordBatch(columns, self.source, self.position, self.replaces)
+
+    @classmethod
+    def from_rows(cls, column_names, rows):
+        """Builds a batch from a sequence of row tuples"""
+
+        rows = list(rows)
+        return cls({name: [row[index] for row in rows]
+                    for index, name in enumerate(column_names)})
+
+    @property
+    def column_names(self):
+        """Names of the columns in the batch, in order"""
+        return list(self.columns)
+
+    @property
+    def num_rows(self):
+        """Number of records in the batch"""
+        return len(next(iter(self.columns.values()), ()))
+
+    def rows(self):
+        """Iterates over the records in the batch as tuples"""
+        return zip(*self.columns.values())
+
+    def __len__(self):
+        return self.num_rows
+
+
+def batched(column_names, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Lazily groups an iterable of rows into RecordBatches of at most batch_size rows"""
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == batch_size:
+            yield RecordBatch.from_rows(column_names, chunk)
+            chunk = []
+    if chunk:
+        yield RecordBatch.from_rows(column_names, chunk)
+
+
+class ExtractStep():
+    """
+    Base class for the first step of an ETL. load() is a generator of RecordBatches, so a
+    source is never read further ahead than the step consuming it has asked for.
+
+    Sources that can tell what changed return a JSON serializable state from checkpoint().
+    An incremental Etl stores it after a successful run and passes it back to load() as
+    `since` next time, along with the fresh state as `until`, so only the delta is read.
+    """
+
+    message = "Data extracted."
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    @property
+    def source(self):
+        """Identifies the source this step reads, used to key its checkpoint"""
+        return type(self).__name__
+
+    def checkpoint(self):
+        """Returns the current state of the source, or None if changes cannot be tracked"""
+
+        return None
+
+    def unchanged(self, previous, current):
+        """Whether nothing has changed between two checkpoints"""
+
+        return previous == current
+
+    def read(self):
+        """Returns the column names and an iterable of rows. Sample data unless overridden"""
+
+        return SAMPLE_COLUMNS, iter(SAMPLE_ROWS)
+
+    def load(self, batches=None, since=None, until=None):
         """Provides ability to load data from a source"""
 
-        print("Data loaded from Excel file.")
+        del batches, since, until
+        column_names, rows = self.read()
+        yield from batched(column_names, rows, self.batch_size)
+        print(self.message)
+
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+ARRAY_TYPECODES = {int: "q", float: "d"}
+
+
+def line_aligned_ranges(buffer, start, chunk_bytes=DEFAULT_CHUNK_BYTES, stop=None):
+    """Splits buffer[start:stop] into (begin, end) byte ranges of roughly chunk_bytes that end
+    on a newline, so each range holds whole records and can be parsed independently"""
+
+    size = len(buffer) if stop is None else min(stop, len(buffer))
+    position = start
+    while position < size:
+        end = min(position + chunk_bytes, size)
+        if end < size:
+            newline = buffer.find(b"\n", end - 1, size)
+            end = size if newline == -1 else newline + 1
+        yield position, end
+        position = end
+
+
+def parse_csv_range(path, begin, end, column_names, column_types):
+    """
+    Parses one line aligned byte range of a CSV file into columns. The file is memory mapped
+    and the range is sliced once, then split in bulk: numeric columns come back as
+    array.array (or numpy arrays when numpy is installed) and everything else as str.
+    Module level so process pools can pickle it.
+    """
+
+    with open(path, "rb") as csv_file, \
+            mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        chunk = mapped[begin:end]
+    return parse_csv_chunk(chunk, column_names, column_types)
+
+
+def parse_csv_chunk(chunk, column_names, column_types):
+    """Parses whole CSV lines held in a bytes object into a dict of columns"""
+
+    if b"\r" in chunk:
+        chunk = chunk.replace(b"\r\n", b"\n")
+    chunk = chunk.rstrip(b"\n")
+    if not chunk:
+        return {name: [] for name in column_names}
+    if b'"' in chunk:
+        return _parse_quoted_chunk(chunk, column_names, column_types)
+
+    width = len(column_names)
+    expected = (chunk.count(b"\n") + 1) * width
+    types = [column_types.get(name, str) for name in column_names]
+    if numpy is not None and all(kind in ARRAY_TYPECODES for kind in types):
+        dtype = numpy.int64 if all(kind is int for kind in types) else numpy.float64
+        values = numpy.fromstring(chunk.replace(b"\n", b","), dtype=dtype, sep=",")
+        if values.size != expected:
+            raise ValueError(f"Malformed CSV data: expected {expected} values, got {values.size}")
+        values = values.reshape(-1, width)
+        return {name: numpy.ascontiguousarray(values[:, index]).astype(kind, copy=False)
+                for index, (name, kind) in enumerate(zip(column_names, types))}
+
+    fields = chunk.replace(b"\n", b",").split(b",")
+    if len(fields) != expected:
+        raise ValueError(f"Malformed CSV data: expected {expected} values, got {len(fields)}")
+    return {name: _convert_column(fields[index::width], kind)
+            for index, (name, kind) in enumerate(zip(column_names, types))}
+
+
+def _convert_column(fields, kind):
+    if kind not in ARRAY_TYPECODES:
+        return [field.decode("utf-8") for field in fields]
+    values = array(ARRAY_TYPECODES[kind], map(kind, fields))
+    return values if numpy is None else numpy.frombuffer(values, dtype=values.typecode)
+
+
+def _parse_quoted_chunk(chunk, column_names, column_types):
+    rows = list(csv.reader(io.StringIO(chunk.decode("utf-8"))))
+    columns = {}
+    for index, name in enumerate(column_names):
+        kind = column_types.get(name, str)
+        fields = [row[index].encode("utf-8") for row in rows]
+        columns[name] = _convert_column(fields, kind)
+    return columns
+
+
+TAIL_HASH_BYTES = 4096
 
 
-class ExtractS3():
+def file_tail_hash(path, size):
+    """Hashes the last TAIL_HASH_BYTES bytes before offset size"""
+
+    with open(path, "rb") as source_file:
+        source_file.seek(max(0, size - TAIL_HASH_BYTES))
+        return hashlib.sha256(source_file.read(min(size, TAIL_HASH_BYTES))).hexdigest()
+
+
+def complete_size(path, size):
+    """Returns the offset just past the last newline before offset size, or 0 if there is none"""
+
+    with open(path, "rb") as source_file:
+        end = size
+        while end > 0:
+            begin = max(0, end - TAIL_HASH_BYTES)
+            source_file.seek(begin)
+            newline = source_file.read(end - begin).rfind(b"\n")
+            if newline != -1:
+                return begin + newline + 1
+            end = begin
+    return 0
+
+
+def file_checkpoint(path):
+    """
+    Returns the modification time of a file along with the size and tail hash of its complete
+    lines. A line still being written is left out until its newline lands.
+    """
+
+    stat = os.stat(path)
+    size = complete_size(path, stat.st_size)
+    return {"size": size, "mtime_ns": stat.st_mtime_ns, "tail_hash": file_tail_hash(path, size)}
+
+
+class ExtractCsv(ExtractStep):
+    """
+    Example of loading data of a specific type. Given a path, the file is memory mapped and
+    split into line aligned byte ranges that are parsed, in parallel when workers > 1, into
+    one columnar RecordBatch per range. workers defaults to one per CPU. column_types maps
+    column names to int, float or str (the default). Quoted fields are supported but may not
+    contain newlines.
+    """
+
+    message = "Data loaded from CSV file."
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def __init__(self, path=None, column_types=None, chunk_bytes=DEFAULT_CHUNK_BYTES,
+                 workers=None, executor="process", batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.path = path
+        self.column_types = column_types or {}
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        self.executor = executor
+
+    @property
+    def source(self):
+        return os.path.abspath(self.path) if self.path is not None else super().source
+
+    def checkpoint(self):
+        """
+        Size up to the last newline, modification time and a hash of the last few KB before
+        it. The hash lets the next run check that the file was only appended to, in which
+        case it resumes at the old size; any other change reloads the whole file, replacing
+        the rows loaded from it before.
+        """
+
+        if self.path is None:
+            return None
+        return file_checkpoint(self.path)
+
+    def unchanged(self, previous, current):
+        return (previous["size"], previous["mtime_ns"]) == (current["size"], current["mtime_ns"])
+
+    def load(self, batches=None, since=None, until=None):
+        if self.path is None:
+            yield from super().load(batches)
+            return
+        if until is None:
+            yield from self.read_batches()
+        elif since is not None and until["size"] >= since["size"] \
+                and file_tail_hash(self.path, since["size"]) == since["tail_hash"]:
+            yield from self.read_batches(since["size"], until["size"], replaces=True)
+        else:
+            yield from self.read_batches(0, until["size"], replaces=True)
+        print(self.message)
+
+    def read_batches(self, start=0, end=None, replaces=False):
+        """
+        Yields the batches for the records between byte offsets start and end, positioned at
+        start. With replaces, the first batch is flagged as replacing what was loaded from
+        start onwards, and is yielded even if empty.
+        """
+
+        source = self.source
+        with open(self.path, "rb") as csv_file:
+            if os.fstat(csv_file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                header_end = mapped.find(b"\n")
+                header_end = len(mapped) if header_end == -1 else header_end + 1
+                header = mapped[:header_end].decode("utf-8").rstrip("\r\n")
+                column_names = tuple(list(csv.reader([header]))[0])
+                ranges = list(line_aligned_ranges(mapped, max(start, header_end),
+                                                  self.chunk_bytes, end))
+        for columns in self._parse_ranges(ranges, column_names):
+            yield RecordBatch(columns, source, start, replaces)
+            replaces = False
+        if replaces:
+            yield RecordBatch({name: _convert_column([], self.column_types.get(name, str))
+                               for name in column_names}, source, start, replaces)
+
+    def _parse_ranges(self, ranges, column_names):
+        if self.workers == 1 or len(ranges) == 1:
+            for begin, end in ranges:
+                yield parse_csv_range(self.path, begin, end, column_names, self.column_types)
+            return
+        pool_class = ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=self.workers) as pool:
+            lookahead = 2 * (self.workers or os.cpu_count() or 1)
+            pending = deque()
+            for begin, end in ranges:
+                pending.append(pool.submit(parse_csv_range, self.path, begin, end,
+                                           column_names, self.column_types))
+                if len(pending) >= lookahead:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+class ExtractExcel(ExtractStep):
     """Example of loading data of a specific type"""
 
-    @staticmethod
-    def load():
-        """Provides ability to load data from a source"""
+    message = "Data loaded from Excel file."
+
+
+class ExtractBlobStore(ExtractStep):
+    """
+    Base class for object store sources. Without a real store, a local directory of CSV
+    objects stands in for the container, with etags derived from each object's size and
+    modification time, so incremental runs only read objects whose etag changed. A changed
+    object is read whole, replacing the rows loaded from it before, and the rows of an
+    object deleted from the container are dropped.
+    """
 
-        print("Data loaded from S3 bucket.")
+    def __init__(self, container=None, column_types=None, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.container = container
+        self.column_types = column_types
 
+    @property
+    def source(self):
+        if self.container is None:
+            return super().source
+        return os.path.abspath(self.container)
 
-class ExtractAzureBlobStorage():
+    def checkpoint(self):
+        if self.container is None:
+            return None
+        etags = {}
+        with os.scandir(self.container) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".csv"):
+                    stat = entry.stat()
+                    etags[entry.name] = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+        return {"etags": etags}
+
+    def load(self, batches=None, since=None, until=None):
+        if self.container is None:
+            yield from super().load(batches)
+            return
+        previous = (since or {}).get("etags", {})
+        current = (until or self.checkpoint())["etags"]
+        for name in sorted(current):
+            if previous.get(name) != current[name]:
+                extract = ExtractCsv(os.path.join(self.container, name), self.column_types,
+                                     workers=1)
+                yield from extract.read_batches(replaces=until is not None)
+        if until is not None:
+            for name in sorted(set(previous) - set(current)):
+                yield RecordBatch({}, os.path.abspath(os.path.join(self.container, name)),
+                                  replaces=True)
+        print(self.message)
+
+
+class ExtractS3(ExtractBlobStore):
+    """Example of loading data of a specific type"""
+
+    message = "Data loaded from S3 bucket."
+
+
+class ExtractAzureBlobStorage(ExtractBlobStore):
     """Example of loading data of a specific type"""
 
+    message = "Data loaded from Azure Blob."
+
+
+COMPARISONS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+AGGREGATES = ("sum", "count", "min", "max", "mean")
+
+
+def _as_column(values):
+    """
+    Returns the values as a numpy array when numpy is installed, otherwise unchanged. An
+    empty list becomes an empty str array, the default column type, rather than float64.
+    """
+
+    if numpy is None or isinstance(values, numpy.ndarray):
+        return values
+    if isinstance(values, list) and not values:
+        return numpy.array([], dtype=str)
+    return numpy.asarray(values)
+
+
+class TransformSpec():
+    """
+    Declares a columnar transform once, as a chain of filter, cast, derive and project
+    operations optionally followed by a group by. With numpy installed each operation runs
+    vectorized over whole columns of a RecordBatch; without it the same spec falls back to
+    plain Python loops. derive() takes a function of whole columns, such as operator.mul or
+    a numpy ufunc, so it is vectorized for free.
+    """
+
+    def __init__(self):
+        self.operations = []
+        self.grouping = None
+
+    def _add(self, operation):
+        if self.grouping is not None:
+            raise ValueError("group_by must be the last operation of a TransformSpec")
+        self.operations.append(operation)
+        return self
+
+    def filter(self, column, comparison, value):
+        """Keeps rows where `column <comparison> value`, comparison being e.g. '>' or 'in'"""
+
+        if comparison != "in" and comparison not in COMPARISONS:
+            raise ValueError(f"Unknown comparison {comparison!r}")
+        return self._add(("filter", column, comparison, value))
+
+    def project(self, *columns):
+        """Keeps only the named columns, in the given order"""
+
+        return self._add(("project", columns))
+
+    def cast(self, column, kind):
+        """Converts a column to int, float or str"""
+
+        return self._add(("cast", column, kind))
+
+    def derive(self, name, function, *columns):
+        """Adds a column computed as function(*columns) over whole columns"""
+
+        return self._add(("derive", name, function, columns))
+
+    def group_by(self, keys, **aggregations):
+        """
+        Groups all batches of the stream by the key column(s) and aggregates, e.g.
+        group_by("region", total=("amount", "sum"), orders=("id", "count"))
+        """
+
+        for column, aggregate in aggregations.values():
+            if aggregate not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate {aggregate!r} for column {column!r}")
+        self.grouping = ((keys,) if isinstance(keys, str) else tuple(keys), aggregations)
+        return self
+
+    def apply(self, batch):
+        """Applies the row level operations of the spec to a single batch"""
+
+        columns = {name: _as_column(values) for name, values in batch.columns.items()}
+        for operation in self.operations:
+            columns = getattr(self, f"_{operation[0]}")(columns, *operation[1:])
+        return batch.with_columns(columns)
+
+    def stream(self, batches):
+        """Transforms a stream of batches. A group by consumes the stream before yielding"""
+
+        if self.grouping is None:
+            for batch in batches:
+                transformed = self.apply(batch)
+                if transformed.num_rows or transformed.replaces:
+                    yield transformed
+            return
+        aggregator = GroupAggregator(*self.grouping)
+        for batch in batches:
+            aggregator.update(self.apply(batch))
+        yield aggregator.result()
+
     @staticmethod
-    def load():
-        """Provides ability to load data from a source"""
+    def _filter(columns, column, comparison, value):
+        values = columns[column]
+        if numpy is not None:
+            if comparison == "in":
+                mask = numpy.isin(values, list(value))
+            else:
+                mask = COMPARISONS[comparison](values, value)
+            return {name: data[mask] for name, data in columns.items()}
+        if comparison == "in":
+            mask = [item in value for item in values]
+        else:
+            mask = [COMPARISONS[comparison](item, value) for item in values]
+        return {name: list(compress(data, mask)) for name, data in columns.items()}
+
+    @staticmethod
+    def _project(columns, names):
+        return {name: columns[name] for name in names}
 
-        print("Data loaded from Azure Blob.")
+    @staticmethod
+    def _cast(columns, column, kind):
+        columns = dict(columns)
+        if numpy is not None:
+            columns[column] = columns[column].astype(kind)
+        else:
+            columns[column] = [kind(item) for item in columns[column]]
+        return columns
+
+    @staticmethod
+    def _derive(columns, name, function, sources):
+        columns = dict(columns)
+        arguments = [columns[source] for source in sources]
+        if numpy is not None:
+            columns[name] = _as_column(function(*arguments))
+        else:
+            columns[name] = list(map(function, *arguments))
+        return columns
+
+
+class GroupAggregator():
+    """
+    Running group by state for a stream of batches. Each batch is reduced to per group
+    partial aggregates (with numpy: one sort plus reduceat per aggregate), which are merged
+    into a dict keyed by group, so memory grows with the number of groups, not rows.
+    """
+
+    def __init__(self, keys, aggregations):
+        self.keys = keys
+        self.aggregations = aggregations
+        self.partials = {}
+
+    def update(self, batch):
+        """Merges the aggregates of one batch into the running state"""
+
+        if not batch.num_rows:
+            return
+        if numpy is None:
+            for row in zip(*(batch.columns[key] for key in self.keys),
+                           *(batch.columns[column] for column, _ in
+                             self.aggregations.values())):
+                key, values = row[:len(self.keys)], row[len(self.keys):]
+                self._merge(key, [(value, 1) for value in values])
+            return
+        group_keys, order, starts = self._group(batch)
+        counts = numpy.diff(numpy.append(starts, len(order)))
+        reduced = []
+        for column, aggregate in self.aggregations.values():
+            values = batch.columns[column][order]
+            if aggregate in ("sum", "mean"):
+                reduced.append(numpy.add.reduceat(values, starts).tolist())
+            elif aggregate in ("min", "max"):
+                ufunc = numpy.minimum if aggregate == "min" else numpy.maximum
+                reduced.append(ufunc.reduceat(values, starts).tolist())
+            else:
+                reduced.append([None] * len(starts))
+        for index, key in enumerate(group_keys):
+            count = int(counts[index])
+            self._merge(key, [(values[index], count) for values in reduced])
+
+    def _group(self, batch):
+        key_columns = [batch.columns[key] for key in self.keys]
+        if len(key_columns) == 1:
+            inverse = numpy.unique(key_columns[0], return_inverse=True)[1]
+        else:
+            inverse = numpy.unique(numpy.rec.fromarrays(key_columns), return_inverse=True)[1]
+        order = numpy.argsort(inverse.ravel(), kind="stable")
+        sorted_inverse = inverse.ravel()[order]
+        starts = numpy.flatnonzero(numpy.diff(sorted_inverse, prepend=-1))
+        first_rows = order[starts]
+        group_keys = list(zip(*(column[first_rows].tolist() for column in key_columns)))
+        return group_keys, order, starts
+
+    def _merge(self, key, states):
+        """Each state is a [partial sum, minimum or maximum, row count] pair"""
+
+        current = self.partials.get(key)
+        if current is None:
+            self.partials[key] = [list(state) for state in states]
+            return
+        for (_, aggregate), state, new in zip(self.aggregations.values(), current, states):
+            if aggregate in ("sum", "mean"):
+                state[0] += new[0]
+            elif aggregate == "min":
+                state[0] = min(state[0], new[0])
+            elif aggregate == "max":
+                state[0] = max(state[0], new[0])
+            state[1] += new[1]
+
+    def result(self):
+        """Returns one batch with a row per group, sorted by key"""
+
+        group_keys = sorted(self.partials)
+        columns = {key: [group[index] for group in group_keys]
+                   for index, key in enumerate(self.keys)}
+        for position, (name, (_, aggregate)) in enumerate(self.aggregations.items()):
+            states = [self.partials[group][position] for group in group_keys]
+            if aggregate == "count":
+                columns[name] = [state[1] for state in states]
+            elif aggregate == "mean":
+                columns[name] = [state[0] / state[1] for state in states]
+            else:
+                columns[name] = [state[0] for state in states]
+        return RecordBatch({name: _as_column(values) for name, values in columns.items()})
 
 
 class TransformData():
-    """Example of fransforming data"""
+    """
+    Example of fransforming data. transform may be a TransformSpec, applied vectorized to
+    the stream, or any callable that maps one RecordBatch to another.
+    """
 
-    @staticmethod
-    def load():
-        """Provides ability to transform data"""
+    def __init__(self, transform=None):
+        self.transform = transform
 
+    def load(self, batches=()):
+        """Provides ability to transform data, one batch at a time"""
+
+        if isinstance(self.transform, TransformSpec):
+            yield from self.transform.stream(batches)
+        else:
+            for batch in batches:
+                yield batch if self.transform is None else self.transform(batch)
         print("Data transformed.")
 
 
+def batch_rows(batch):
+    """Iterates over a batch as rows of plain Python values, ready to bind to SQL parameters"""
+
+    return zip(*(values.tolist() if hasattr(values, "tolist") else values
+                 for values in batch.columns.values()))
+
+
+def _sql_type(values):
+    kind = getattr(getattr(values, "dtype", None), "kind", None)
+    if kind is not None:
+        return {"i": "INTEGER", "u": "INTEGER", "b": "INTEGER", "f": "REAL"}.get(kind, "TEXT")
+    typecode = getattr(values, "typecode", None)
+    if typecode is not None:
+        return "REAL" if typecode in "fd" else "INTEGER"
+    sample = next(iter(values), None)
+    if isinstance(sample, (bool, int)):
+        return "INTEGER"
+    return "REAL" if isinstance(sample, float) else "TEXT"
+
+
+def _quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+_ABORT = object()
+_FLUSH = object()
+
+
+# pylint: disable=locally-disabled, too-many-instance-attributes
 class LoadDataToDatabase():
-    """Example of saving data to a target system"""
+    """
+    Example of saving data to a target system. Without a database the rows are only counted.
+    Given a SQLite database path, the table is created from the first non-empty batch's
+    columns and batches are handed through a bounded queue to a pool of writer threads, each
+    with its own connection, that insert them with executemany inside transactions of
+    transaction_rows rows. The bounded queue means extraction never runs more than a few
+    batches ahead of the writers. SQLite allows one writer at a time, so extra writers only
+    help targets that accept concurrent writes. If the batches themselves raise, the writers
+    roll back their open transactions instead of committing a partial one, and the error is
+    re-raised.
 
-    @staticmethod
-    def load():
-        """Provides ability to load data to a database"""
+    When batches name their source, each row is stored with it in source_column and with the
+    position its read began at in position_column. Before a batch that replaces its source
+    from a position is queued, the writers commit what they hold and the rows stored for that
+    source at or after the position are deleted. A reloaded source, or a delta retried after
+    a run failed partway, is therefore never loaded twice.
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def __init__(self, database=None, table="records", writers=1,
+                 transaction_rows=5 * DEFAULT_BATCH_SIZE, source_column="_source",
+                 position_column="_position"):
+        self.database = database
+        self.table = table
+        self.writers = writers
+        self.transaction_rows = transaction_rows
+        self.source_column = source_column
+        self.position_column = position_column
+        self.rows_loaded = 0
+        self._lock = threading.Lock()
 
+    def load(self, batches=()):
+        """Provides ability to load data to a database, pulling one batch at a time"""
+
+        if self.database is None:
+            for batch in batches:
+                self.rows_loaded += batch.num_rows
+        else:
+            self._write(batches)
         print("Data loaded to database table!")
+        return self.rows_loaded
+
+    def _write(self, batches):
+        work = queue.Queue(maxsize=2 * self.writers)
+        flushed = threading.Barrier(self.writers + 1)
+        errors, threads, tracked = [], [], None
+        sentinel = None
+        try:
+            for batch in batches:
+                if tracked is None:
+                    tracked = batch.source is not None
+                if tracked and batch.replaces and not errors:
+                    self._delete_source(batch, work, flushed if threads else None, errors)
+                if errors:
+                    break
+                if not batch.num_rows:
+                    continue
+                if not threads:
+                    insert = self._prepare_table(batch, tracked)
+                    threads = [threading.Thread(target=self._writer, daemon=True,
+                                                args=(work, insert, tracked, flushed, errors))
+                               for _ in range(self.writers)]
+                    for thread in threads:
+                        thread.start()
+                work.put(batch)
+        except BaseException:
+            sentinel = _ABORT
+            raise
+        finally:
+            for _ in threads:
+                work.put(sentinel)
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    def _tracking_columns(self):
+        return [f"{_quote_identifier(self.source_column)} TEXT",
+                f"{_quote_identifier(self.position_column)} INTEGER"]
+
+    def _add_tracking_columns(self, connection):
+        """Adds the source and position columns to a table created without them"""
+
+        table = _quote_identifier(self.table)
+        existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+        for name, column in zip((self.source_column, self.position_column),
+                                self._tracking_columns()):
+            if name not in existing:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+    def _prepare_table(self, batch, tracked):
+        table = _quote_identifier(self.table)
+        names = list(batch.columns)
+        columns = [f"{_quote_identifier(name)} {_sql_type(values)}"
+                   for name, values in batch.columns.items()]
+        if tracked:
+            names += [self.source_column, self.position_column]
+            columns += self._tracking_columns()
+        with closing(sqlite3.connect(self.database)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})")
+            if tracked:
+                self._add_tracking_columns(connection)
+            connection.commit()
+        return (f"INSERT INTO {table} ({', '.join(map(_quote_identifier, names))}) "
+                f"VALUES ({', '.join('?' * len(names))})")
+
+    def _delete_source(self, batch, work, flushed, errors):
+        if flushed is not None:
+            for _ in range(self.writers):
+                work.put(_FLUSH)
+            flushed.wait()
+            if errors:
+                return
+        with closing(sqlite3.connect(self.database, timeout=60)) as connection:
+            if connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                                  "AND name = ?", (self.table,)).fetchone() is None:
+                return
+            self._add_tracking_columns(connection)
+            connection.execute(f"DELETE FROM {_quote_identifier(self.table)} "
+                               f"WHERE {_quote_identifier(self.source_column)} = ? AND "
+                               f"COALESCE({_quote_identifier(self.position_column)}, 0) >= ?",
+                               (batch.source, batch.position))
+            connection.commit()
+
+    # pylint: disable=locally-disabled, too-many-arguments, too-many-positional-arguments
+    def _writer(self, work, insert, tracked, flushed, errors):
+        connection = sqlite3.connect(self.database, timeout=60, isolation_level=None,
+                                     check_same_thread=False)
+        pending = 0
+        try:
+            while (batch := work.get()) is not None and batch is not _ABORT:
+                if batch is _FLUSH:
+                    self._end_transaction(connection, pending, errors)
+                    pending = 0
+                    flushed.wait()
+                    continue
+                if errors:
+                    continue
+                try:
+                    if not connection.in_transaction:
+                        connection.execute("BEGIN")
+                    rows = batch_rows(batch)
+                    if tracked:
+                        rows = (row + (batch.source, batch.position) for row in rows)
+                    connection.executemany(insert, rows)
+                    pending += batch.num_rows
+                    if pending >= self.transaction_rows:
+                        connection.execute("COMMIT")
+                        self._committed(pending)
+                        pending = 0
+                except sqlite3.Error as error:
+                    errors.append(error)
+            if batch is _ABORT:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+            else:
+                self._end_transaction(connection, pending, errors)
+        finally:
+            connection.close()
+
+    def _end_transaction(self, connection, pending, errors):
+        try:
+            if connection.in_transaction:
+                if errors:
+                    connection.execute("ROLLBACK")
+                else:
+                    connection.execute("COMMIT")
+                    self._committed(pending)
+        except sqlite3.Error as error:
+            errors.append(error)
+
+    def _committed(self, rows):
+        with self._lock:
+            self.rows_loaded += rows
 
 
 class Etl:
-    """Base class for ETLs of various types"""
+    """
+    Base class for ETLs of various types. Steps are chained as generators: the extract step
+    yields RecordBatches, each following step consumes the previous one's output, and the
+    final step pulls batches through the chain. A batch is only produced when the step after
+    it asks for one, so peak memory is a handful of batches however large the source is.
+    Steps may be listed as classes, which are instantiated with their defaults, or as
+    configured instances.
+
+    Given a CheckpointStore, the run is incremental: it is skipped entirely when the extract
+    step's source is unchanged since the last successful run, otherwise only the delta is
+    extracted, and the new checkpoint is stored once the last step has finished.
+    """
 
     steps = []
 
-    def execute_etl(self):
-        """Provides ability to perform a series of steps"""
+    def __init__(self):
+        self.skipped = False
+
+    def execute_etl(self, checkpoints=None):
+        """Provides ability to perform a series of steps, returning the last step's result"""
 
-        for step in self.steps:
-            step.load()
+        steps = [step() if isinstance(step, type) else step for step in self.steps]
+        self.skipped = False
+        if not steps:
+            return None
+        extract, name, current = steps[0], type(self).__name__, None
+        if checkpoints is None or not hasattr(extract, "checkpoint"):
+            stream = extract.load()
+        else:
+            previous = checkpoints.get(name, extract.source)
+            current = extract.checkpoint()
+            if current is not None and previous is not None \
+                    and extract.unchanged(previous, current):
+                print(f"{name} skipped, its source has not changed.")
+                self.skipped = True
+                return None
+            stream = extract.load(since=previous, until=current)
+        for step in steps[1:]:
+            stream = step.load(stream)
+        if current is not None:
+            checkpoints.put(name, extract.source, current)
+        return stream
+
+
+class CheckpointStore():
+    """
+    Small local state store for incremental ETL runs, holding one JSON checkpoint per
+    (ETL, source) pair in a SQLite file so concurrent ETLs, even in other processes, can share
+    it safely.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(sqlite3.connect(self.path, timeout=60)) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS checkpoints (etl TEXT, source TEXT, "
+                               "state TEXT, PRIMARY KEY (etl, source))")
+            connection.commit()
+
+    def get(self, etl, source):
+        """Returns the last stored checkpoint, or None if the ETL never ran for the source"""
+
+        with closing(sqlite3.connect(self.path, timeout=60)) as connection:
+            row = connection.execute("SELECT state FROM checkpoints WHERE etl = ? AND source = ?",
+                                     (etl, source)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, etl, source, state):
+        """Stores the checkpoint of a successful run"""
+
+        with closing(sqlite3.connect(self.path, timeout=60)) as connection:
+            connection.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+                               (etl, source, json.dumps(state)))
+            connection.commit()
 
 
 class EtlForSystem1(Etl):
     """Example of ETL that loads data for a specific system"""
 
-    steps = [ExtractCsv, TransformData, LoadDataToDatabase]
+    steps = [
+        ExtractCsv,
+        TransformData(TransformSpec().cast("amount", float).filter("amount", ">", 0)),
+        LoadDataToDatabase,
+    ]
 
 
 class EtlForSystem2(Etl):
@@ -94,35 +969,216 @@ class EtlForSystem3(Etl):
 class EtlForSystem4(Etl):
     """Example of ETL that loads data for a specific system"""
 
-    steps = [ExtractS3, TransformData, LoadDataToDatabase]
+    steps = [
+        ExtractS3,
+        TransformData(TransformSpec()
+                      .group_by("region", total=("amount", "sum"), orders=("id", "count"))),
+        LoadDataToDatabase,
+    ]
+
+
+def run_etl(name, etl_class, checkpoint_path=None, started_at=None):
+    """
+    Runs a single ETL, incrementally when given a checkpoint store path, returning how long it
+    took and whether it was skipped. When given a started_at mapping, records the wall clock
+    time the ETL started under its name. Module level so process pools can pickle it.
+    """
+
+    if started_at is not None:
+        started_at[name] = time.time()
+    print(f"Now loading {name} data")
+    started = time.perf_counter()
+    etl = etl_class()
+    etl.execute_etl(None if checkpoint_path is None else CheckpointStore(checkpoint_path))
+    return time.perf_counter() - started, etl.skipped
+
+
+class EtlRunResult():
+    """Outcome of running a single ETL as part of a data warehouse load"""
+
+    def __init__(self, name, status, elapsed, error=None):
+        self.name = name
+        self.status = status
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def succeeded(self):
+        """Whether the ETL completed, or was skipped, without raising or timing out"""
+        return self.status in ("succeeded", "skipped")
+
+    def __repr__(self):
+        detail = f", error={self.error!r}" if self.error is not None else ""
+        return f"EtlRunResult({self.name!r}, {self.status}, {self.elapsed:.3f}s{detail})"
+
+
+class EtlRunSummary():
+    """Wall clock and per pipeline timings for a data warehouse load"""
+
+    def __init__(self, results, wall_clock):
+        self.results = results
+        self.wall_clock = wall_clock
+
+    @property
+    def pipeline_time(self):
+        """Sum of the individual pipeline timings, i.e. the cost of running them one by one"""
+        return sum(result.elapsed for result in self.results)
+
+    @property
+    def failures(self):
+        """Results for the ETLs that raised or timed out"""
+        return [result for result in self.results if not result.succeeded]
+
+    def __str__(self):
+        lines = [f"{result.name}: {result.status} in {result.elapsed:.3f}s"
+                 for result in self.results]
+        lines.append(f"wall clock {self.wall_clock:.3f}s vs {self.pipeline_time:.3f}s "
+                     "of pipeline time")
+        return "\n".join(lines)
 
 
 class DataWarehouse():
-    """Defines a logical data warehouse"""
+    """
+    Defines a logical data warehouse. The registered ETLs share no state, so load_all can run
+    them concurrently on a thread or process pool, bounding the load by the slowest ETL
+    rather than the sum of all of them. Given a checkpoint_path, every ETL runs incrementally
+    against a CheckpointStore kept in that file.
+    """
+
+    def __init__(self, executor="thread", max_workers=None, checkpoint_path=None):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"executor must be 'thread' or 'process', not {executor!r}")
+        self.executor = executor
+        self.max_workers = max_workers
+        self.checkpoint_path = checkpoint_path
+        self.etls = {
+            "system 1": EtlForSystem1,
+            "system 2": EtlForSystem2,
+            "system 3": EtlForSystem3,
+            "system 4": EtlForSystem4,
+        }
+
+    def register_etl(self, name, etl_class):
+        """Adds an ETL to the set that load_all runs"""
+
+        self.etls[name] = etl_class
+
+    def load_all(self, timeout=None, timeouts=None):
+        """
+        Runs every registered ETL concurrently. timeout applies to each ETL and timeouts may
+        override it per ETL name. An ETL's timeout counts from when it starts, so ETLs queued
+        for a free worker are not charged for the wait; once every running ETL has been
+        given up on, queued ETLs are timed from then, as abandoned ETLs may hold on to their
+        workers. An ETL that raises or times out is reported in the summary without affecting
+        the others; pool workers cannot be interrupted, so a timed out ETL is abandoned rather
+        than stopped.
+        """
+
+        timeouts = timeouts or {}
+        pool_class = ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor
+        pool = pool_class(max_workers=self.max_workers or len(self.etls) or None)
+        manager = multiprocessing.Manager() if self.executor == "process" else None
+        started_at = {} if manager is None else manager.dict()
+        finished_at = {}
+        started = time.perf_counter()
+        futures = {}
+        for name, etl_class in self.etls.items():
+            futures[name] = pool.submit(run_etl, name, etl_class, self.checkpoint_path,
+                                        started_at)
+            futures[name].add_done_callback(
+                lambda _, name=name: finished_at.setdefault(name, time.time()))
+        limits = {name: timeouts.get(name, timeout) for name in futures}
+        try:
+            results = self._collect_all(futures, limits, started_at, finished_at)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            if manager is not None:
+                manager.shutdown()
+        return EtlRunSummary([results[name] for name in futures],
+                             time.perf_counter() - started)
+
+    @classmethod
+    def _collect_all(cls, futures, limits, started_at, finished_at):
+        """
+        Waits for every ETL, giving up on one once it has run for its limit. An ETL that has
+        not started yet is timed from when no ETL was left running, if that happened.
+        """
+
+        results = {}
+        pending = set(futures)
+        stalled_since = None
+        while pending:
+            now = time.time()
+            began = {name: started_at.get(name) for name in pending}
+            running = [name for name in pending
+                       if began[name] is not None and not futures[name].done()]
+            stalled_since = None if running else (stalled_since or now)
+            deadlines = {}
+            for name in pending:
+                clock = began[name] if began[name] is not None else stalled_since
+                if limits[name] is not None and clock is not None:
+                    deadlines[name] = clock + limits[name]
+            for name in sorted(pending):
+                if futures[name].done() or deadlines.get(name, float("inf")) <= now:
+                    results[name] = cls._collect(name, futures[name], started_at, finished_at)
+            pending.difference_update(results)
+            waits = [deadlines[name] - now for name in pending if name in deadlines]
+            if any(limits[name] is not None and began[name] is None for name in pending):
+                waits.append(0.01)
+            if pending:
+                wait([futures[name] for name in pending], min(waits, default=None),
+                     FIRST_COMPLETED)
+        return results
+
+    @staticmethod
+    def _collect(name, future, started_at, finished_at):
+        """
+        Reports one ETL that either finished or ran out of time. Failed and timed out ETLs
+        are timed from when that ETL started, as recorded by run_etl, to when it finished or
+        was given up on; one that never started took no time.
+        """
+
+        # pylint: disable=locally-disabled, broad-exception-caught
+        try:
+            elapsed, skipped = future.result(timeout=0)
+            return EtlRunResult(name, "skipped" if skipped else "succeeded", elapsed)
+        except FutureTimeoutError:
+            future.cancel()
+            status, error = "timed out", None
+        except Exception as caught:
+            status, error = "failed", caught
+        began = started_at.get(name)
+        elapsed = 0.0 if began is None else finished_at.get(name, time.time()) - began
+        return EtlRunResult(name, status, max(0.0, elapsed), error)
+
+    def _checkpoints(self):
+        if self.checkpoint_path is None:
+            return None
+        return CheckpointStore(self.checkpoint_path)
 
     def load_system1(self):
         """Loads data from a specific system"""
 
         print("Now loading system 1 data")
-        EtlForSystem1().execute_etl()
+        EtlForSystem1().execute_etl(self._checkpoints())
 
     def load_system2(self):
         """Loads data from a specific system"""
 
         print("Now loading system 2 data")
-        EtlForSystem2().execute_etl()
+        EtlForSystem2().execute_etl(self._checkpoints())
 
     def load_system3(self):
         """Loads data from a specific system"""
 
         print("Now loading system 3 data")
-        EtlForSystem3().execute_etl()
+        EtlForSystem3().execute_etl(self._checkpoints())
 
     def load_system4(self):
         """Loads data from a specific system"""
 
         print("Now loading system 4 data")
-        EtlForSystem4().execute_etl()
+        EtlForSystem4().execute_etl(self._checkpoints())
 
 
 class ClientSystem():
@@ -150,10 +1206,91 @@ class ClientSystem():
         edw.load_system4()
 
 
+def _write_benchmark_csv(path, row_count):
+    with open(path, "w", encoding="utf-8") as csv_file:
+        csv_file.write("id,quantity,amount\n")
+        for start in range(0, row_count, 100_000):
+            csv_file.writelines(f"{number},{number % 97},{number * 0.25}\n"
+                                for number in range(start, min(start + 100_000, row_count)))
+
+
+def _read_csv_naively(path):
+    rows = 0
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader)
+        for row in reader:
+            int(row[0]), int(row[1]), float(row[2])  # pylint: disable=expression-not-assigned
+            rows += 1
+    return rows
+
+
+def benchmark_csv_extract(row_counts=(1_000_000, 10_000_000, 50_000_000), workers=None):
+    """Compares ExtractCsv with a naive csv.reader loop on generated files of row_counts rows"""
+
+    column_types = {"id": int, "quantity": int, "amount": float}
+    with tempfile.TemporaryDirectory() as directory:
+        for row_count in row_counts:
+            path = os.path.join(directory, f"bench_{row_count}.csv")
+            _write_benchmark_csv(path, row_count)
+
+            started = time.perf_counter()
+            naive_rows = _read_csv_naively(path)
+            naive = time.perf_counter() - started
+
+            started = time.perf_counter()
+            extract = ExtractCsv(path, column_types, workers=workers)
+            fast_rows = sum(batch.num_rows for batch in extract.load())
+            fast = time.perf_counter() - started
+
+            print(f"{row_count:>11,} rows: csv.reader {naive:.2f}s "
+                  f"({naive_rows / naive:,.0f} rows/s), ExtractCsv {fast:.2f}s "
+                  f"({fast_rows / fast:,.0f} rows/s), {naive / fast:.1f}x faster")
+            os.remove(path)
+
+
+def benchmark_database_load(row_count=200_000, batch_sizes=(1, 100, 1_000, 10_000, 100_000),
+                            baseline_rows=5_000):
+    """
+    Compares LoadDataToDatabase across batch sizes against row at a time inserts committed
+    one by one, in rows per second. The baseline only inserts baseline_rows rows, as it is
+    orders of magnitude slower.
+    """
+
+    def rows(count):
+        return ((number, f"R{number % 7}", number * 0.25) for number in range(count))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "baseline.db")
+        with closing(sqlite3.connect(path)) as connection:
+            connection.execute("CREATE TABLE records (id INTEGER, region TEXT, amount REAL)")
+            started = time.perf_counter()
+            for row in rows(baseline_rows):
+                connection.execute("INSERT INTO records VALUES (?, ?, ?)", row)
+                connection.commit()
+            baseline = baseline_rows / (time.perf_counter() - started)
+        print(f"row at a time: {baseline:,.0f} rows/s")
+
+        for batch_size in batch_sizes:
+            sink = LoadDataToDatabase(os.path.join(directory, f"batched_{batch_size}.db"))
+            batches = batched(("id", "region", "amount"), rows(row_count), batch_size)
+            started = time.perf_counter()
+            sink.load(batches)
+            throughput = sink.rows_loaded / (time.perf_counter() - started)
+            print(f"batch size {batch_size:>7,}: {throughput:,.0f} rows/s "
+                  f"({throughput / baseline:.0f}x)")
+
+
 def demo_facade_pattern():
     """Demo the Facade design pattern as implemented using the classes above"""
     ClientSystem()
 
 
+def demo_parallel_facade_pattern():
+    """Demo loading every system's data concurrently through the data warehouse facade"""
+    summary = DataWarehouse(executor="thread").load_all(timeout=60)
+    print(summary)
+
+
 if __name__ == "__main__":
     demo_facade_pattern()
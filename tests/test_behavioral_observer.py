@@ -1,4 +1,11 @@
+import asyncio
+import gc
+import os
+import tempfile
+import threading
+import time
 import unittest
+from functools import partial
 import Behavioral.Observer.observer_pattern as o
 
 class Test_DiscountObserverInterface(unittest.TestCase):
@@ -24,6 +31,594 @@ class Test_DiscountObserverInterface(unittest.TestCase):
         pricing_optimizer.cancel_request(object_to_notify)
         self.assertEqual(len(pricing_optimizer._discount_observers), 0)
 
+    def test_PricingOptimizer_ignores_duplicate_requests(self):
+        object_to_notify = o.Customer("object")
+        pricing_optimizer = o.PricingOptimizer()
+        pricing_optimizer.request_notification(object_to_notify)
+        pricing_optimizer.request_notification(object_to_notify)
+        self.assertEqual(len(pricing_optimizer._discount_observers), 1)
+
+    def test_PricingOptimizer_does_not_keep_observers_alive(self):
+        pricing_optimizer = o.PricingOptimizer()
+        kept = o.Customer("kept")
+        dropped = o.Customer("dropped")
+        pricing_optimizer.request_notification(kept)
+        pricing_optimizer.request_notification(dropped)
+        del dropped
+        gc.collect()
+        self.assertEqual(len(pricing_optimizer._discount_observers), 1)
+        self.assertEqual(list(pricing_optimizer._discount_observers), [kept])
+
+
+class Test_ObserverRegistry(unittest.TestCase):
+    def test_ObserverRegistry_preserves_insertion_order(self):
+        registry = o.ObserverRegistry()
+        observers = [o.Customer(f"customer {number}") for number in range(5)]
+        for observer in observers:
+            registry.add(observer)
+        registry.remove(observers[2])
+        self.assertEqual(list(registry), observers[:2] + observers[3:])
+
+    def test_ObserverRegistry_remove_raises_for_unknown_observer(self):
+        registry = o.ObserverRegistry()
+        self.assertRaises(ValueError, registry.remove, o.Customer("stranger"))
+        self.assertFalse(registry.discard(o.Customer("stranger")))
+
+
+class Test_PricingOptimizerTopics(unittest.TestCase):
+    def setUp(self):
+        self.pricing_optimizer = o.PricingOptimizer()
+        self.gold_texan = o.Customer("gold texan", region="TX", tier="gold")
+        self.silver_texan = o.Customer("silver texan", region="TX", tier="silver")
+        self.gold_bostonian = o.Customer("gold bostonian", region="MA", tier="gold")
+        self.warehouse = o.Warehouse("warehouse", region="TX")
+        for observer in [self.gold_texan, self.silver_texan, self.gold_bostonian, self.warehouse]:
+            self.pricing_optimizer.request_notification(observer)
+
+    def test_PricingOptimizer_routes_by_type_region_and_tier(self):
+        self.assertEqual(list(self.pricing_optimizer.observers_for(("type", "Warehouse"))),
+                         [self.warehouse])
+        self.assertEqual(list(self.pricing_optimizer.observers_for(("tier", "gold"))),
+                         [self.gold_texan, self.gold_bostonian])
+        self.assertEqual(len(self.pricing_optimizer.observers_for(("region", "TX"))), 3)
+        self.assertEqual(list(self.pricing_optimizer.observers_for(("region", "CA"))), [])
+
+    def test_PricingOptimizer_segments_index_existing_and_new_observers(self):
+        self.pricing_optimizer.define_segment(
+            "gold", lambda observer: getattr(observer, "tier", None) == "gold")
+        late_gold = o.Customer("late gold", tier="gold")
+        self.pricing_optimizer.request_notification(late_gold)
+        self.assertEqual(list(self.pricing_optimizer.observers_for(("segment", "gold"))),
+                         [self.gold_texan, self.gold_bostonian, late_gold])
+
+    def test_PricingOptimizer_cancel_request_removes_observer_from_topics(self):
+        self.pricing_optimizer.cancel_request(self.gold_texan)
+        self.assertEqual(list(self.pricing_optimizer.observers_for(("tier", "gold"))),
+                         [self.gold_bostonian])
+        self.assertEqual(len(self.pricing_optimizer.observers_for(("region", "TX"))), 2)
+
+    def test_PricingOptimizer_notify_only_touches_topic_subscribers(self):
+        notified = []
+        self.warehouse.discounts_have_started = lambda: notified.append("warehouse")
+        self.gold_texan.discounts_have_started = lambda: notified.append("gold texan")
+        self.pricing_optimizer.notify_discount_start(("type", "Warehouse"))
+        self.assertEqual(notified, ["warehouse"])
+
+
+class SlowObserver(o.DiscountObserverInterface):
+    def __init__(self, name, delay):
+        super().__init__(name)
+        self.delay = delay
+        self.started = False
+
+    async def discounts_have_started(self):
+        await asyncio.sleep(self.delay)
+        self.started = True
+
+    def discounts_have_ended(self):
+        raise RuntimeError("handler failure")
+
+
+class BlockingObserver(o.DiscountObserverInterface):
+    def __init__(self, name, delay):
+        super().__init__(name)
+        self.delay = delay
+
+    def discounts_have_started(self):
+        time.sleep(self.delay)
+
+    def discounts_have_ended(self):
+        pass
+
+
+class Test_PricingOptimizerAsyncDispatch(unittest.TestCase):
+    def test_PricingOptimizer_async_dispatch_reports_deliveries(self):
+        pricing_optimizer = o.PricingOptimizer()
+        customers = [o.Customer(f"customer {number}") for number in range(5)]
+        for customer in customers:
+            pricing_optimizer.request_notification(customer)
+        report = asyncio.run(pricing_optimizer.notify_discount_start_async(batch_size=2))
+        self.assertEqual(report.delivered, 5)
+        self.assertEqual(report.failed, 0)
+        self.assertGreater(report.throughput, 0)
+
+    def test_PricingOptimizer_async_dispatch_awaits_coroutine_handlers(self):
+        pricing_optimizer = o.PricingOptimizer()
+        observers = [SlowObserver(f"observer {number}", 0.01) for number in range(4)]
+        for observer in observers:
+            pricing_optimizer.request_notification(observer)
+        report = asyncio.run(pricing_optimizer.notify_discount_start_async(max_concurrency=2))
+        self.assertEqual(report.delivered, 4)
+        self.assertTrue(all(observer.started for observer in observers))
+
+    def test_PricingOptimizer_async_dispatch_times_out_slow_handlers(self):
+        pricing_optimizer = o.PricingOptimizer()
+        slow_observer = SlowObserver("slow", 5)
+        customer = o.Customer("customer")
+        pricing_optimizer.request_notification(slow_observer)
+        pricing_optimizer.request_notification(customer)
+        report = asyncio.run(pricing_optimizer.notify_discount_start_async(handler_timeout=0.01))
+        self.assertEqual(report.delivered, 1)
+        self.assertEqual(report.timed_out, 1)
+        self.assertFalse(slow_observer.started)
+
+    def test_PricingOptimizer_async_dispatch_times_out_blocking_handlers_off_the_loop(self):
+        pricing_optimizer = o.PricingOptimizer()
+        blocking_observer = BlockingObserver("blocking", 0.5)
+        fast_observer = SlowObserver("fast", 0.01)
+        pricing_optimizer.request_notification(blocking_observer)
+        pricing_optimizer.request_notification(fast_observer)
+        report = asyncio.run(pricing_optimizer.notify_discount_start_async(handler_timeout=0.1))
+        self.assertLess(report.elapsed, 0.4)
+        self.assertEqual(report.delivered, 1)
+        self.assertEqual(report.timed_out, 1)
+        self.assertTrue(fast_observer.started)
+
+    def test_PricingOptimizer_async_dispatch_isolates_failures(self):
+        pricing_optimizer = o.PricingOptimizer()
+        failing_observer = SlowObserver("failing", 0)
+        customer = o.Customer("customer")
+        pricing_optimizer.request_notification(failing_observer)
+        pricing_optimizer.request_notification(customer)
+        report = asyncio.run(pricing_optimizer.notify_discount_end_async())
+        self.assertEqual(report.delivered, 1)
+        self.assertEqual(report.failed, 1)
+
+
+class RecordingObserver(o.DiscountObserverInterface):
+    def __init__(self, name, region=None, fail=False, observer_id=None):
+        super().__init__(name, region, observer_id)
+        self.events = []
+        self.fail = fail
+
+    def discounts_have_started(self):
+        if self.fail:
+            raise ConnectionError("observer unavailable")
+        self.events.append("start")
+
+    def discounts_have_ended(self):
+        if self.fail:
+            raise ConnectionError("observer unavailable")
+        self.events.append("end")
+
+
+class Test_DiscountEventLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_DiscountEventLog_appends_and_replays_across_segments(self):
+        log = o.DiscountEventLog(self.directory.name, segment_bytes=64)
+        for number in range(10):
+            self.assertEqual(log.append("start" if number % 2 else "end", ("tier", "gold")),
+                             number)
+        self.assertGreater(len([name for name in os.listdir(self.directory.name)
+                                if name.endswith(".log")]), 1)
+        self.assertEqual([offset for offset, _, _ in log.replay(7)], [7, 8, 9])
+        self.assertEqual(next(log.replay(3)), (3, "start", ("tier", "gold")))
+        log.close()
+        reopened = o.DiscountEventLog(self.directory.name, segment_bytes=64)
+        self.assertEqual(reopened.end_offset, 10)
+        self.assertEqual(reopened.append("end"), 10)
+        self.assertEqual(list(reopened.replay(10)), [(10, "end", None)])
+        reopened.close()
+
+    def test_DiscountEventLog_truncates_torn_records(self):
+        log = o.DiscountEventLog(self.directory.name, fsync=False)
+        log.append("start")
+        log.append("end")
+        log.close()
+        segment = os.path.join(self.directory.name, sorted(os.listdir(self.directory.name))[0])
+        with open(segment, "ab") as segment_file:
+            segment_file.write(b"\x20\x00\x00\x00torn")
+        reopened = o.DiscountEventLog(self.directory.name, fsync=False)
+        self.assertEqual(reopened.end_offset, 2)
+        self.assertEqual(reopened.append("start"), 2)
+        self.assertEqual([event for _, event, _ in reopened.replay()], ["start", "end", "start"])
+        reopened.close()
+
+    def test_DiscountEventLog_group_commits_concurrent_appends(self):
+        log = o.DiscountEventLog(self.directory.name)
+        threads = [threading.Thread(target=lambda: [log.append("start") for _ in range(50)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(offset for offset, _, _ in log.replay()), list(range(200)))
+        log.close()
+
+    def test_DiscountEventLog_persists_cursors(self):
+        log = o.DiscountEventLog(self.directory.name, fsync=False)
+        log.set_cursor("Sally", 3)
+        log.close()
+        self.assertEqual(o.DiscountEventLog(self.directory.name).cursor("Sally"), 3)
+
+
+class Test_PricingOptimizerEventLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log = o.DiscountEventLog(self.directory.name, fsync=False)
+
+    def tearDown(self):
+        self.log.close()
+        self.directory.cleanup()
+
+    def test_PricingOptimizer_logs_events_before_fan_out(self):
+        pricing_optimizer = o.PricingOptimizer(self.log)
+        sally = RecordingObserver("Sally")
+        pricing_optimizer.request_notification(sally)
+        pricing_optimizer.notify_discount_start()
+        pricing_optimizer.notify_discount_end(("region", "TX"))
+        self.assertEqual(list(self.log.replay()), [(0, "start", None),
+                                                   (1, "end", ("region", "TX"))])
+        self.assertEqual(sally.events, ["start"])
+        self.assertEqual(self.log.cursor("Sally"), 1)
+
+    def test_PricingOptimizer_replays_events_missed_before_restart(self):
+        pricing_optimizer = o.PricingOptimizer(self.log)
+        sally = RecordingObserver("Sally", region="TX")
+        pat = RecordingObserver("Pat", region="MA")
+        pricing_optimizer.request_notification(sally)
+        pricing_optimizer.request_notification(pat)
+        pricing_optimizer.notify_discount_start()
+        self.log.set_cursor("Pat", 0)
+        self.log.append("end")
+        self.log.append("start", ("region", "TX"))
+        self.log.save_cursors()
+
+        restarted = o.PricingOptimizer(self.log)
+        sally_again = RecordingObserver("Sally", region="TX")
+        pat_again = RecordingObserver("Pat", region="MA")
+        restarted.request_notification(sally_again)
+        restarted.request_notification(pat_again)
+        self.assertEqual(restarted.replay_missed(), 4)
+        self.assertEqual(pat_again.events, ["start", "end"])
+        self.assertEqual(sally_again.events, ["end", "start"])
+        self.assertEqual(self.log.cursor("Pat"), 3)
+        self.assertEqual(restarted.replay_missed(), 0)
+
+    def test_PricingOptimizer_keeps_cursors_per_observer_id(self):
+        pricing_optimizer = o.PricingOptimizer(self.log)
+        healthy = RecordingObserver("Austin", observer_id="austin-store")
+        failing = RecordingObserver("Austin", fail=True, observer_id="austin-warehouse")
+        pricing_optimizer.request_notification(healthy)
+        pricing_optimizer.request_notification(failing)
+        self.assertRaises(ConnectionError, pricing_optimizer.notify_discount_start)
+        self.assertEqual(self.log.cursor("austin-store"), 1)
+        self.assertEqual(self.log.cursor("austin-warehouse"), 0)
+        self.assertIsNone(self.log.cursor("Austin"))
+
+    def test_PricingOptimizer_rejects_duplicate_observer_ids_with_an_event_log(self):
+        pricing_optimizer = o.PricingOptimizer(self.log)
+        first = RecordingObserver("Austin")
+        pricing_optimizer.request_notification(first)
+        self.assertRaises(ValueError, pricing_optimizer.request_notification,
+                          RecordingObserver("Austin"))
+        pricing_optimizer.request_notification(first)
+        pricing_optimizer.cancel_request(first)
+        pricing_optimizer.request_notification(RecordingObserver("Austin"))
+        o.PricingOptimizer().request_notification(RecordingObserver("Austin"))
+
+    def test_PricingOptimizer_catches_up_failed_observers_on_next_event(self):
+        pricing_optimizer = o.PricingOptimizer(self.log)
+        flaky = RecordingObserver("Flaky", fail=True)
+        pricing_optimizer.request_notification(flaky)
+        self.assertRaises(ConnectionError, pricing_optimizer.notify_discount_start)
+        self.assertEqual(self.log.cursor("Flaky"), 0)
+        flaky.fail = False
+        pricing_optimizer.notify_discount_end()
+        self.assertEqual(flaky.events, ["start", "end"])
+        self.assertEqual(self.log.cursor("Flaky"), 2)
+
+    def test_PricingOptimizer_finishes_fan_out_when_an_observer_raises(self):
+        pricing_optimizer = o.PricingOptimizer(self.log)
+        flaky = RecordingObserver("Flaky", fail=True)
+        sally = RecordingObserver("Sally")
+        pricing_optimizer.request_notification(flaky)
+        pricing_optimizer.request_notification(sally)
+        self.assertRaises(ConnectionError, pricing_optimizer.notify_discount_start)
+        self.assertEqual(sally.events, ["start"])
+        self.assertEqual((self.log.cursor("Flaky"), self.log.cursor("Sally")), (0, 1))
+        flaky.fail = False
+        self.assertEqual(pricing_optimizer.replay_missed(), 1)
+        self.assertEqual(flaky.events, ["start"])
+
+    def test_PricingOptimizer_logs_async_notifications(self):
+        pricing_optimizer = o.PricingOptimizer(self.log)
+        flaky = RecordingObserver("Flaky", fail=True)
+        sally = RecordingObserver("Sally")
+        pricing_optimizer.request_notification(flaky)
+        pricing_optimizer.request_notification(sally)
+        report = asyncio.run(pricing_optimizer.notify_discount_start_async())
+        self.assertEqual((report.delivered, report.failed), (1, 1))
+        self.assertEqual(list(self.log.replay()), [(0, "start", None)])
+        self.assertEqual((self.log.cursor("Flaky"), self.log.cursor("Sally")), (0, 1))
+        flaky.fail = False
+        self.assertEqual(pricing_optimizer.replay_missed(), 1)
+        self.assertEqual(flaky.events, ["start"])
+        self.assertEqual(self.log.cursor("Flaky"), 1)
+
+
+class Test_CoalescingNotifier(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.pricing_optimizer = o.PricingOptimizer()
+        self.sally = RecordingObserver("Sally", region="TX")
+        self.pat = RecordingObserver("Pat", region="MA")
+        self.pricing_optimizer.request_notification(self.sally)
+        self.pricing_optimizer.request_notification(self.pat)
+
+    def notifier(self, **options):
+        return o.CoalescingNotifier(self.pricing_optimizer, window=1.0,
+                                    clock=lambda: self.now, **options)
+
+    def test_CoalescingNotifier_delivers_only_the_net_change(self):
+        notifier = self.notifier()
+        for _ in range(5):
+            notifier.notify_discount_start()
+            notifier.notify_discount_end()
+        notifier.notify_discount_start()
+        self.assertEqual(notifier.poll(), 0)
+        self.now = 1.0
+        self.assertEqual(notifier.poll(), 2)
+        self.assertEqual(self.sally.events, ["start"])
+        stats = notifier.stats()
+        self.assertEqual((stats["requested"], stats["naive_deliveries"]), (11, 22))
+        self.assertEqual((stats["deliveries"], stats["saved"]), (2, 20))
+
+    def test_CoalescingNotifier_skips_flaps_back_to_the_delivered_state(self):
+        notifier = self.notifier()
+        notifier.notify_discount_start()
+        notifier.flush()
+        notifier.notify_discount_end()
+        notifier.notify_discount_start()
+        self.assertEqual(notifier.flush(), 0)
+        self.assertEqual(self.pat.events, ["start"])
+
+    def test_CoalescingNotifier_coalesces_per_topic(self):
+        notifier = self.notifier()
+        notifier.notify_discount_start(("region", "TX"))
+        self.now = 0.5
+        notifier.notify_discount_start()
+        self.now = 1.0
+        notifier.poll()
+        self.assertEqual((self.sally.events, self.pat.events), (["start"], []))
+        self.now = 1.5
+        notifier.poll()
+        self.assertEqual((self.sally.events, self.pat.events), (["start"], ["start"]))
+
+    def test_CoalescingNotifier_rate_limits_each_observer(self):
+        notifier = self.notifier(rate=1, burst=1)
+        notifier.notify_discount_start(("region", "TX"))
+        notifier.flush()
+        notifier.notify_discount_end(("region", "TX"))
+        notifier.flush()
+        notifier.notify_discount_start(("region", "MA"))
+        notifier.flush()
+        self.assertEqual((self.sally.events, self.pat.events), (["start"], ["start"]))
+        self.assertEqual(notifier.stats()["deferred"], 1)
+        self.now = 1.0
+        notifier.poll()
+        self.assertEqual(self.sally.events, ["start", "end"])
+
+    def test_CoalescingNotifier_drops_deferred_deliveries_that_became_moot(self):
+        notifier = self.notifier(rate=1, burst=1)
+        notifier.notify_discount_start()
+        notifier.flush()
+        notifier.notify_discount_end()
+        notifier.flush()
+        notifier.notify_discount_start()
+        notifier.flush()
+        self.now = 5.0
+        self.assertEqual(notifier.poll(), 0)
+        self.assertEqual(self.sally.events, ["start"])
+
+    def test_CoalescingNotifier_prefers_newer_states_over_deferred_ones(self):
+        notifier = self.notifier(rate=1, burst=1)
+        notifier.notify_discount_start()
+        notifier.flush()
+        notifier.notify_discount_end()
+        notifier.flush()
+        notifier.notify_discount_start()
+        self.now = 1.0
+        self.assertEqual(notifier.poll(), 0)
+        self.now = 5.0
+        self.assertEqual(notifier.poll(), 0)
+        self.assertEqual((self.sally.events, self.pat.events), (["start"], ["start"]))
+        self.assertEqual(notifier.stats()["pending"], 0)
+
+    def test_CoalescingNotifier_delivers_through_the_event_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = o.DiscountEventLog(directory, fsync=False)
+            pricing_optimizer = o.PricingOptimizer(log)
+            sally = RecordingObserver("Sally", region="TX")
+            flaky = RecordingObserver("Flaky", region="TX", fail=True)
+            pricing_optimizer.request_notification(sally)
+            pricing_optimizer.request_notification(flaky)
+            notifier = o.CoalescingNotifier(pricing_optimizer, window=1.0,
+                                            clock=lambda: self.now)
+            notifier.notify_discount_start(("region", "TX"))
+            notifier.notify_discount_end(("region", "TX"))
+            self.assertRaises(ConnectionError, notifier.flush)
+            self.assertEqual(sally.events, ["end"])
+            self.assertEqual(list(log.replay()), [(0, "end", ("region", "TX"))])
+            self.assertEqual((log.cursor("Sally"), log.cursor("Flaky")), (1, 0))
+            flaky.fail = False
+            self.assertEqual(pricing_optimizer.replay_missed(), 1)
+            self.assertEqual(flaky.events, ["end"])
+            log.close()
+
+    def test_CoalescingNotifier_background_thread(self):
+        notifier = o.CoalescingNotifier(self.pricing_optimizer, window=0.01)
+        notifier.start()
+        notifier.notify_discount_start()
+        deadline = 100
+        while not self.sally.events and deadline:
+            threading.Event().wait(0.01)
+            deadline -= 1
+        notifier.stop()
+        self.assertEqual(self.sally.events, ["start"])
+
+
+class FileRecordingObserver(o.DiscountObserverInterface):
+    def __init__(self, name, path):
+        super().__init__(name)
+        self.path = path
+
+    def record(self, event):
+        with open(self.path, "a", encoding="utf-8") as events_file:
+            events_file.write(event + "\n")
+
+    def discounts_have_started(self):
+        self.record("start")
+
+    def discounts_have_ended(self):
+        self.record("end")
+
+
+class FailingFileRecordingObserver(FileRecordingObserver):
+    def discounts_have_ended(self):
+        raise ValueError("cannot handle the end of discounts")
+
+
+class CrashingFileRecordingObserver(FileRecordingObserver):
+    def discounts_have_ended(self):
+        os._exit(1)
+
+
+class Test_RemoteObserver(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.events_path = os.path.join(self.directory.name, "events.txt")
+        self.worker = o.ObserverWorker(os.path.join(self.directory.name, "observer.sock"),
+                                       partial(FileRecordingObserver, "Austin", self.events_path))
+        self.worker.start()
+        self.remote = o.RemoteObserver("Austin Facility", self.worker.socket_path,
+                                       worker=self.worker, timeout=2, reconnect_delay=0.01)
+
+    def tearDown(self):
+        self.remote.close(timeout=1)
+        self.worker.stop()
+        self.directory.cleanup()
+
+    def delivered(self):
+        with open(self.events_path, encoding="utf-8") as events_file:
+            return events_file.read().split()
+
+    def test_RemoteObserver_delivers_through_pricing_optimizer(self):
+        pricing_optimizer = o.PricingOptimizer()
+        pricing_optimizer.request_notification(self.remote)
+        pricing_optimizer.notify_discount_start()
+        pricing_optimizer.notify_discount_end()
+        self.assertTrue(self.remote.flush(timeout=5))
+        self.assertEqual(self.delivered(), ["start", "end"])
+
+    def test_RemoteObserver_batches_events(self):
+        for _ in range(500):
+            self.remote.discounts_have_started()
+        self.assertTrue(self.remote.flush(timeout=5))
+        stats = self.remote.stats()
+        self.assertEqual(stats["events"], 500)
+        self.assertLess(stats["batches"], 500)
+        self.assertEqual(len(self.delivered()), 500)
+
+    def test_RemoteObserver_restarts_crashed_workers(self):
+        self.remote.discounts_have_started()
+        self.assertTrue(self.remote.flush(timeout=5))
+        self.worker.process.kill()
+        self.worker.process.join()
+        self.remote.discounts_have_ended()
+        self.assertTrue(self.remote.flush(timeout=10))
+        self.assertEqual(self.delivered(), ["start", "end"])
+        self.assertEqual(self.worker.restarts, 1)
+        self.assertGreaterEqual(self.remote.stats()["reconnects"], 1)
+
+    def test_RemoteObserver_sessions_do_not_share_duplicate_detection(self):
+        self.remote.discounts_have_started()
+        self.assertTrue(self.remote.flush(timeout=5))
+        self.remote.close()
+        self.remote = o.RemoteObserver("Austin Facility", self.worker.socket_path,
+                                       worker=self.worker, timeout=2, reconnect_delay=0.01)
+        self.remote.discounts_have_ended()
+        self.assertTrue(self.remote.flush(timeout=5))
+        self.assertEqual(self.delivered(), ["start", "end"])
+
+    def test_RemoteObserver_worker_serves_concurrent_senders(self):
+        other = o.RemoteObserver("Austin Warehouse", self.worker.socket_path,
+                                 worker=self.worker, timeout=2, reconnect_delay=0.01)
+        try:
+            self.remote.discounts_have_started()
+            self.assertTrue(self.remote.flush(timeout=5))
+            other.discounts_have_started()
+            self.assertTrue(other.flush(timeout=5))
+            self.remote.discounts_have_ended()
+            self.assertTrue(self.remote.flush(timeout=5))
+        finally:
+            other.close(timeout=1)
+        self.assertEqual(self.delivered(), ["start", "start", "end"])
+
+    def test_RemoteObserver_reports_handler_errors_without_restarting(self):
+        self.worker.stop()
+        self.worker = o.ObserverWorker(self.worker.socket_path, partial(
+            FailingFileRecordingObserver, "Austin", self.events_path))
+        self.worker.start()
+        self.remote.close()
+        self.remote = o.RemoteObserver("Austin Facility", self.worker.socket_path,
+                                       worker=self.worker, timeout=2, reconnect_delay=0.01)
+        self.remote.discounts_have_ended()
+        self.remote.discounts_have_started()
+        self.assertTrue(self.remote.flush(timeout=5))
+        self.assertEqual(self.delivered(), ["start"])
+        self.assertEqual(self.remote.stats()["failed"], 1)
+        self.assertEqual(self.worker.restarts, 0)
+
+    def test_RemoteObserver_gives_up_after_the_worker_restart_limit(self):
+        self.worker.stop()
+        self.worker = o.ObserverWorker(self.worker.socket_path, partial(
+            CrashingFileRecordingObserver, "Austin", self.events_path), max_restarts=2)
+        self.worker.start()
+        self.remote.close()
+        self.remote = o.RemoteObserver("Austin Facility", self.worker.socket_path,
+                                       worker=self.worker, timeout=2, reconnect_delay=0.01)
+        self.remote.discounts_have_ended()
+        self.assertFalse(self.remote.flush(timeout=10))
+        self.assertIsInstance(self.remote.error, o.WorkerRestartLimitError)
+        self.assertEqual(self.worker.restarts, 2)
+        self.remote.discounts_have_started()
+        self.assertEqual(self.remote.stats()["dropped"], 2)
+
+    def test_RemoteObserver_close_gives_up_on_unreachable_workers(self):
+        self.worker.stop()
+        unreachable = o.RemoteObserver("Nowhere", self.worker.socket_path, reconnect_delay=0.01)
+        unreachable.discounts_have_started()
+        started = time.perf_counter()
+        unreachable.close(timeout=0.1)
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertFalse(unreachable.flush(timeout=0))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,331 @@
+import io
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import Behavioral.TemplateMethod.template_method as t
+
+
+class RecordingAnalysis(t.WebTrafficDataAnalysis):
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.calls = []
+        self.overlapped = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+
+    def record(self, name):
+        with self.lock:
+            self.running += 1
+            if self.running > 1:
+                self.overlapped.set()
+        time.sleep(self.delays.get(name, 0))
+        with self.lock:
+            self.running -= 1
+            self.calls.append(name)
+
+    def load_input_data(self):
+        self.record("load_input_data")
+
+    def load_AI_data(self):
+        self.record("load_AI_data")
+
+    def transform_data(self):
+        self.record("transform_data")
+
+
+class Test_DataAnalysisTemplate(unittest.TestCase):
+    def test_generate_report_runs_hooks_in_order_by_default(self):
+        analysis = RecordingAnalysis()
+        timings = analysis.generate_report()
+        self.assertEqual(analysis.calls, ["load_input_data", "load_AI_data", "transform_data"])
+        self.assertFalse(analysis.overlapped.is_set())
+        self.assertEqual(list(timings.steps), analysis.calls)
+
+    def test_generate_report_overlaps_independent_hooks(self):
+        analysis = RecordingAnalysis({"load_input_data": 0.05, "load_AI_data": 0.1})
+        timings = analysis.generate_report(concurrent=True)
+        self.assertTrue(analysis.overlapped.is_set())
+        self.assertEqual(analysis.calls[-1], "transform_data")
+        self.assertGreaterEqual(timings.steps["transform_data"].started,
+                                timings.steps["load_AI_data"].finished)
+        self.assertLess(timings.elapsed, 0.15)
+
+    def test_generate_report_critical_path(self):
+        analysis = RecordingAnalysis({"load_input_data": 0.02, "load_AI_data": 0.06})
+        path, seconds = analysis.generate_report(concurrent=True).critical_path()
+        self.assertEqual(path, ["load_AI_data", "transform_data"])
+        self.assertGreaterEqual(seconds, 0.06)
+
+    def test_generate_report_propagates_hook_failures(self):
+        class BrokenAnalysis(RecordingAnalysis):
+            def load_AI_data(self):
+                raise ConnectionError("model store unavailable")
+
+        analysis = BrokenAnalysis()
+        self.assertRaises(ConnectionError, analysis.generate_report, concurrent=True)
+        self.assertNotIn("transform_data", analysis.calls)
+
+    def test_generate_report_rejects_dependency_cycles(self):
+        class CyclicAnalysis(RecordingAnalysis):
+            step_dependencies = {"load_input_data": ("transform_data",),
+                                 "transform_data": ("load_input_data",)}
+
+        self.assertRaises(ValueError, CyclicAnalysis().generate_report)
+
+
+class CountingLoader:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, name, parameters):
+        self.calls.append((name, dict(parameters)))
+        time.sleep(self.delay)
+        return t.simulate_model_load(name, parameters, size=100)
+
+
+class Test_ModelCache(unittest.TestCase):
+    def setUp(self):
+        self.loader = CountingLoader()
+        self.cache = t.ModelCache(max_entries=2)
+
+    def test_ModelCache_loads_each_model_once(self):
+        first = self.cache.get("generic", {}, self.loader)
+        self.assertIs(self.cache.get("generic", {}, self.loader), first)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["loads"]), (1, 1, 1))
+        self.assertEqual(stats["bytes"], 800)
+
+    def test_ModelCache_keys_by_parameters(self):
+        generic = self.cache.get("generic", {}, self.loader)
+        sales = self.cache.get("generic", {"domain": "sales", "days": 90}, self.loader)
+        self.assertIsNot(generic, sales)
+        self.assertIs(self.cache.get("generic", {"days": 90, "domain": "sales"}, self.loader),
+                      sales)
+        self.assertEqual(len(self.loader.calls), 2)
+
+    def test_ModelCache_evicts_least_recently_used(self):
+        self.cache.get("a", {}, self.loader)
+        self.cache.get("b", {}, self.loader)
+        self.cache.get("a", {}, self.loader)
+        self.cache.get("c", {}, self.loader)
+        self.cache.get("a", {}, self.loader)
+        self.assertEqual(len(self.loader.calls), 3)
+        self.cache.get("b", {}, self.loader)
+        self.assertEqual(len(self.loader.calls), 4)
+        self.assertEqual(self.cache.stats()["evictions"], 2)
+
+    def test_ModelCache_bounds_bytes(self):
+        cache = t.ModelCache(max_bytes=1000)
+        cache.get("a", {}, self.loader)
+        cache.get("b", {}, self.loader)
+        self.assertEqual((len(cache), cache.stats()["bytes"]), (1, 800))
+
+    def test_ModelCache_single_flight_loading(self):
+        loader = CountingLoader(delay=0.05)
+        threads = [threading.Thread(target=self.cache.get, args=("generic", {}, loader))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(loader.calls), 1)
+
+    def test_ModelCache_shares_memory_mapped_weights(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = t.ModelCache(mmap_directory=directory).get("generic", {}, self.loader)
+            other_process = t.ModelCache(mmap_directory=directory)
+            second = other_process.get("generic", {}, self.loader)
+            self.assertEqual(len(self.loader.calls), 1)
+            self.assertEqual(other_process.stats()["mapped"], 1)
+            self.assertEqual(list(second.weights), list(first.weights))
+            self.assertTrue(second.weights.readonly)
+            del first, second
+
+    def test_analyses_share_the_process_wide_cache(self):
+        with mock.patch.object(t, "MODEL_CACHE", t.ModelCache()) as cache:
+            for analysis in (t.WebTrafficDataAnalysis, t.FootTrafficDataAnalysis,
+                             t.PreSalesDataAnalysis, t.WebTrafficDataAnalysis):
+                analysis().generate_report()
+            stats = cache.stats()
+        self.assertEqual((stats["loads"], stats["hits"]), (2, 2))
+
+
+class FailingAnalysis(t.WebTrafficDataAnalysis):
+    def transform_data(self):
+        raise ValueError(f"bad input {self.input_data}")
+
+
+class EchoAnalysis(t.WebTrafficDataAnalysis):
+    def load_input_data(self):
+        print(f"input {self.input_data}")
+        time.sleep(0.001)
+
+    def transform_data(self):
+        time.sleep(0.001)
+        print(f"input {self.input_data}")
+
+
+class Test_BatchReportRunner(unittest.TestCase):
+    def test_BatchReportRunner_streams_results_on_a_process_pool(self):
+        runner = t.BatchReportRunner(max_workers=2, batch_size=3)
+        jobs = [runner.submit(t.ScoredWebTrafficDataAnalysis, visits) for visits in range(7)]
+        jobs.append(runner.submit(t.FootTrafficDataAnalysis))
+        results = list(runner.run())
+        self.assertEqual(sorted(result.job.job_id for result in results),
+                         [job.job_id for job in jobs])
+        self.assertTrue(all(result.succeeded for result in results))
+        foot_traffic = [result for result in results if result.job is jobs[-1]][0]
+        self.assertIn("Foot traffic data loaded.", foot_traffic.output)
+        self.assertEqual(foot_traffic.timings.critical_path()[0][-1], "transform_data")
+        self.assertEqual(runner.pending(), 0)
+
+    def test_BatchReportRunner_dispatches_by_priority_in_class_batches(self):
+        runner = t.BatchReportRunner(executor="thread", max_workers=1, batch_size=2)
+        runner.submit(t.WebTrafficDataAnalysis)
+        runner.submit(t.FootTrafficDataAnalysis)
+        runner.submit(t.WebTrafficDataAnalysis)
+        urgent = runner.submit(t.PreSalesDataAnalysis, priority=5)
+        batches = []
+        original = runner._next_batch
+
+        def recording_next_batch():
+            batch = original()
+            if batch:
+                batches.append([job.analysis_class for job in batch])
+            return batch
+
+        with mock.patch.object(runner, "_next_batch", side_effect=recording_next_batch):
+            results = list(runner.run())
+        self.assertEqual(batches, [[t.PreSalesDataAnalysis],
+                                   [t.WebTrafficDataAnalysis, t.WebTrafficDataAnalysis],
+                                   [t.FootTrafficDataAnalysis]])
+        self.assertIs(results[0].job, urgent)
+        self.assertIn("Pre sales data loaded.", results[0].output)
+
+    def test_BatchReportRunner_cancels_queued_jobs(self):
+        runner = t.BatchReportRunner(executor="thread", max_workers=1, batch_size=1)
+        first = runner.submit(t.WebTrafficDataAnalysis)
+        second = runner.submit(t.WebTrafficDataAnalysis)
+        third = runner.submit(t.WebTrafficDataAnalysis)
+        self.assertTrue(runner.cancel(second))
+        self.assertFalse(runner.cancel(second))
+        results = {result.job.job_id: result for result in runner.run()}
+        self.assertTrue(results[second.job_id].cancelled)
+        self.assertTrue(results[first.job_id].succeeded)
+        self.assertTrue(results[third.job_id].succeeded)
+        self.assertFalse(runner.cancel(third))
+
+    def test_BatchReportRunner_accepts_jobs_while_running(self):
+        runner = t.BatchReportRunner(executor="thread", max_workers=1)
+        runner.submit(t.WebTrafficDataAnalysis)
+        seen = []
+        for result in runner.run():
+            seen.append(result)
+            if len(seen) == 1:
+                runner.submit(t.FootTrafficDataAnalysis)
+        self.assertEqual([result.job.analysis_class for result in seen],
+                         [t.WebTrafficDataAnalysis, t.FootTrafficDataAnalysis])
+
+    def test_BatchReportRunner_captures_output_per_thread(self):
+        runner = t.BatchReportRunner(executor="thread", max_workers=8, batch_size=1)
+        jobs = {runner.submit(EchoAnalysis, number).job_id: number for number in range(40)}
+        stdout = sys.stdout
+        results = list(runner.run())
+        self.assertEqual(len(results), 40)
+        for result in results:
+            self.assertEqual(re.findall(r"input (\d+)", result.output),
+                             [str(jobs[result.job.job_id])] * 2)
+        self.assertNotIsInstance(getattr(sys.stdout, "target", sys.stdout), io.StringIO)
+        self.assertIs(getattr(sys.stdout, "fallback", sys.stdout), stdout)
+
+    def test_BatchReportRunner_isolates_failures(self):
+        runner = t.BatchReportRunner(executor="thread", max_workers=1)
+        runner.submit(FailingAnalysis, 1)
+        runner.submit(t.WebTrafficDataAnalysis)
+        results = list(runner.run())
+        self.assertIsInstance(results[0].error, ValueError)
+        self.assertIn("Web logs parsed", results[0].output)
+        self.assertTrue(results[1].succeeded)
+
+
+def log_line(host="10.0.0.1", path="/", status=200, sent=512):
+    return (f'{host} - - [18/Oct/2026:10:00:00 +0000] "GET {path} HTTP/1.1" {status} {sent} '
+            f'"-" "Mozilla/5.0"\n')
+
+
+class Test_StreamingWebTrafficDataAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "access.log")
+        self.analysis = t.StreamingWebTrafficDataAnalysis([self.path])
+
+    def tearDown(self):
+        self.analysis.close()
+        self.directory.cleanup()
+
+    def append(self, text, path=None):
+        with open(path or self.path, "a", encoding="utf-8") as log_file:
+            log_file.write(text)
+
+    def test_parses_only_new_lines_on_refresh(self):
+        self.append(log_line() + log_line(host="10.0.0.2", path="/cart", status=503))
+        self.analysis.generate_report()
+        self.assertEqual(self.analysis.new_lines, 2)
+        self.append(log_line(path="/cart", sent="-"))
+        self.analysis.generate_report()
+        self.assertEqual(self.analysis.new_lines, 1)
+        summary = self.analysis.aggregates.summary()
+        self.assertEqual(summary["requests"], 3)
+        self.assertEqual(summary["bytes_sent"], 1024)
+        self.assertEqual(summary["unique_hosts"], 2)
+        self.assertEqual(summary["top_paths"][0], ("/cart", 2))
+        self.assertAlmostEqual(summary["error_rate"], 1 / 3)
+
+    def test_waits_for_partial_lines_to_complete(self):
+        line = log_line()
+        self.append(line[:20])
+        self.analysis.generate_report()
+        self.assertEqual(self.analysis.new_lines, 0)
+        self.append(line[20:])
+        self.analysis.generate_report()
+        self.assertEqual(self.analysis.aggregates.requests, 1)
+
+    def test_follows_rotated_logs(self):
+        self.append(log_line())
+        self.analysis.generate_report()
+        self.append(log_line(path="/before-rotation"))
+        os.rename(self.path, self.path + ".1")
+        self.append(log_line(path="/after-rotation"))
+        self.analysis.generate_report()
+        self.assertEqual(self.analysis.new_lines, 2)
+        self.append(log_line(path="/after-rotation"))
+        self.analysis.generate_report()
+        self.assertEqual(self.analysis.aggregates.paths["/before-rotation"], 1)
+        self.assertEqual(self.analysis.aggregates.paths["/after-rotation"], 2)
+
+    def test_rereads_truncated_logs(self):
+        self.append(log_line() * 3)
+        self.analysis.generate_report()
+        with open(self.path, "w", encoding="utf-8") as log_file:
+            log_file.write(log_line(path="/fresh"))
+        self.analysis.generate_report()
+        self.assertEqual(self.analysis.aggregates.requests, 4)
+        self.assertEqual(self.analysis.aggregates.paths["/fresh"], 1)
+
+    def test_counts_malformed_lines_and_missing_files(self):
+        analysis = t.StreamingWebTrafficDataAnalysis([os.path.join(self.directory.name, "none")])
+        analysis.generate_report()
+        self.assertEqual(analysis.new_lines, 0)
+        self.append("not a log line\n")
+        self.analysis.generate_report()
+        self.assertEqual(self.analysis.aggregates.malformed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
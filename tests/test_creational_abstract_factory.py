@@ -0,0 +1,127 @@
+import unittest
+import Creational.AbstractFactory.abstract_factory_pattern as a
+
+
+class Test_EquipmentCatalog(unittest.TestCase):
+    def setUp(self):
+        self.catalog = a.EquipmentCatalog()
+
+    def test_EquipmentCatalog_matches_the_equipment_factories(self):
+        for equipment_type, factory_class in a.EQUIPMENT_FACTORIES.items():
+            factory = factory_class()
+            expected = (factory.define_computer().name, factory.define_monitor().name,
+                        factory.define_webcam().name)
+            kit = self.catalog.kit(equipment_type)
+            self.assertEqual(tuple(device.name for device in kit), expected)
+            self.assertEqual(tuple(device.kind for device in kit), a.KIT_SLOTS)
+
+    def test_DeviceType_is_interned(self):
+        device = a.DeviceType.intern("computer", "Mac Mini")
+        self.assertIs(a.DeviceType.intern("computer", "Mac Mini"), device)
+        self.assertIs(a.DeviceType.from_id(device.device_id), device)
+        self.assertIs(a.EquipmentCatalog().kit(a.EmployeeEquipmentType.ONSITE)[0], device)
+        self.assertRaises(AttributeError, setattr, device, "serial_number", 1)
+
+    def test_EquipmentCatalog_provisions_compact_kits(self):
+        employees = [a.EmployeeEquipmentType.REMOTE, a.EmployeeEquipmentType.CONTRACTOR,
+                     a.EmployeeEquipmentType.REMOTE]
+        kits = self.catalog.provision(iter(employees))
+        self.assertEqual(len(kits), 3)
+        self.assertEqual(list(kits.equipment_types), [1, 4, 1])
+        self.assertEqual(kits.kit(1), self.catalog.kit(a.EmployeeEquipmentType.CONTRACTOR))
+        self.assertEqual(len(kits.device_ids), 9)
+        self.assertEqual(kits.nbytes, 3 + 9 * kits.device_ids.itemsize)
+        monitors = kits.slot("monitor")
+        self.assertEqual([a.DeviceType.from_id(device_id).name for device_id in monitors],
+                         ["4k Monitor"] * 3)
+
+    def test_EquipmentCatalog_accepts_custom_catalogs(self):
+        catalog = a.EquipmentCatalog({a.EmployeeEquipmentType.REMOTE:
+                                      ("Macbook Pro", "4k Monitor", "4k Webcam")})
+        kits = catalog.provision([a.EmployeeEquipmentType.REMOTE])
+        self.assertEqual([device.name for device in kits.kit(0)],
+                         ["Macbook Pro", "4k Monitor", "4k Webcam"])
+        self.assertRaises(KeyError, catalog.provision, [a.EmployeeEquipmentType.ONSITE])
+
+
+class FlakyMonitor(a.Monitor4k):
+    def __init__(self, failures, log):
+        self.failures = failures
+        self.log = log
+
+    def turn_on(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("monitor did not answer")
+        self.log.append(("on", "monitor", id(self)))
+
+    def turn_off(self):
+        self.log.append(("off", "monitor", id(self)))
+
+
+class LoggedComputer(a.MacMini):
+    def __init__(self, log):
+        self.log = log
+
+    def turn_on(self):
+        self.log.append(("on", "computer", id(self)))
+
+    def turn_off(self):
+        self.log.append(("off", "computer", id(self)))
+
+
+class Test_PowerOrchestrator(unittest.TestCase):
+    def setUp(self):
+        self.log = []
+
+    def kit(self, failures=0):
+        return (LoggedComputer(self.log), FlakyMonitor(failures, self.log))
+
+    def test_power_on_turns_monitor_on_before_computer(self):
+        kits = [self.kit() for _ in range(20)]
+        report = a.PowerOrchestrator(max_workers=8, retry_delay=0).power_on(kits)
+        self.assertEqual(report.failures, [])
+        for computer, monitor in kits:
+            self.assertLess(self.log.index(("on", "monitor", id(monitor))),
+                            self.log.index(("on", "computer", id(computer))))
+        self.assertEqual(report.latency("computer")["count"], 20)
+        self.assertLessEqual(report.latency("monitor")["p50"], report.latency("monitor")["p99"])
+
+    def test_power_off_turns_computer_off_first(self):
+        computer, monitor = self.kit()
+        a.PowerOrchestrator().power_off([(monitor, computer)])
+        self.assertEqual([entry[1] for entry in self.log], ["computer", "monitor"])
+
+    def test_power_on_retries_then_gives_up_on_the_kit(self):
+        orchestrator = a.PowerOrchestrator(retries=1, retry_delay=0)
+        report = orchestrator.power_on([self.kit(failures=1), self.kit(failures=2)])
+        self.assertEqual(len(report.failures), 1)
+        index, kind, error = report.failures[0]
+        self.assertEqual((index, kind), (1, "monitor"))
+        self.assertIsInstance(error, ConnectionError)
+        self.assertEqual([entry[1] for entry in self.log], ["monitor", "computer"])
+
+    def test_power_on_accepts_provisioned_device_types(self):
+        kits = a.EquipmentCatalog().provision([a.EmployeeEquipmentType.ONSITE])
+        report = a.PowerOrchestrator().power_on([kits.kit(0)])
+        self.assertEqual(report.latency("webcam")["count"], 1)
+
+    def test_RateLimiter_spaces_out_operations(self):
+        now = [0.0]
+        sleeps = []
+        limiter = a.RateLimiter(rate=10, burst=2, clock=lambda: now[0], sleep=sleeps.append)
+        for _ in range(4):
+            limiter.acquire()
+        self.assertEqual(len(sleeps), 2)
+        self.assertAlmostEqual(sleeps[0], 0.1)
+        self.assertAlmostEqual(sleeps[1], 0.2)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(a.percentile(values, 0.5), 50)
+        self.assertEqual(a.percentile(values, 0.99), 99)
+        self.assertEqual(a.percentile([], 0.5), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
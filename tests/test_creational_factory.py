@@ -0,0 +1,129 @@
+import threading
+import unittest
+import Creational.Factory.factory_pattern as f
+
+
+class DroneDelivery(f.DeliveryInterface):
+    def get_package(self) -> None:
+        print("The drone now has the package!")
+
+    def dropoff_package(self) -> None:
+        print("The drone has delivered the package!")
+
+
+class Test_DeliveryFactory(unittest.TestCase):
+    def tearDown(self):
+        f.DeliveryFactory.unregister("drone")
+        f.DeliveryFactory.register(f.DeliveryType.LOCAL, f.InHouseDelivery)
+
+    def test_DeliveryFactory_creates_providers_per_type(self):
+        for delivery_type, provider_class in ((f.DeliveryType.DOMESTIC, f.UpsDelivery),
+                                              (f.DeliveryType.INTERNATIONAL, f.FedExDelivery),
+                                              (f.DeliveryType.LOCAL, f.InHouseDelivery)):
+            provider = f.DeliveryFactory.create_delivery_service(delivery_type)
+            self.assertIsInstance(provider, provider_class)
+            self.assertIsInstance(f.create_delivery_service_with_match(delivery_type),
+                                  provider_class)
+
+    def test_DeliveryFactory_reuses_stateless_providers(self):
+        self.assertIs(f.DeliveryFactory.create_delivery_service(f.DeliveryType.DOMESTIC),
+                      f.DeliveryFactory.create_delivery_service(f.DeliveryType.DOMESTIC))
+
+    def test_DeliveryFactory_registers_new_carriers(self):
+        f.DeliveryFactory.register("drone", DroneDelivery)
+        self.assertIsInstance(f.DeliveryFactory.create_delivery_service("drone"), DroneDelivery)
+        self.assertIn("drone", f.DeliveryFactory.registered_types())
+        f.DeliveryFactory.unregister("drone")
+        self.assertRaises(ValueError, f.DeliveryFactory.create_delivery_service, "drone")
+
+    def test_DeliveryFactory_creates_unshared_providers_per_call(self):
+        f.DeliveryFactory.register(f.DeliveryType.LOCAL, f.InHouseDelivery, shared=False)
+        self.assertIsNot(f.DeliveryFactory.create_delivery_service(f.DeliveryType.LOCAL),
+                         f.DeliveryFactory.create_delivery_service(f.DeliveryType.LOCAL))
+
+    def test_DeliveryFactory_rejects_non_providers(self):
+        self.assertRaises(TypeError, f.DeliveryFactory.register, "drone", object)
+
+
+class RecordingDelivery(f.DeliveryInterface):
+    def __init__(self):
+        self.batches = []
+        self.threads = set()
+        self.barrier = None
+
+    def get_package(self) -> None:
+        pass
+
+    def dropoff_package(self) -> None:
+        pass
+
+    def get_packages(self, packages) -> int:
+        self.threads.add(threading.get_ident())
+        if self.barrier is not None:
+            self.barrier.wait()
+        self.batches.append(list(packages))
+        return len(packages)
+
+
+class Test_RoutePackages(unittest.TestCase):
+    def setUp(self):
+        self.providers = {}
+        for delivery_type in f.DeliveryType:
+            f.DeliveryFactory.register(delivery_type, RecordingDelivery)
+            self.providers[delivery_type] = f.DeliveryFactory.create_delivery_service(
+                delivery_type)
+
+    def tearDown(self):
+        f.DeliveryFactory.register(f.DeliveryType.DOMESTIC, f.UpsDelivery)
+        f.DeliveryFactory.register(f.DeliveryType.INTERNATIONAL, f.FedExDelivery)
+        f.DeliveryFactory.register(f.DeliveryType.LOCAL, f.InHouseDelivery)
+
+    def test_route_packages_partitions_by_delivery_type(self):
+        packages = (f.Package(number, list(f.DeliveryType)[number % 3]) for number in range(10))
+        shipped = f.DeliveryFactory.route_packages(packages)
+        self.assertEqual(shipped, {f.DeliveryType.DOMESTIC: 4, f.DeliveryType.INTERNATIONAL: 3,
+                                   f.DeliveryType.LOCAL: 3})
+        local = self.providers[f.DeliveryType.LOCAL]
+        self.assertEqual(len(local.batches), 1)
+        self.assertEqual([package.package_id for package in local.batches[0]], [2, 5, 8])
+
+    def test_route_packages_runs_carriers_concurrently(self):
+        barrier = threading.Barrier(len(f.DeliveryType), timeout=5)
+        for provider in self.providers.values():
+            provider.barrier = barrier
+        packages = [f.Package(number, delivery_type)
+                    for number, delivery_type in enumerate(f.DeliveryType)]
+        f.DeliveryFactory.route_packages(packages)
+        self.assertFalse(barrier.broken)
+        self.assertEqual(len({thread for provider in self.providers.values()
+                              for thread in provider.threads}), len(f.DeliveryType))
+
+    def test_route_packages_accepts_a_classifier(self):
+        shipped = f.DeliveryFactory.route_packages(
+            range(6), key=lambda number: f.DeliveryType.LOCAL if number < 2
+            else f.DeliveryType.DOMESTIC)
+        self.assertEqual(shipped, {f.DeliveryType.LOCAL: 2, f.DeliveryType.DOMESTIC: 4})
+
+    def test_route_packages_default_batches_fall_back_to_single_packages(self):
+        calls = []
+
+        class SinglePackageDelivery(RecordingDelivery):
+            get_packages = f.DeliveryInterface.get_packages
+
+            def get_package(self) -> None:
+                calls.append("get")
+
+            def dropoff_package(self) -> None:
+                calls.append("dropoff")
+
+        f.DeliveryFactory.register(f.DeliveryType.LOCAL, SinglePackageDelivery)
+        f.DeliveryFactory.route_packages([f.Package(1, f.DeliveryType.LOCAL)] * 2)
+        self.assertEqual(calls, ["get", "get", "dropoff", "dropoff"])
+
+    def test_route_packages_raises_for_unknown_types(self):
+        self.assertRaises(ValueError, f.DeliveryFactory.route_packages, ["drone"],
+                          key=lambda package: package)
+
+
+if __name__ == '__main__':
+    unittest.main()
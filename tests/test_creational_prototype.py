@@ -0,0 +1,263 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from array import array
+from unittest import mock
+try:
+    import numpy
+except ImportError:
+    numpy = None
+import Creational.Prototype.prorotype_pattern as p
+
+
+def small_load(data_set):
+    return p.simulate_database_load(data_set, rows=10)
+
+
+class Test_ExpensiveDatabaseDataLoad(unittest.TestCase):
+    def setUp(self):
+        self.original = p.ExpensiveDatabaseDataLoad("SALES_DATA", small_load)
+        self.original.attempt_data_load()
+
+    def test_ExpensiveDatabaseDataLoad_clone_is_new_instance_with_same_fields(self):
+        clone = self.original.clone()
+        self.assertIsNot(clone, self.original)
+        self.assertEqual(clone.database_hostname, "MYHOST")
+        self.assertEqual(clone.database_port, 80)
+        self.assertEqual(clone.data_set, "SALES_DATA")
+
+    def test_ExpensiveDatabaseDataLoad_clone_applies_overrides(self):
+        clone = self.original.clone(database_port=8080)
+        self.assertEqual(clone.database_port, 8080)
+        self.assertEqual(self.original.database_port, 80)
+
+    def test_ExpensiveDatabaseDataLoad_clone_shares_loaded_payload(self):
+        clone = self.original.clone()
+        self.assertIsNot(clone.payload, self.original.payload)
+        self.assertTrue(clone.payload.shares_column_with(self.original.payload, "amount"))
+        self.assertEqual(clone.payload["id"].tolist(), list(range(10)))
+
+    def test_ExpensiveDatabaseDataLoad_clone_copies_only_written_column(self):
+        clone = self.original.clone()
+        clone.payload.set_value("amount", 0, -1.0)
+        self.assertEqual(clone.payload["amount"][0], -1.0)
+        self.assertNotEqual(self.original.payload["amount"][0], -1.0)
+        self.assertFalse(clone.payload.shares_column_with(self.original.payload, "amount"))
+        self.assertTrue(clone.payload.shares_column_with(self.original.payload, "id"))
+
+    def test_ExpensiveDatabaseDataLoad_original_copies_on_write_after_cloning(self):
+        clone = self.original.clone()
+        self.original.payload.set_value("id", 0, 99)
+        self.assertEqual(clone.payload["id"][0], 0)
+        self.assertEqual(self.original.payload["id"][0], 99)
+
+    def test_CopyOnWritePayload_columns_are_read_only(self):
+        with self.assertRaises(TypeError):
+            self.original.payload["id"][0] = 5
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_CopyOnWritePayload_copies_numpy_columns_on_write(self):
+        payload = p.CopyOnWritePayload({"amount": numpy.zeros(3)})
+        clone = payload.share()
+        clone.set_value("amount", 0, 5.0)
+        self.assertEqual(payload["amount"].tolist(), [0.0, 0.0, 0.0])
+        self.assertEqual(clone["amount"].tolist(), [5.0, 0.0, 0.0])
+
+    def test_CopyOnWritePayload_replace_column_is_private(self):
+        clone = self.original.clone()
+        clone.payload.replace_column("flag", array("b", [1] * 10))
+        self.assertEqual(clone.payload.column_names, ["id", "amount", "flag"])
+        self.assertEqual(self.original.payload.column_names, ["id", "amount"])
+        self.assertEqual(clone.payload["flag"].tolist(), [1] * 10)
+
+
+class CountingLoad(p.ExpensiveDatabaseDataLoad):
+    loads = 0
+    delay = 0
+
+    def perform_expensive_data_load(self):
+        type(self).loads += 1
+        time.sleep(self.delay)
+        if self.data_set == "BROKEN":
+            raise ConnectionError("database unavailable")
+        self.payload = p.CopyOnWritePayload(small_load(self.data_set))
+
+
+class Test_PrototypeRegistry(unittest.TestCase):
+    def setUp(self):
+        CountingLoad.loads = 0
+        CountingLoad.delay = 0
+        self.now = 0.0
+        self.registry = p.PrototypeRegistry(max_entries=2, ttl=60, clock=lambda: self.now)
+
+    def test_PrototypeRegistry_loads_once_and_hands_out_clones(self):
+        first = self.registry.get(CountingLoad, "SALES_DATA")
+        second = self.registry.get(CountingLoad, "SALES_DATA")
+        self.assertIsNot(first, second)
+        self.assertEqual(second.data_set, "SALES_DATA")
+        self.assertTrue(first.payload.shares_column_with(second.payload, "id"))
+        self.assertEqual(CountingLoad.loads, 1)
+        stats = self.registry.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["loads"]), (1, 1, 1))
+
+    def test_PrototypeRegistry_evicts_least_recently_used(self):
+        self.registry.get(CountingLoad, "A")
+        self.registry.get(CountingLoad, "B")
+        self.registry.get(CountingLoad, "A")
+        self.registry.get(CountingLoad, "C")
+        self.assertEqual(self.registry.stats()["evictions"], 1)
+        self.registry.get(CountingLoad, "A")
+        self.assertEqual(CountingLoad.loads, 3)
+        self.registry.get(CountingLoad, "B")
+        self.assertEqual(CountingLoad.loads, 4)
+
+    def test_PrototypeRegistry_reloads_expired_entries(self):
+        self.registry.get(CountingLoad, "A")
+        self.now = 59
+        self.registry.get(CountingLoad, "A")
+        self.now = 61
+        self.registry.get(CountingLoad, "A")
+        self.assertEqual(CountingLoad.loads, 2)
+        self.assertEqual(self.registry.stats()["expirations"], 1)
+
+    def test_PrototypeRegistry_single_flight_loading(self):
+        CountingLoad.delay = 0.05
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self.registry.get(CountingLoad, "SALES_DATA")))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(CountingLoad.loads, 1)
+        self.assertEqual(len({id(result) for result in results}), 8)
+
+    def test_PrototypeRegistry_does_not_cache_failed_loads(self):
+        self.assertRaises(ConnectionError, self.registry.get, CountingLoad, "BROKEN")
+        self.assertRaises(ConnectionError, self.registry.get, CountingLoad, "BROKEN")
+        self.assertEqual(CountingLoad.loads, 2)
+        self.assertEqual(len(self.registry), 0)
+
+    def test_PrototypeRegistry_keys_network_loads_by_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "a.txt")
+            with open(source, "wb") as source_file:
+                source_file.write(b"payload")
+            target = os.path.join(directory, "copies")
+            os.mkdir(target)
+            factory = lambda: p.ExpensiveNetworkFileLoad(source, target)
+            clone = self.registry.get(p.ExpensiveNetworkFileLoad, source, factory)
+            self.assertEqual(clone.unc_path, source)
+            self.registry.get(p.ExpensiveNetworkFileLoad, source, factory)
+            self.assertEqual(self.registry.stats()["loads"], 1)
+
+
+class Test_ChunkedFileTransfer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "huge.bin")
+        self.content = os.urandom(10_000)
+        with open(self.source, "wb") as source_file:
+            source_file.write(self.content)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, path):
+        with open(path, "rb") as copied_file:
+            return copied_file.read()
+
+    def test_ExpensiveNetworkFileLoad_copies_into_target_directory(self):
+        target = os.path.join(self.directory.name, "copies")
+        os.mkdir(target)
+        load = p.ExpensiveNetworkFileLoad(self.source, target, chunk_bytes=1024)
+        load.attempt_data_load()
+        self.assertEqual(self.read(os.path.join(target, "huge.bin")), self.content)
+        self.assertEqual(load.transfer_summary["chunks"], 10)
+        self.assertEqual(load.transfer_summary["bytes"], 10_000)
+
+    def test_ChunkedFileTransfer_refuses_to_copy_onto_source(self):
+        load = p.ExpensiveNetworkFileLoad(self.source, self.directory.name)
+        self.assertRaises(ValueError, load.attempt_data_load)
+        self.assertEqual(self.read(self.source), self.content)
+
+    def test_ChunkedFileTransfer_copies_without_leaving_manifest(self):
+        target = os.path.join(self.directory.name, "copy.bin")
+        summary = p.ChunkedFileTransfer(self.source, target, chunk_bytes=3000, workers=3).run()
+        self.assertEqual(self.read(target), self.content)
+        self.assertEqual((summary["chunks"], summary["copied_chunks"]), (4, 4))
+        self.assertFalse(os.path.exists(target + ".manifest"))
+
+    def test_ChunkedFileTransfer_pread_fallback(self):
+        target = os.path.join(self.directory.name, "copy.bin")
+        with mock.patch.object(p, "_kernel_copy", return_value=0):
+            p.ChunkedFileTransfer(self.source, target, chunk_bytes=4096).run()
+        self.assertEqual(self.read(target), self.content)
+
+    def test_ChunkedFileTransfer_resumes_interrupted_copy(self):
+        target = os.path.join(self.directory.name, "copy.bin")
+        copy_range = p.copy_range
+
+        def fail_on_last_chunk(source_fd, target_fd, offset, length):
+            if offset == 9000:
+                raise OSError("connection reset")
+            copy_range(source_fd, target_fd, offset, length)
+
+        with mock.patch.object(p, "copy_range", side_effect=fail_on_last_chunk):
+            self.assertRaises(OSError, p.ChunkedFileTransfer(
+                self.source, target, chunk_bytes=1000, workers=1).run)
+        self.assertTrue(os.path.exists(target + ".manifest"))
+
+        summary = p.ChunkedFileTransfer(self.source, target, chunk_bytes=1000).run()
+        self.assertEqual((summary["copied_chunks"], summary["resumed_chunks"]), (1, 9))
+        self.assertEqual(self.read(target), self.content)
+
+    def test_ChunkedFileTransfer_records_chunks_finished_after_a_failure(self):
+        target = os.path.join(self.directory.name, "copy.bin")
+        copy_range = p.copy_range
+
+        def fail_on_first_chunk(source_fd, target_fd, offset, length):
+            if offset == 0:
+                raise OSError("connection reset")
+            copy_range(source_fd, target_fd, offset, length)
+
+        with mock.patch.object(p, "copy_range", side_effect=fail_on_first_chunk):
+            self.assertRaises(OSError, p.ChunkedFileTransfer(
+                self.source, target, chunk_bytes=1000, workers=1).run)
+
+        summary = p.ChunkedFileTransfer(self.source, target, chunk_bytes=1000).run()
+        self.assertEqual((summary["copied_chunks"], summary["resumed_chunks"]), (1, 9))
+        self.assertEqual(self.read(target), self.content)
+
+    def test_ChunkedFileTransfer_records_chunks_finished_after_a_short_read(self):
+        target = os.path.join(self.directory.name, "copy.bin")
+        copy_range = p.copy_range
+
+        def end_early_on_first_chunk(source_fd, target_fd, offset, length):
+            if offset == 0:
+                raise EOFError("Source ended early")
+            copy_range(source_fd, target_fd, offset, length)
+
+        with mock.patch.object(p, "copy_range", side_effect=end_early_on_first_chunk):
+            self.assertRaises(EOFError, p.ChunkedFileTransfer(
+                self.source, target, chunk_bytes=1000, workers=1).run)
+        with open(target + ".manifest", encoding="utf-8") as manifest_file:
+            self.assertEqual(len(json.load(manifest_file)["done"]), 9)
+
+    def test_ChunkedFileTransfer_restarts_when_source_changed(self):
+        target = os.path.join(self.directory.name, "copy.bin")
+        with mock.patch.object(p, "copy_range", side_effect=OSError("connection reset")):
+            self.assertRaises(OSError, p.ChunkedFileTransfer(
+                self.source, target, chunk_bytes=1000, workers=1).run)
+        with open(self.source, "ab") as source_file:
+            source_file.write(b"more")
+        summary = p.ChunkedFileTransfer(self.source, target, chunk_bytes=1000).run()
+        self.assertEqual(summary["resumed_chunks"], 0)
+        self.assertEqual(self.read(target), self.content + b"more")
+
+if __name__ == '__main__':
+    unittest.main()
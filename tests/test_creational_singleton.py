@@ -0,0 +1,171 @@
+import asyncio
+import os
+import threading
+import unittest
+import Creational.Singleton.singleton_pattern as s
+
+
+class Test_DatabaseConnection(unittest.TestCase):
+    def setUp(self):
+        s.DatabaseConnection().shutdown()
+
+    def tearDown(self):
+        s.DatabaseConnection().shutdown()
+
+    def make_pool(self, **options):
+        s.DatabaseConnection().shutdown()
+        return s.DatabaseConnection(**options)
+
+    def test_DatabaseConnection_returns_one_instance(self):
+        first = s.DatabaseConnection()
+        second = s.DatabaseConnection(max_size=99)
+        self.assertIs(first, second)
+        self.assertIsInstance(first, s.DatabaseConnection)
+        self.assertEqual(second.max_size, 10)
+
+    def test_DatabaseConnection_is_one_instance_across_threads(self):
+        s.DatabaseConnection().shutdown()
+        instances = []
+        threads = [threading.Thread(target=lambda: instances.append(s.DatabaseConnection()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+
+    def test_DatabaseConnection_borrow_times_out_when_exhausted(self):
+        pool = self.make_pool(min_size=0, max_size=2)
+        first, second = pool.borrow(), pool.borrow()
+        self.assertRaises(s.PoolTimeoutError, pool.borrow, 0.01)
+        self.assertEqual(pool.metrics().timeouts, 1)
+        self.assertEqual(pool.metrics().utilization, 1.0)
+        pool.give_back(first)
+        self.assertIs(pool.borrow(0.01), first)
+        pool.give_back(second)
+
+    def test_DatabaseConnection_bounds_connections_shared_by_threads(self):
+        pool = self.make_pool(max_size=3)
+
+        def work():
+            for _ in range(50):
+                with pool.connection(timeout=5) as connection:
+                    connection.execute("SELECT 1").fetchone()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics = pool.metrics()
+        self.assertEqual(metrics.borrows, 400)
+        self.assertLessEqual(metrics.peak_in_use, 3)
+        self.assertLessEqual(metrics.created, 3)
+        self.assertEqual(metrics.in_use, 0)
+
+    def test_DatabaseConnection_evicts_idle_connections_down_to_min_size(self):
+        pool = self.make_pool(min_size=1, max_size=4, idle_timeout=0)
+        connections = [pool.borrow() for _ in range(4)]
+        for connection in connections:
+            pool.give_back(connection)
+        pool.evict_idle()
+        self.assertEqual(pool.metrics().size, 1)
+
+    def test_DatabaseConnection_replaces_unhealthy_connections(self):
+        pool = self.make_pool(min_size=1, max_size=1)
+        broken = pool.borrow()
+        broken.close()
+        pool.give_back(broken)
+        with pool.connection(timeout=1) as connection:
+            self.assertIsNot(connection, broken)
+            self.assertEqual(connection.execute("SELECT 1").fetchone(), (1,))
+
+    def test_DatabaseConnection_rolls_back_returned_transactions(self):
+        pool = self.make_pool(min_size=1, max_size=1)
+        with pool.connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER)")
+            connection.commit()
+            connection.execute("INSERT INTO items VALUES (1)")
+        with pool.connection() as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM items").fetchone(), (0,))
+
+
+class ThreadScopedConnection(s.DatabaseConnection):
+    scope = s.SingletonScope.THREAD
+
+
+class Test_SingletonRegistry(unittest.TestCase):
+    def test_SingletonRegistry_process_scope_creates_once(self):
+        registry = s.SingletonRegistry()
+        created = []
+        factory = lambda: created.append(object()) or created[-1]
+        self.assertIs(registry.get("key", factory), registry.get("key", factory))
+        self.assertEqual(len(created), 1)
+
+    def test_SingletonRegistry_thread_scope_is_per_thread(self):
+        registry = s.SingletonRegistry()
+        seen = []
+
+        def lookup():
+            first = registry.get("key", object, s.SingletonScope.THREAD)
+            self.assertIs(first, registry.get("key", object, s.SingletonScope.THREAD))
+            seen.append(first)
+
+        threads = [threading.Thread(target=lookup) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(instance) for instance in seen}), 3)
+
+    def test_SingletonRegistry_task_scope_is_per_task(self):
+        registry = s.SingletonRegistry()
+
+        async def lookup():
+            first = registry.get("key", object, s.SingletonScope.TASK)
+            await asyncio.sleep(0)
+            self.assertIs(first, registry.get("key", object, s.SingletonScope.TASK))
+            return first
+
+        async def main():
+            return await asyncio.gather(lookup(), lookup())
+
+        first, second = asyncio.run(main())
+        self.assertIsNot(first, second)
+
+    def test_SingletonRegistry_task_scope_requires_a_task(self):
+        registry = s.SingletonRegistry()
+        self.assertRaises(RuntimeError, registry.get, "key", object, s.SingletonScope.TASK)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_SingletonRegistry_rebuilds_instances_after_fork(self):
+        registry = s.SingletonRegistry()
+        parent_instance = registry.get("key", object)
+        reader, writer = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            rebuilt = registry.get("key", object) is not parent_instance
+            stable = registry.get("key", object) is registry.get("key", object)
+            os.write(writer, b"1" if rebuilt and stable else b"0")
+            os._exit(0)
+        os.close(writer)
+        result = os.read(reader, 1)
+        os.close(reader)
+        os.waitpid(pid, 0)
+        self.assertEqual(result, b"1")
+        self.assertIs(registry.get("key", object), parent_instance)
+
+    def test_DatabaseConnection_subclass_can_be_thread_scoped(self):
+        pools = []
+        threads = [threading.Thread(target=lambda: pools.append(ThreadScopedConnection(max_size=1)))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(pools[0], pools[1])
+        self.assertIsNot(pools[0], s.DatabaseConnection())
+
+
+if __name__ == '__main__':
+    unittest.main()
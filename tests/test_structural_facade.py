@@ -0,0 +1,469 @@
+import operator
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+import Structural.Facade.facade_pattern as f
+
+
+class SleepStep():
+    @staticmethod
+    def load():
+        time.sleep(0.2)
+
+
+class FailingStep():
+    @staticmethod
+    def load():
+        raise RuntimeError("source unavailable")
+
+
+class SlowEtl(f.Etl):
+    steps = [SleepStep]
+
+
+class FailingEtl(f.Etl):
+    steps = [FailingStep]
+
+
+class Test_DataWarehouse(unittest.TestCase):
+    def test_DataWarehouse_rejects_unknown_executor(self):
+        self.assertRaises(ValueError, f.DataWarehouse, "fiber")
+
+    def test_DataWarehouse_load_all_runs_registered_etls_concurrently(self):
+        warehouse = f.DataWarehouse()
+        warehouse.etls = {}
+        for number in range(4):
+            warehouse.register_etl(f"slow {number}", SlowEtl)
+        summary = warehouse.load_all()
+        self.assertEqual(len(summary.results), 4)
+        self.assertEqual(summary.failures, [])
+        self.assertLess(summary.wall_clock, summary.pipeline_time)
+
+    def test_DataWarehouse_load_all_isolates_failures(self):
+        warehouse = f.DataWarehouse()
+        warehouse.register_etl("broken", FailingEtl)
+        summary = warehouse.load_all()
+        self.assertEqual([result.name for result in summary.failures], ["broken"])
+        self.assertIsInstance(summary.failures[0].error, RuntimeError)
+        self.assertEqual(len(summary.results), 5)
+
+    def test_DataWarehouse_load_all_times_failures_from_their_own_start(self):
+        warehouse = f.DataWarehouse()
+        warehouse.register_etl("slow", SlowEtl)
+        warehouse.register_etl("broken", FailingEtl)
+        summary = warehouse.load_all(timeouts={"slow": 0.2})
+        results = {result.name: result for result in summary.results}
+        self.assertLess(results["broken"].elapsed, 0.1)
+        self.assertGreaterEqual(results["slow"].elapsed, 0.15)
+
+    def test_DataWarehouse_load_all_applies_per_etl_timeouts(self):
+        warehouse = f.DataWarehouse()
+        warehouse.register_etl("slow", SlowEtl)
+        summary = warehouse.load_all(timeouts={"slow": 0.01})
+        statuses = {result.name: result.status for result in summary.results}
+        self.assertEqual(statuses["slow"], "timed out")
+        self.assertEqual(statuses["system 1"], "succeeded")
+
+    def test_DataWarehouse_load_all_does_not_charge_queued_etls_for_waiting(self):
+        warehouse = f.DataWarehouse(max_workers=1)
+        warehouse.etls = {name: SlowEtl for name in ("a", "b", "c")}
+        summary = warehouse.load_all(timeout=0.3)
+        self.assertEqual([result.status for result in summary.results], ["succeeded"] * 3)
+
+    def test_DataWarehouse_load_all_times_queued_etls_once_the_pool_is_stuck(self):
+        warehouse = f.DataWarehouse(max_workers=1)
+        warehouse.etls = {"a": SlowEtl, "b": SlowEtl}
+        summary = warehouse.load_all(timeouts={"a": 0.01, "b": 0.05})
+        self.assertEqual([result.status for result in summary.results],
+                         ["timed out", "timed out"])
+        self.assertLess(summary.wall_clock, 0.15)
+
+    def test_DataWarehouse_load_all_supports_process_pools(self):
+        summary = f.DataWarehouse(executor="process", max_workers=2).load_all(timeout=30)
+        self.assertEqual([result.status for result in summary.results], ["succeeded"] * 4)
+
+
+class CountingExtract(f.ExtractStep):
+    def __init__(self, total_rows, batch_size):
+        super().__init__(batch_size)
+        self.total_rows = total_rows
+        self.produced = 0
+
+    def read(self):
+        def rows():
+            for number in range(self.total_rows):
+                self.produced += 1
+                yield (number, number * 2)
+        return ("id", "double"), rows()
+
+
+class InFlightCheckingLoad(f.LoadDataToDatabase):
+    def __init__(self, extract):
+        super().__init__()
+        self.extract = extract
+        self.max_in_flight = 0
+
+    def load(self, batches=()):
+        for batch in batches:
+            self.rows_loaded += batch.num_rows
+            self.max_in_flight = max(self.max_in_flight,
+                                     self.extract.produced - self.rows_loaded)
+        return self.rows_loaded
+
+
+class Test_StreamingEtl(unittest.TestCase):
+    def test_batched_groups_rows_into_bounded_batches(self):
+        batches = list(f.batched(("a", "b"), ((n, n) for n in range(7)), batch_size=3))
+        self.assertEqual([batch.num_rows for batch in batches], [3, 3, 1])
+        self.assertEqual(batches[2].columns, {"a": [6], "b": [6]})
+        self.assertEqual(list(batches[0].rows()), [(0, 0), (1, 1), (2, 2)])
+
+    def test_Etl_streams_batches_through_steps(self):
+        extract = CountingExtract(10_000, batch_size=100)
+        load = InFlightCheckingLoad(extract)
+
+        class StreamingEtl(f.Etl):
+            steps = [extract, f.TransformData(), load]
+
+        self.assertEqual(StreamingEtl().execute_etl(), 10_000)
+        self.assertLessEqual(load.max_in_flight, 100)
+
+    def test_TransformData_applies_transform_per_batch(self):
+        doubled = f.TransformData(lambda batch: f.RecordBatch(
+            {"amount": [value * 2 for value in batch.columns["amount"]]}))
+        batches = list(doubled.load(f.ExtractExcel().load()))
+        self.assertEqual(batches[0].columns["amount"], [20.0, 51.0, 14.5])
+
+    def test_ExtractCsv_reads_file_in_batches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.csv")
+            with open(path, "w", encoding="utf-8") as csv_file:
+                csv_file.write("id,name\n1,a\n2,b\n3,c\n")
+            batches = list(f.ExtractCsv(path, chunk_bytes=6, workers=1).load())
+        self.assertEqual([batch.num_rows for batch in batches], [2, 1])
+        self.assertEqual(batches[0].column_names, ["id", "name"])
+
+
+class Test_FastCsvExtract(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "data.csv")
+        with open(self.path, "w", encoding="utf-8") as csv_file:
+            csv_file.write("id,region,amount\r\n")
+            csv_file.writelines(f"{number},R{number % 3},{number * 0.5}\r\n"
+                                for number in range(1000))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_columns(self, **options):
+        extract = f.ExtractCsv(self.path, {"id": int, "amount": float}, **options)
+        columns = {"id": [], "region": [], "amount": []}
+        for batch in extract.load():
+            for name, values in batch.columns.items():
+                columns[name].extend(values)
+        return columns
+
+    def test_line_aligned_ranges_cover_buffer_on_line_boundaries(self):
+        buffer = b"h\n" + b"".join(b"%d\n" % number for number in range(100))
+        ranges = list(f.line_aligned_ranges(buffer, 2, chunk_bytes=16))
+        self.assertEqual(ranges[0][0], 2)
+        self.assertEqual(ranges[-1][1], len(buffer))
+        for (_, end), (begin, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, begin)
+            self.assertEqual(buffer[end - 1:end], b"\n")
+
+    def test_ExtractCsv_parses_typed_columns(self):
+        columns = self.read_columns(chunk_bytes=1024, workers=1)
+        self.assertEqual(list(columns["id"]), list(range(1000)))
+        self.assertEqual(columns["region"][:4], ["R0", "R1", "R2", "R0"])
+        self.assertEqual(columns["amount"][999], 499.5)
+
+    def test_ExtractCsv_parses_ranges_in_parallel(self):
+        columns = self.read_columns(chunk_bytes=512, workers=2, executor="thread")
+        self.assertEqual(list(columns["id"]), list(range(1000)))
+
+    def test_ExtractCsv_falls_back_to_array_without_numpy(self):
+        with mock.patch.object(f, "numpy", None):
+            columns = f.parse_csv_chunk(b"1,2.5\n3,4.5\n", ("id", "amount"),
+                                        {"id": int, "amount": float})
+        self.assertEqual(columns["id"].tolist(), [1, 3])
+        self.assertEqual(columns["amount"].tolist(), [2.5, 4.5])
+
+    def test_parse_csv_chunk_handles_quoted_fields(self):
+        columns = f.parse_csv_chunk(b'1,"Austin, TX"\n2,Boston\n', ("id", "city"), {"id": int})
+        self.assertEqual(list(columns["id"]), [1, 2])
+        self.assertEqual(columns["city"], ["Austin, TX", "Boston"])
+
+    def test_parse_csv_chunk_rejects_ragged_rows(self):
+        self.assertRaises(ValueError, f.parse_csv_chunk, b"1,2\n3\n", ("a", "b"),
+                          {"a": int, "b": int})
+
+class Test_TransformSpec(unittest.TestCase):
+    def setUp(self):
+        self.batches = [
+            f.RecordBatch({"id": [1, 2, 3], "region": ["TX", "MA", "TX"],
+                           "amount": [10.0, 0.0, 5.5], "quantity": [1, 2, 3]}),
+            f.RecordBatch({"id": [4, 5], "region": ["MA", "CA"],
+                           "amount": [2.0, 8.0], "quantity": [4, 5]}),
+        ]
+
+    def run_spec(self, spec):
+        return [{name: list(values) for name, values in batch.columns.items()}
+                for batch in f.TransformData(spec).load(self.batches)]
+
+    def check_both_backends(self, spec, expected):
+        self.assertEqual(self.run_spec(spec), expected)
+        with mock.patch.object(f, "numpy", None):
+            self.assertEqual(self.run_spec(spec), expected)
+
+    def test_TransformSpec_filters_derives_and_projects(self):
+        spec = (f.TransformSpec()
+                .filter("amount", ">", 1)
+                .derive("total", operator.mul, "amount", "quantity")
+                .cast("total", int)
+                .project("id", "total"))
+        self.check_both_backends(spec, [{"id": [1, 3], "total": [10, 16]},
+                                        {"id": [4, 5], "total": [8, 40]}])
+
+    def test_TransformSpec_filters_on_membership(self):
+        spec = f.TransformSpec().filter("region", "in", {"MA", "CA"}).project("id")
+        self.check_both_backends(spec, [{"id": [2]}, {"id": [4, 5]}])
+
+    def test_TransformSpec_group_by_aggregates_across_batches(self):
+        spec = f.TransformSpec().group_by("region", total=("amount", "sum"),
+                                          orders=("id", "count"), biggest=("quantity", "max"),
+                                          average=("amount", "mean"))
+        self.check_both_backends(spec, [{"region": ["CA", "MA", "TX"],
+                                         "total": [8.0, 2.0, 15.5],
+                                         "orders": [1, 2, 2],
+                                         "biggest": [5, 4, 3],
+                                         "average": [8.0, 1.0, 7.75]}])
+
+    def test_TransformSpec_group_by_multiple_keys(self):
+        spec = (f.TransformSpec()
+                .derive("big", lambda quantity: quantity > 2, "quantity")
+                .group_by(("region", "big"), orders=("id", "count")))
+        self.assertEqual(self.run_spec(spec), [{"region": ["CA", "MA", "MA", "TX", "TX"],
+                                                "big": [True, False, True, False, True],
+                                                "orders": [1, 1, 1, 1, 1]}])
+
+    def test_TransformSpec_rejects_invalid_declarations(self):
+        self.assertRaises(ValueError, f.TransformSpec().filter, "amount", "~", 1)
+        self.assertRaises(ValueError, f.TransformSpec().group_by, "region", x=("id", "median"))
+        grouped = f.TransformSpec().group_by("region", orders=("id", "count"))
+        self.assertRaises(ValueError, grouped.project, "region")
+
+
+class Test_LoadDataToDatabase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.directory.name, "warehouse.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def query(self, sql):
+        connection = sqlite3.connect(self.database)
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def test_LoadDataToDatabase_writes_batches_in_transactions(self):
+        rows = [(number, f"R{number % 3}", number * 0.5) for number in range(1000)]
+        sink = f.LoadDataToDatabase(self.database, table="sales", transaction_rows=250)
+        loaded = sink.load(f.batched(("id", "region", "amount"), rows, batch_size=100))
+        self.assertEqual(loaded, 1000)
+        self.assertEqual(self.query("SELECT * FROM sales ORDER BY id"), rows)
+
+    def test_LoadDataToDatabase_supports_several_writers(self):
+        rows = [(number, number * 2) for number in range(5000)]
+        sink = f.LoadDataToDatabase(self.database, writers=3, transaction_rows=500)
+        sink.load(f.batched(("id", "double"), rows, batch_size=100))
+        self.assertEqual(self.query("SELECT COUNT(*), SUM(double) FROM records"),
+                         [(5000, sum(double for _, double in rows))])
+
+    def test_LoadDataToDatabase_raises_writer_errors(self):
+        batches = [f.RecordBatch({"id": [1], "name": ["a"]}),
+                   f.RecordBatch({"id": [2], "name": ["b"], "extra": [3]})]
+        sink = f.LoadDataToDatabase(self.database)
+        self.assertRaises(sqlite3.ProgrammingError, sink.load, batches)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM records"), [(0,)])
+
+    def test_LoadDataToDatabase_rolls_back_when_batches_raise(self):
+        def failing_batches():
+            yield f.RecordBatch({"id": [1], "name": ["a"]})
+            yield f.RecordBatch({"id": [2], "name": ["b"]})
+            raise OSError("source went away")
+
+        sink = f.LoadDataToDatabase(self.database, writers=2)
+        self.assertRaises(OSError, sink.load, failing_batches())
+        self.assertEqual(sink.rows_loaded, 0)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM records"), [(0,)])
+
+    def test_Etl_loads_csv_through_transform_into_sqlite(self):
+        path = os.path.join(self.directory.name, "data.csv")
+        with open(path, "w", encoding="utf-8") as csv_file:
+            csv_file.write("id,region,amount\n")
+            csv_file.writelines(f"{number},R{number % 2},{number}.5\n" for number in range(100))
+
+        class CsvToSqliteEtl(f.Etl):
+            steps = [f.ExtractCsv(path, {"id": int, "amount": float}, workers=1),
+                     f.TransformData(f.TransformSpec().group_by("region", total=("id", "sum"))),
+                     f.LoadDataToDatabase(self.database, table="totals")]
+
+        self.assertEqual(CsvToSqliteEtl().execute_etl(), 2)
+        self.assertEqual(self.query("SELECT region, total FROM totals ORDER BY region"),
+                         [("R0", 2450), ("R1", 2500)])
+
+
+class Test_IncrementalEtl(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.directory.name, "data.csv")
+        self.checkpoints = f.CheckpointStore(os.path.join(self.directory.name, "state.db"))
+        self.write_csv("w", "id,amount\n", range(10))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_csv(self, mode, header, numbers, path=None):
+        with open(path or self.csv_path, mode, encoding="utf-8") as csv_file:
+            csv_file.write(header)
+            csv_file.writelines(f"{number},{number * 1.5}\n" for number in numbers)
+
+    def make_etl(self, extract, load=f.LoadDataToDatabase):
+        class CountingEtl(f.Etl):
+            steps = [extract, f.TransformData, load]
+        return CountingEtl()
+
+    def query(self, sql):
+        connection = sqlite3.connect(os.path.join(self.directory.name, "warehouse.db"))
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def make_sink(self):
+        return f.LoadDataToDatabase(os.path.join(self.directory.name, "warehouse.db"))
+
+    def test_Etl_skips_unchanged_source_and_extracts_appended_rows(self):
+        extract = f.ExtractCsv(self.csv_path, {"id": int}, workers=1)
+        etl = self.make_etl(extract)
+        self.assertEqual(etl.execute_etl(self.checkpoints), 10)
+        self.assertIsNone(etl.execute_etl(self.checkpoints))
+        self.assertTrue(etl.skipped)
+        self.write_csv("a", "", range(10, 15))
+        self.assertEqual(etl.execute_etl(self.checkpoints), 5)
+        self.assertFalse(etl.skipped)
+
+    def test_Etl_defers_a_partially_written_last_line(self):
+        extract = f.ExtractCsv(self.csv_path, {"id": int, "amount": float}, workers=1)
+        with open(self.csv_path, "a", encoding="utf-8") as csv_file:
+            csv_file.write("10,1")
+        self.assertEqual(self.make_etl(extract).execute_etl(self.checkpoints), 10)
+        with open(self.csv_path, "a", encoding="utf-8") as csv_file:
+            csv_file.write("5.0\n11,16.5\n")
+        sink = self.make_sink()
+        self.assertEqual(self.make_etl(extract, sink).execute_etl(self.checkpoints), 2)
+        self.assertEqual(self.query("SELECT id, amount FROM records"), [(10, 15.0), (11, 16.5)])
+
+    def test_Etl_reloads_rewritten_source(self):
+        etl = self.make_etl(f.ExtractCsv(self.csv_path, workers=1))
+        etl.execute_etl(self.checkpoints)
+        self.write_csv("w", "id,amount\n", range(100, 120))
+        self.assertEqual(etl.execute_etl(self.checkpoints), 20)
+
+    def test_Etl_replaces_rows_of_rewritten_source(self):
+        extract = f.ExtractCsv(self.csv_path, {"id": int}, workers=1)
+        self.make_etl(extract, self.make_sink()).execute_etl(self.checkpoints)
+        self.write_csv("a", "", range(10, 12))
+        self.make_etl(extract, self.make_sink()).execute_etl(self.checkpoints)
+        self.write_csv("w", "id,amount\n", range(100, 103))
+        self.make_etl(extract, self.make_sink()).execute_etl(self.checkpoints)
+        self.assertEqual(self.query("SELECT id FROM records ORDER BY id"),
+                         [(100,), (101,), (102,)])
+        self.write_csv("w", "id,amount\n", [])
+        self.make_etl(extract, self.make_sink()).execute_etl(self.checkpoints)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM records"), [(0,)])
+
+    def test_Etl_retried_delta_is_not_loaded_twice(self):
+        self.write_csv("w", "id,amount\n", range(100))
+        failing = {"from": None}
+
+        def fail_partway(batch):
+            if failing["from"] is not None and batch.columns["id"][-1] >= failing["from"]:
+                raise ValueError("transform failed")
+            return batch
+
+        class RetriedEtl(f.Etl):
+            steps = [f.ExtractCsv(self.csv_path, {"id": int}, chunk_bytes=100, workers=1),
+                     f.TransformData(fail_partway),
+                     f.LoadDataToDatabase(os.path.join(self.directory.name, "warehouse.db"),
+                                          transaction_rows=10)]
+
+        RetriedEtl().execute_etl(self.checkpoints)
+        self.write_csv("a", "", range(100, 200))
+        failing["from"] = 150
+        self.assertRaises(ValueError, RetriedEtl().execute_etl, self.checkpoints)
+        self.assertGreater(self.query("SELECT COUNT(*) FROM records")[0][0], 100)
+        failing["from"] = None
+        RetriedEtl().execute_etl(self.checkpoints)
+        self.assertEqual(self.query("SELECT COUNT(*), COUNT(DISTINCT id) FROM records"),
+                         [(200, 200)])
+
+    def test_Etl_filters_rewritten_empty_source(self):
+        extract = f.ExtractCsv(self.csv_path, {"id": int}, workers=1)
+        transform = f.TransformData(f.TransformSpec().filter("amount", ">", "1"))
+        etl = self.make_etl(extract, self.make_sink())
+        etl.steps[1] = transform
+        etl.execute_etl(self.checkpoints)
+        self.write_csv("w", "id,amount\n", [])
+        etl.execute_etl(self.checkpoints)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM records"), [(0,)])
+
+    def test_Etl_without_checkpoints_always_runs(self):
+        etl = self.make_etl(f.ExtractCsv(self.csv_path, workers=1))
+        self.assertEqual(etl.execute_etl(), 10)
+        self.assertEqual(etl.execute_etl(), 10)
+
+    def test_ExtractBlobStore_only_reads_objects_with_new_etags(self):
+        container = os.path.join(self.directory.name, "bucket")
+        os.mkdir(container)
+        for name in ("a.csv", "b.csv"):
+            self.write_csv("w", "id,amount\n", range(3), os.path.join(container, name))
+        extract = f.ExtractS3(container, {"id": int})
+        self.assertEqual(self.make_etl(extract, self.make_sink()).execute_etl(self.checkpoints), 6)
+        self.write_csv("a", "", range(3, 7), os.path.join(container, "b.csv"))
+        etl = self.make_etl(extract, self.make_sink())
+        self.assertEqual(etl.execute_etl(self.checkpoints), 7)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM records"), [(10,)])
+        self.assertEqual(self.query("SELECT id FROM records WHERE _source LIKE '%b.csv' "
+                                    "ORDER BY id"), [(number,) for number in range(7)])
+        self.assertIsNone(etl.execute_etl(self.checkpoints))
+        os.remove(os.path.join(container, "a.csv"))
+        etl.execute_etl(self.checkpoints)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM records WHERE _source LIKE '%a.csv'"),
+                         [(0,)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM records"), [(7,)])
+
+    def test_DataWarehouse_reports_skipped_etls(self):
+        extract = f.ExtractCsv(self.csv_path, workers=1)
+
+        class CsvEtl(f.Etl):
+            steps = [extract, f.TransformData, f.LoadDataToDatabase]
+
+        warehouse = f.DataWarehouse(checkpoint_path=os.path.join(self.directory.name, "dw.db"))
+        warehouse.etls = {"csv": CsvEtl}
+        self.assertEqual(warehouse.load_all().results[0].status, "succeeded")
+        summary = warehouse.load_all()
+        self.assertEqual(summary.results[0].status, "skipped")
+        self.assertEqual(summary.failures, [])
+
+
+if __name__ == '__main__':
+    unittest.main()